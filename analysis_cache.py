@@ -0,0 +1,176 @@
+# analysis_cache.py — content-addressed cache of process_pdf_to_docx results
+"""
+Results are keyed by the PDF bytes, the template bytes, PARSER_VERSION, the pipeline options
+and the current day (the filled document embeds « date du jour »). Entries are pickled
+(doc_bytes, fields, items) tuples: an in-memory LRU tier plus an optional on-disk tier,
+both evicted by size. The disk tier is meant for a local, trusted directory only.
+get_or_analyze stores doc_bytes as None: the filled document is the compiled template filled
+with the fields (analyze_pdf does nothing else to it), so it is refilled on a hit instead of
+being serialised on every miss.
+A `layout_store` is left out of the key: results whose items were read through a supplier
+profile (draft.layout_profile) are not stored, so every entry is the full-path reading.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from extract_and_fill import (
+    PARSER_VERSION, InvoiceDraft, PdfSource, TemplateSource, analyze_pdf, compile_template, read_source_bytes,
+    source_sha256, today_ch,
+)
+
+
+# Options that change how the result is computed, not what it is.
+_OPTIONS_NOT_IN_KEY = {"parallel_pages", "layout_store", "report", "low_memory", "memory_limit_mb"}
+
+
+def analysis_key(pdf: PdfSource, template: TemplateSource, **options) -> str:
+    """
+    `pdf` (path, bytes, buffer or binary file) is hashed in place, without reading it into memory;
+    the template (same kinds of sources) by its bytes.
+    """
+    options = {k: v for k, v in options.items() if k not in _OPTIONS_NOT_IN_KEY}
+    h = hashlib.sha256()
+    for part in (PARSER_VERSION, today_ch(), repr(sorted(options.items()))):
+        h.update(part.encode("utf-8")); h.update(b"\0")
+    h.update(bytes.fromhex(source_sha256(pdf)))
+    h.update(bytes.fromhex(source_sha256(template)))
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, max_memory_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    # --- tiers ---
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.pkl"
+
+    def _mem_put(self, key: str, blob: bytes):
+        if len(blob) > self.max_memory_bytes:
+            return
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= len(old)
+        self._mem[key] = blob
+        self._mem_bytes += len(blob)
+        while self._mem_bytes > self.max_memory_bytes and self._mem:
+            _, evicted = self._mem.popitem(last=False)
+            self._mem_bytes -= len(evicted)
+
+    def _disk_put(self, key: str, blob: bytes):
+        if len(blob) > self.max_disk_bytes:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, self._disk_path(key))
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        for e in os.scandir(self.disk_dir):
+            if e.name.endswith(".pkl"):
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path); total -= size
+            except FileNotFoundError:
+                pass
+
+    # --- public API ---
+    def get(self, key: str) -> Optional[Tuple[Optional[bytes], Dict[str, str], object]]:
+        with self._lock:
+            blob = self._mem.get(key)
+            if blob is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return pickle.loads(blob)
+            if self.disk_dir is not None:
+                path = self._disk_path(key)
+                try:
+                    blob = path.read_bytes()
+                    os.utime(path)  # LRU order on disk follows mtime
+                except FileNotFoundError:
+                    blob = None
+                if blob is not None:
+                    self._mem_put(key, blob)
+                    self.hits += 1; self.disk_hits += 1
+                    return pickle.loads(blob)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Tuple[Optional[bytes], Dict[str, str], object]):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._mem_put(key, blob)
+            if self.disk_dir is not None:
+                self._disk_put(key, blob)
+
+    def get_or_compute(self, pdf: PdfSource, template: TemplateSource, **options):
+        """Cached process_pdf_to_docx(pdf, template, **options)."""
+        template_bytes = read_source_bytes(template)
+        key = analysis_key(pdf, template_bytes, **options)
+        value = self.get(key)
+        if value is None:
+            draft = analyze_pdf(pdf, template_bytes, **options)
+            with draft.report.stage("save"):
+                value = (draft.to_bytes(), draft.fields, draft.items)
+            if not draft.layout_profile:
+                self.put(key, value)
+        elif value[0] is None:
+            _, fields, items = value
+            value = (InvoiceDraft.from_bytes(None, fields, items, compile_template(template_bytes)).to_bytes(), fields, items)
+        return value
+
+    def get_or_analyze(self, pdf: PdfSource, template: TemplateSource, **options) -> InvoiceDraft:
+        """Like get_or_compute but returns an InvoiceDraft; a miss never re-parses the filled document."""
+        template_bytes = read_source_bytes(template)
+        key = analysis_key(pdf, template_bytes, **options)
+        template = compile_template(template_bytes)
+        report = options.get("report")
+        value = self.get(key)
+        if value is not None:
+            if report is not None:
+                report.set("cache", "hit")
+            doc_bytes, fields, items = value
+            return InvoiceDraft.from_bytes(doc_bytes, fields, items, template, from_cache=True, report=report)
+        if report is not None:
+            report.set("cache", "miss")
+        draft = analyze_pdf(pdf, template, **options)
+        if not draft.layout_profile:
+            self.put(key, (None, draft.fields, draft.items))
+        return draft
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "memory_entries": len(self._mem), "memory_bytes": self._mem_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear(); self._mem_bytes = 0
+            if self.disk_dir is not None:
+                for e in os.scandir(self.disk_dir):
+                    if e.name.endswith(".pkl"):
+                        os.remove(e.path)
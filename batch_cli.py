@@ -0,0 +1,336 @@
+# batch_cli.py — headless batch conversion
+"""
+Convert a folder (or glob) of supplier order PDFs into invoices without the UI.
+
+    python batch_cli.py commandes/ -o factures/ -j 4
+    python batch_cli.py "commandes/2024-*.pdf" --template modele.docx
+    python batch_cli.py commandes/ --zip factures-du-jour.zip
+    python batch_cli.py commandes/ --catalog commandes.sqlite     # PDF déjà traités : facture refaite sans analyse
+    python batch_cli.py --from-catalog CF-24-1234 --catalog commandes.sqlite
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from analysis_cache import AnalysisCache
+from extract_and_fill import ITEM_ENGINES, TEXT_ENGINES, analyze_pdf, docx_filename, preload, reconcile_items
+from layout_profiles import LayoutProfileStore
+from order_catalog import OrderCatalog, catalog_entry, entry_fields, entry_items, pdf_sha256
+from pipeline_report import PipelineReport
+from zip_export import DocxZipWriter
+
+DEFAULT_TEMPLATE = Path(__file__).parent / "template.docx"
+
+# Template bytes and pipeline options, set once per worker process by _init_worker.
+_TEMPLATE_BYTES: Optional[bytes] = None
+_OPTIONS: Dict[str, object] = {}
+_CACHE: Optional[AnalysisCache] = None
+_CATALOG: Optional[OrderCatalog] = None
+# Output folder (None when writing a ZIP): workers write each DOCX there, the parent names it.
+_OUT_DIR: Optional[str] = None
+# Catalog entries are written by the parent process in transactions of this many files.
+CATALOG_BATCH = 100
+
+
+def collect_pdfs(inputs: List[str]) -> List[Path]:
+    """Expand directories and glob patterns into a sorted, de-duplicated list of PDF paths."""
+    found: List[Path] = []
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            found.extend(sorted(q for q in p.iterdir() if q.is_file() and q.suffix.lower() == ".pdf"))
+        elif p.is_file():
+            found.append(p)
+        else:
+            found.extend(sorted(Path(m) for m in glob.glob(item) if m.lower().endswith(".pdf")))
+    unique, seen = [], set()
+    for p in found:
+        key = p.resolve()
+        if key not in seen:
+            seen.add(key); unique.append(p)
+    return unique
+
+
+def _unique_path(out_dir: Path, name: str, taken: set) -> Path:
+    stem, suffix = os.path.splitext(name)
+    candidate, n = out_dir / name, 2
+    while candidate in taken or candidate.exists():
+        candidate = out_dir / f"{stem} ({n}){suffix}"; n += 1
+    taken.add(candidate)
+    return candidate
+
+
+def _init_worker(template_bytes: bytes, options: Optional[Dict[str, object]] = None, cache_dir: Optional[str] = None,
+                 layout_profiles: Optional[str] = None, catalog_path: Optional[str] = None,
+                 out_dir: Optional[str] = None):
+    global _TEMPLATE_BYTES, _OPTIONS, _CACHE, _CATALOG, _OUT_DIR
+    preload()
+    _TEMPLATE_BYTES = template_bytes
+    _OUT_DIR = out_dir
+    _OPTIONS = dict(options or {})
+    if layout_profiles:
+        _OPTIONS["layout_store"] = LayoutProfileStore(layout_profiles)
+    _CACHE = AnalysisCache(disk_dir=cache_dir) if cache_dir else None
+    # Workers only read the catalog (duplicates); the parent process writes the new entries.
+    _CATALOG = OrderCatalog(catalog_path) if catalog_path else None
+
+
+def _write_docx(render) -> Dict[str, object]:
+    """{"docx": render(None)}, or with an output folder {"docx_part": file that render(stream) wrote there}."""
+    if _OUT_DIR is None:
+        return {"docx": render(None)}
+    part = os.path.join(_OUT_DIR, f".facture-{uuid.uuid4().hex}.docx.part")
+    f = open(part, "xb")
+    try:
+        with f:
+            render(f)
+    except BaseException:
+        os.unlink(part)
+        raise
+    return {"docx_part": part}
+
+
+def convert_one(pdf_path: str) -> Dict[str, object]:
+    """
+    Run the full PDF → DOCX pipeline for one file; never raises, errors are reported in the result.
+    The PDF is read from its path (never loaded whole); with an output folder the DOCX is written
+    to a part file there ("docx_part", renamed by the parent), else returned ("docx").
+    """
+    t0 = time.perf_counter()
+    result: Dict[str, object] = {"pdf": pdf_path, "ok": False}
+    options = {k: v for k, v in _OPTIONS.items() if k != "report"}
+    report = PipelineReport(label=Path(pdf_path).name) if _OPTIONS.get("report") else None
+    try:
+        pdf_hash = pdf_sha256(pdf_path) if _CATALOG is not None else None
+        known = _CATALOG.by_hash(pdf_hash) if _CATALOG is not None else None
+        if known is not None:
+            # Same PDF already processed: invoice rebuilt from the catalog, no extraction.
+            result.update(_write_docx(lambda out: _CATALOG.regenerate(known, _TEMPLATE_BYTES, out=out)))
+            fields = entry_fields(known)
+            result.update(ok=True, fields=fields, n_items=known["n_items"], cached=False, catalog=True, engine=None,
+                          reconciliation=reconcile_items(entry_items(known), fields.get("Total TTC CHF")))
+            result["seconds"] = time.perf_counter() - t0
+            return result
+        if _CACHE is not None:
+            draft = _CACHE.get_or_analyze(pdf_path, _TEMPLATE_BYTES, report=report, **options)
+        else:
+            draft = analyze_pdf(pdf_path, _TEMPLATE_BYTES, report=report, **options)
+        result.update(_write_docx(lambda out: draft.render(out=out)))
+        result.update(ok=True, fields=draft.fields, n_items=len(draft.items or []),
+                      cached=draft.from_cache, engine=draft.engine, reconciliation=draft.reconciliation,
+                      est_bytes_saved=draft.stats["est_bytes_saved"],
+                      est_seconds_saved=draft.stats["est_seconds_saved"])
+        if pdf_hash is not None:
+            result["catalog_entry"] = catalog_entry(pdf_hash, draft.fields, draft.items, time.perf_counter() - t0,
+                                                    source=Path(pdf_path).name)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - t0
+    if report is not None:
+        report.set("ok", result["ok"])
+        result["report"] = report.to_jsonl()
+    return result
+
+
+def run_batch(pdfs: List[Path], template_bytes: bytes, out_dir: Path, workers: int = 1,
+              early_stop: bool = False, cache_dir: Optional[str] = None,
+              layout_profiles: Optional[str] = None, report_jsonl: Optional[str] = None,
+              low_memory: bool = False, memory_limit_mb: Optional[float] = None,
+              text_engine: str = "pdfplumber", zip_path: Optional[Path] = None,
+              item_engine: str = "auto", catalog_path: Optional[str] = None,
+              out=sys.stdout) -> List[Dict[str, object]]:
+    """Convert `pdfs` on a process pool of `workers` processes and print one report line per file.
+
+    With `report_jsonl`, per-stage/per-page timings of every file are appended to that JSONL file.
+    With `zip_path`, invoices go into that ZIP (written as they complete) instead of `out_dir`.
+    With `catalog_path` (order_catalog.OrderCatalog), PDFs already in the catalog are not analysed
+    again and every new one is recorded (DOCX path, or the DOCX itself when writing a ZIP).
+    """
+    options = {"early_stop": early_stop, "report": bool(report_jsonl), "text_engine": text_engine,
+               "item_engine": item_engine}
+    if low_memory or memory_limit_mb:
+        options.update(low_memory=True, memory_limit_mb=memory_limit_mb)
+    if zip_path is not None:
+        zip_path.parent.mkdir(parents=True, exist_ok=True)
+        zip_writer: Optional[DocxZipWriter] = DocxZipWriter(zip_path)
+    else:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        zip_writer = None
+    taken: set = set()
+    results: List[Dict[str, object]] = []
+    catalog = OrderCatalog(catalog_path) if catalog_path else None
+    new_entries: List[Dict[str, object]] = []
+    batch_orders: Dict[str, Dict[str, object]] = {}  # order number → entry, for resends within this batch
+
+    def _handle(res):
+        pdf_path = Path(res["pdf"])
+        if res["ok"]:
+            entry = res.pop("catalog_entry", None)
+            if zip_writer is not None:
+                docx = res.pop("docx")
+                name = zip_writer.add(docx_filename(res["fields"], pdf_path.stem), docx)
+                res["output"] = f"{zip_path}/{name}"
+                if entry is not None:
+                    entry["docx"] = docx
+            else:
+                target = _unique_path(out_dir, docx_filename(res["fields"], pdf_path.stem), taken)
+                os.replace(res.pop("docx_part"), target)
+                res["output"] = str(target)
+                name = target.name
+                if entry is not None:
+                    entry["docx_path"] = str(target.resolve())
+            tag = ", cache" if res.get("cached") else ""
+            if res.get("catalog"):
+                tag += ", déjà au catalogue"
+            if entry is not None:
+                previous = None
+                if entry["commande"]:
+                    previous = batch_orders.get(entry["commande"]) or catalog.by_commande(entry["commande"])
+                    batch_orders[entry["commande"]] = entry
+                if previous is not None and previous["pdf_sha256"] != entry["pdf_sha256"]:
+                    tag += f", renvoi de {entry['commande']} (déjà traitée : {previous['source']})"
+                new_entries.append(entry)
+                if len(new_entries) >= CATALOG_BATCH:
+                    catalog.record_many(new_entries); new_entries.clear()
+            if res.get("engine") and res["engine"] != "pdfplumber":
+                tag += f", {res['engine']}"
+            rec = res.get("reconciliation") or {}
+            if rec.get("status") == "écart":
+                tag += f", articles {rec['sum']} ≠ Total CHF {rec['total']}"
+            elif rec.get("status") not in (None, "ok"):
+                tag += f", totaux : {rec['status']}"
+            print(f"OK    {pdf_path.name} -> {name} ({res['n_items']} lignes, {res['seconds']:.2f} s{tag})", file=out)
+        else:
+            print(f"ERR   {pdf_path.name}: {res['error']} ({res['seconds']:.2f} s)", file=out)
+        if report_jsonl and res.get("report"):
+            with open(report_jsonl, "a", encoding="utf-8") as f:
+                f.write(res.pop("report"))
+        results.append(res)
+
+    t0 = time.perf_counter()
+    try:
+        worker_args = (template_bytes, options, cache_dir, layout_profiles, catalog_path,
+                       str(out_dir) if zip_writer is None else None)
+        if workers <= 1:
+            _init_worker(*worker_args)
+            for p in pdfs:
+                _handle(convert_one(str(p)))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=worker_args) as ex:
+                futures = [ex.submit(convert_one, str(p)) for p in pdfs]
+                for fut in as_completed(futures):
+                    _handle(fut.result())
+    finally:
+        if zip_writer is not None:
+            zip_writer.close()
+        if catalog is not None:
+            catalog.record_many(new_entries)
+            catalog.close()
+    elapsed = time.perf_counter() - t0
+
+    n_ok = sum(1 for r in results if r["ok"])
+    saved_bytes = sum(r.get("est_bytes_saved", 0) for r in results)
+    saved_s = sum(r.get("est_seconds_saved", 0.0) for r in results)
+    rate = len(results) / elapsed if elapsed > 0 else 0.0
+    print(
+        f"\n{len(results)} fichier(s) : {n_ok} OK, {len(results) - n_ok} erreur(s) — "
+        f"{elapsed:.2f} s, {rate:.2f} fichiers/s avec {max(workers, 1)} worker(s)",
+        file=out,
+    )
+    n_unreconciled = sum(1 for r in results if r["ok"] and (r.get("reconciliation") or {}).get("status") != "ok")
+    if n_unreconciled:
+        print(f"{n_unreconciled} commande(s) dont les articles ne correspondent pas au Total CHF : à vérifier",
+              file=out)
+    if saved_bytes:
+        print(f"Aller-retour DOCX intermédiaire évité : ~{saved_bytes / 1e6:.1f} Mo, ~{saved_s:.2f} s", file=out)
+    if zip_writer is not None:
+        print(f"Archive : {zip_path} ({zip_writer.count} facture(s))", file=out)
+    if catalog_path:
+        n_known = sum(1 for r in results if r.get("catalog"))
+        print(f"Catalogue {catalog_path} : {n_known} PDF déjà traité(s), {n_ok - n_known} ajouté(s)", file=out)
+    return results
+
+
+def regenerate_from_catalog(commandes: List[str], catalog_path: str, template_bytes: bytes, out_dir: Path,
+                            out=sys.stdout) -> int:
+    """Invoices of already catalogued orders, rebuilt from their stored fields and items (no PDF)."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    missing = 0
+    taken: set = set()
+    with OrderCatalog(catalog_path) as catalog:
+        for commande in commandes:
+            row = catalog.by_commande(commande)
+            if row is None:
+                print(f"ERR   {commande} : absente du catalogue", file=out)
+                missing += 1
+                continue
+            target = _unique_path(out_dir, docx_filename(entry_fields(row), commande), taken)
+            target.write_bytes(catalog.regenerate(row, template_bytes))
+            print(f"OK    {commande} -> {target.name} ({row['n_items']} lignes, PDF {row['source']})", file=out)
+    return 1 if missing else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="PDF → DOCX en lot (commandes fournisseur → factures).")
+    ap.add_argument("inputs", nargs="*", help="Dossier(s), fichier(s) PDF ou motif glob")
+    ap.add_argument("-t", "--template", default=str(DEFAULT_TEMPLATE), help="Modèle Word (.docx)")
+    ap.add_argument("-o", "--output-dir", default=".", help="Dossier de sortie des factures")
+    ap.add_argument("--zip", default=None,
+                    help="Écrit toutes les factures dans cette archive ZIP (au fil de l'eau) au lieu du dossier de sortie")
+    ap.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="Nombre de processus")
+    ap.add_argument("--early-stop", action="store_true",
+                    help="Arrête la détection de tableaux après la récapitulation/les totaux (annexes ignorées)")
+    ap.add_argument("--cache-dir", default=None,
+                    help="Dossier du cache d'analyse (réutilise les résultats d'un PDF déjà traité)")
+    ap.add_argument("--layout-profiles", default=None,
+                    help="Fichier JSON des profils de mise en page fournisseurs (créé/complété au fil des lots)")
+    ap.add_argument("--low-memory", action="store_true",
+                    help="Mode mémoire bornée pour les très gros PDF (pages libérées au fil de l'eau)")
+    ap.add_argument("--memory-limit-mb", type=float, default=None,
+                    help="Plafond de mémoire résidente par processus (Mo) ; le fichier passe en erreur au-delà")
+    ap.add_argument("--text-engine", choices=TEXT_ENGINES, default="pdfplumber",
+                    help="Extraction du texte : pdfplumber, pdfium (rapide, repli si le contrôle qualité échoue) "
+                         "ou auto (pdfium seulement pour les PDF sans tableau quadrillé)")
+    ap.add_argument("--item-engine", choices=ITEM_ENGINES, default="auto",
+                    help="Extraction des articles : auto (tableaux détectés, sinon texte) ou words (positions des "
+                         "colonnes sous l'en-tête, pour les tableaux sans traits ; repli auto si les totaux ne collent pas) ou race "
+                         "(tableaux dans un 2e processus qui relit le PDF pendant le passage texte, le premier dont les "
+                         "totaux concordent au centime l'emporte ; gain modeste, deux processus par PDF)")
+    ap.add_argument("--report-jsonl", default=None,
+                    help="Ajoute les temps par étape et par page de chaque fichier à ce fichier JSONL")
+    ap.add_argument("--catalog", default=None,
+                    help="Catalogue SQLite des commandes traitées : les PDF déjà traités ne sont pas réanalysés, "
+                         "les nouveaux y sont enregistrés")
+    ap.add_argument("--from-catalog", nargs="+", default=None, metavar="COMMANDE",
+                    help="Refait la facture de ces commandes (ex. CF-24-1234) depuis le catalogue, sans le PDF")
+    args = ap.parse_args(argv)
+
+    if args.from_catalog:
+        if not args.catalog:
+            ap.error("--from-catalog nécessite --catalog")
+        return regenerate_from_catalog(args.from_catalog, args.catalog, Path(args.template).read_bytes(),
+                                       Path(args.output_dir))
+    if not args.inputs:
+        ap.error("indiquer au moins un dossier, fichier PDF ou motif glob")
+    pdfs = collect_pdfs(args.inputs)
+    if not pdfs:
+        print("Aucun PDF trouvé.", file=sys.stderr)
+        return 2
+    template_bytes = Path(args.template).read_bytes()
+    results = run_batch(pdfs, template_bytes, Path(args.output_dir), workers=min(args.workers, len(pdfs)),
+                        early_stop=args.early_stop, cache_dir=args.cache_dir,
+                        layout_profiles=args.layout_profiles, report_jsonl=args.report_jsonl,
+                        low_memory=args.low_memory, memory_limit_mb=args.memory_limit_mb,
+                        text_engine=args.text_engine, zip_path=Path(args.zip) if args.zip else None,
+                        item_engine=args.item_engine, catalog_path=args.catalog)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# benchmarks/bench_catalog.py — bulk insert and lookup times of the order catalog
+"""
+Fills an OrderCatalog with N synthetic entries (record_many, one transaction) and times the
+lookups the pipeline does: by PDF hash (duplicate check), by order number and by reference.
+
+    python benchmarks/bench_catalog.py                       # 20'000 entries, temporary file
+    python benchmarks/bench_catalog.py -n 100000 --db /tmp/catalogue.sqlite
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from extract_and_fill import LineItem  # noqa: E402
+from order_catalog import OrderCatalog, catalog_entry, pdf_sha256  # noqa: E402
+
+
+def synthetic_entries(n: int, seed: int = 0) -> List[dict]:
+    rnd = random.Random(seed)
+    items = [LineItem(str(10 * (k + 1)), str(100000 + k), "Vis tête hexagonale M8", "PC", "4", "1.20", "1.20", "4.80", "81")
+             for k in range(12)]
+    entries = []
+    for i in range(n):
+        fields = {"Commande fournisseur": f"CF-{20 + i % 7}-{i:05d}", "Notre référence": f"Acheteur {rnd.randint(1, 40)}",
+                  "Total TTC CHF": "57.60", "Montant Total TTC CHF (PDF)": "62.27"}
+        entries.append(catalog_entry(pdf_sha256(b"%d" % i), fields, items, 0.5, docx_path=f"/factures/{i}.docx",
+                                     source=f"commande-{i}.pdf"))
+    return entries
+
+
+def _per_call_us(fn, args: list) -> float:
+    t0 = time.perf_counter()
+    for a in args:
+        fn(a)
+    return (time.perf_counter() - t0) / len(args) * 1e6
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Temps d'insertion en lot et de recherche du catalogue des commandes.")
+    ap.add_argument("-n", type=int, default=20000, help="Nombre de commandes insérées")
+    ap.add_argument("--lookups", type=int, default=5000, help="Recherches par type")
+    ap.add_argument("--db", default=None, help="Fichier SQLite (défaut : fichier temporaire)")
+    args = ap.parse_args(argv)
+
+    entries = synthetic_entries(args.n)
+    with tempfile.TemporaryDirectory() as tmp:
+        with OrderCatalog(args.db or str(Path(tmp) / "catalogue.sqlite")) as catalog:
+            t0 = time.perf_counter()
+            catalog.record_many(entries)
+            insert_s = time.perf_counter() - t0
+            rnd = random.Random(1)
+            sample = [entries[rnd.randrange(len(entries))] for _ in range(args.lookups)]
+            by_hash = _per_call_us(catalog.by_hash, [e["pdf_sha256"] for e in sample])
+            by_commande = _per_call_us(catalog.by_commande, [e["commande"] for e in sample])
+            missing = _per_call_us(catalog.by_hash, [pdf_sha256(b"absent %d" % i) for i in range(args.lookups)])
+            by_reference = _per_call_us(lambda r: catalog.by_reference(r, limit=10), [e["reference"] for e in sample])
+            total = len(catalog)
+    print(f"{total} commandes insérées en {insert_s:.2f} s ({args.n / insert_s:,.0f} /s, une transaction)")
+    print(f"Recherche par empreinte du PDF : {by_hash:8.1f} µs")
+    print(f"Empreinte absente (PDF nouveau) : {missing:8.1f} µs")
+    print(f"Recherche par n° de commande   : {by_commande:8.1f} µs")
+    print(f"Par référence (10 dernières)   : {by_reference:8.1f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# benchmarks/bench_inputs.py — PDF inputs and DOCX outputs: bytes against paths, mmap and streams
+"""
+Runs analyze_pdf + render on one order, in a fresh interpreter per mode (best of --repeat), and
+reports the time and how much the peak resident memory grew over the process after its imports
+(Linux: VmHWM):
+
+    bytes    what callers did before: PDF read whole into bytes, DOCX returned as bytes and written
+    path     PDF given by its path (read in place), DOCX written to the output path by render(out=)
+    mmap     PDF memory-mapped, DOCX written to an open file
+    stream   PDF as an open binary file, DOCX written to an open file
+
+The default order carries a scanned annex (--scan-kb) so the PDF weighs what scanned orders do.
+
+    python benchmarks/bench_inputs.py
+    python benchmarks/bench_inputs.py --scan-kb 40000 -n 300 --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from synthetic_orders import LAYOUTS, supplier_order_pdf  # noqa: E402
+
+MODES = {
+    "bytes": """
+pdf = Path(src).read_bytes()
+Path(dst).write_bytes(analyze_pdf(pdf, template).render())
+""",
+    "path": """
+analyze_pdf(src, template).render(out=dst)
+""",
+    "mmap": """
+import mmap
+with open(src, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, open(dst, "wb") as out:
+    analyze_pdf(mm, template).render(out=out)
+""",
+    "stream": """
+with open(src, "rb") as f, open(dst, "wb") as out:
+    analyze_pdf(f, template).render(out=out)
+""",
+}
+
+# Peak RSS from VmHWM: ru_maxrss would carry the parent's peak over the exec (Linux only).
+_RUN = """
+import json, time
+from pathlib import Path
+from extract_and_fill import analyze_pdf, compile_template, preload
+def peak_kib():
+    with open("/proc/self/status") as f:
+        return next(int(ln.split()[1]) for ln in f if ln.startswith("VmHWM:"))
+preload()
+src, dst = {src!r}, {dst!r}
+template = compile_template(Path({template!r}).read_bytes())
+base = peak_kib()
+t0 = time.perf_counter()
+{code}
+print(json.dumps({{"s": time.perf_counter() - t0, "rss_mib": (peak_kib() - base) / 1024}}))
+"""
+
+
+def run_mode(mode: str, src: str, dst: str, template: str) -> Dict[str, float]:
+    code = _RUN.format(src=src, dst=dst, template=template, code=MODES[mode].strip())
+    out = subprocess.run([sys.executable, "-c", code], cwd=str(ROOT), capture_output=True, text=True, check=True,
+                         env={**os.environ, "PYTHONPATH": str(ROOT)})
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Entrées PDF (octets, chemin, mmap, fichier ouvert) et sorties DOCX "
+                                             "(octets, chemin, flux) : temps et mémoire de pointe.")
+    ap.add_argument("pdf", nargs="?", default=None, help="PDF à traiter (défaut : commande synthétique)")
+    ap.add_argument("-n", type=int, default=50, help="Articles de la commande synthétique")
+    ap.add_argument("--layout", choices=LAYOUTS, default="ruled")
+    ap.add_argument("--scan-kb", type=int, default=20000, help="Annexe scannée de la commande synthétique (Ko)")
+    ap.add_argument("--template", default=str(ROOT / "template.docx"), help="Modèle Word (.docx)")
+    ap.add_argument("--repeat", type=int, default=3, help="Meilleur résultat sur N interpréteurs")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = args.pdf
+        if src is None:
+            src = str(Path(tmp) / "commande.pdf")
+            Path(src).write_bytes(supplier_order_pdf(args.n, args.layout, seed=1, scan_kb=args.scan_kb))
+        print(f"{Path(src).name} : {Path(src).stat().st_size / 2 ** 20:.1f} Mio")
+        print(f"{'mode':<8} {'s':>7} {'mémoire +Mio':>13}")
+        sizes = set()
+        for mode in MODES:
+            dst = str(Path(tmp) / f"facture-{mode}.docx")
+            runs = [run_mode(mode, src, dst, args.template) for _ in range(args.repeat)]
+            best_s = min(r["s"] for r in runs)
+            best_rss = min(r["rss_mib"] for r in runs)
+            sizes.add(Path(dst).stat().st_size)
+            print(f"{mode:<8} {best_s:7.3f} {best_rss:13.1f}")
+    if len(sizes) != 1:
+        print("Les DOCX produits n'ont pas tous la même taille", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
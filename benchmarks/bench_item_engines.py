@@ -0,0 +1,111 @@
+# benchmarks/bench_item_engines.py — line-item extraction: table detection vs text vs word positions
+"""
+Times the ways of getting the line items out of an order, each from a fresh pdfplumber pass:
+
+    page   text + table detection over whole pages (table_roi=False), combine_detected_tables
+    table  same, table detection restricted to the items region of each page (default)
+    text   text only, reconstruct_items_from_text (what "auto" does when no table is found)
+    words  text only, WordItemParser on the same words (item_engine="words")
+
+and reports per file the time, the rows found and whether their line totals add up to "Total CHF",
+plus the number of tables detected with and without the items region.
+
+    python benchmarks/bench_item_engines.py                    # synthetic orders, every layout
+    python benchmarks/bench_item_engines.py commandes/         # our corpus
+"""
+import argparse
+import json
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from batch_cli import collect_pdfs  # noqa: E402
+from document_text import DocumentText  # noqa: E402
+from extract_and_fill import (WordItemParser, combine_detected_tables, extract_text_and_tables_from_pdf,  # noqa: E402
+                              items_total_issue, reconstruct_items_from_text)
+from synthetic_orders import LAYOUTS, supplier_order_pdf  # noqa: E402
+
+PATHS = ("page", "table", "text", "words")
+
+
+def synthetic_corpus() -> List[Tuple[str, bytes]]:
+    return [(f"synth-{layout}-{n}.pdf", supplier_order_pdf(n, layout, seed=n))
+            for layout in LAYOUTS for n in (5, 50, 300)]
+
+
+def run_path(path: str, pdf_bytes: bytes):
+    """(items, text, tables detected) for one path; the text is what the totals are checked against."""
+    if path in ("page", "table"):
+        raw_text, tables = extract_text_and_tables_from_pdf(BytesIO(pdf_bytes), table_roi=path == "table")
+        return combine_detected_tables(tables), raw_text, len(tables)
+    if path == "text":
+        raw_text, _ = extract_text_and_tables_from_pdf(BytesIO(pdf_bytes), detect_tables=False)
+        return reconstruct_items_from_text(DocumentText(raw_text)), raw_text, 0
+    parser = WordItemParser()
+    raw_text, _ = extract_text_and_tables_from_pdf(BytesIO(pdf_bytes), detect_tables=False, word_parser=parser)
+    return parser.items(), raw_text, 0
+
+
+def bench_file(name: str, pdf_bytes: bytes, repeat: int = 1) -> Dict[str, object]:
+    row: Dict[str, object] = {"pdf": name}
+    for path in PATHS:
+        best = None
+        try:
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                items, raw_text, n_tables = run_path(path, pdf_bytes)
+                dt = time.perf_counter() - t0
+                best = dt if best is None else min(best, dt)
+        except Exception as e:
+            row[path] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        row[path] = {"s": round(best, 4), "rows": 0 if items is None else len(items),
+                     "issue": items_total_issue(items, raw_text), "tables": n_tables}
+    return row
+
+
+def _cell(r: Dict[str, object]) -> str:
+    if "error" in r:
+        return f"{'ERR':>20}"
+    return f"{r['s']:>8.3f} {r['rows']:>5} {'ok' if r['issue'] is None else '≠':>5}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Compare l'extraction des articles : tableaux détectés (page entière ou "
+                                             "zone des articles), texte, positions des mots.")
+    ap.add_argument("inputs", nargs="*", help="Dossier(s), fichier(s) PDF ou motif glob (défaut : commandes synthétiques)")
+    ap.add_argument("--repeat", type=int, default=1, help="Meilleur temps sur N passes")
+    ap.add_argument("--json", default=None, help="Écrit les résultats détaillés dans ce fichier JSON")
+    args = ap.parse_args(argv)
+
+    corpus = [(p.name, p.read_bytes()) for p in collect_pdfs(args.inputs)] if args.inputs else synthetic_corpus()
+    if not corpus:
+        print("Aucun PDF trouvé.", file=sys.stderr)
+        return 2
+
+    print(f"{'fichier':<28} " + " ".join(f"{p + ' s':>8} {'art.':>5} {'total':>5}" for p in PATHS) + "  tableaux")
+    rows = []
+    for name, pdf_bytes in corpus:
+        r = bench_file(name, pdf_bytes, args.repeat)
+        rows.append(r)
+        print(f"{name[:28]:<28} " + " ".join(_cell(r[p]) for p in PATHS)
+              + f"  {r['page'].get('tables', '-')} -> {r['table'].get('tables', '-')}")
+
+    print()
+    for path in PATHS:
+        ok = [r[path] for r in rows if "error" not in r[path]]
+        print(f"{path:<6} : {sum(x['s'] for x in ok):.2f} s au total, "
+              f"totaux justes pour {sum(1 for x in ok if x['issue'] is None)}/{len(rows)} fichier(s)"
+              + (f", {sum(x['tables'] for x in ok)} tableau(x) détecté(s)" if path in ("page", "table") else ""))
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2, ensure_ascii=False), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# benchmarks/bench_item_race.py — item_engine="race" against "auto": latency, winner, reconciliation
+"""
+Runs analyze_pdf on each order with item_engine="auto" and item_engine="race" and reports per
+file the wall time, the strategy that gave the items, the reconciliation of their line totals
+with "Total CHF" (reconcile_items, exact decimals), the candidates checked by the race and
+whether the table process was cancelled, and whether both engines give the same items.
+
+The race needs a second CPU to run the table strategy alongside the text pass; on a single
+CPU it checks the text candidates first and runs the table strategy only if none reconciles.
+
+    python benchmarks/bench_item_race.py                    # synthetic orders, every layout
+    python benchmarks/bench_item_race.py commandes/ --repeat 3
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from batch_cli import collect_pdfs  # noqa: E402
+from bench_item_engines import synthetic_corpus  # noqa: E402
+from extract_and_fill import analyze_pdf, compile_template  # noqa: E402
+from pipeline_report import PipelineReport  # noqa: E402
+
+ENGINES = ("auto", "race")
+
+
+def bench_file(name: str, pdf_bytes: bytes, template, repeat: int = 1) -> Dict[str, object]:
+    row: Dict[str, object] = {"pdf": name}
+    items = {}
+    for engine in ENGINES:
+        best = None
+        for _ in range(repeat):
+            report = PipelineReport()
+            t0 = time.perf_counter()
+            draft = analyze_pdf(pdf_bytes, template, item_engine=engine, report=report)
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        items[engine] = draft.items
+        row[engine] = {"s": round(best, 4), "rows": len(draft.items), "source": report.meta.get("items_source"),
+                       "reconciliation": draft.reconciliation, "checked": report.meta.get("race_checked"),
+                       "cancelled": report.meta.get("race_cancelled")}
+    row["same"] = items["auto"] == items["race"]
+    return row
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Compare item_engine race et auto : temps, stratégie retenue, "
+                                             "concordance des articles avec le Total CHF.")
+    ap.add_argument("inputs", nargs="*", help="Dossier(s), fichier(s) PDF ou motif glob (défaut : commandes synthétiques)")
+    ap.add_argument("--template", default=str(ROOT / "template.docx"), help="Modèle Word (.docx)")
+    ap.add_argument("--repeat", type=int, default=1, help="Meilleur temps sur N passes")
+    ap.add_argument("--json", default=None, help="Écrit les résultats détaillés dans ce fichier JSON")
+    args = ap.parse_args(argv)
+
+    corpus = [(p.name, p.read_bytes()) for p in collect_pdfs(args.inputs)] if args.inputs else synthetic_corpus()
+    if not corpus:
+        print("Aucun PDF trouvé.", file=sys.stderr)
+        return 2
+    template = compile_template(Path(args.template).read_bytes())
+
+    print(f"{os.cpu_count() or 1} CPU")
+    print(f"{'fichier':<28} {'auto s':>7} {'totaux':>7}  {'race s':>7} {'totaux':>7} {'retenu':>7}  "
+          f"{'annulé':>6}  identiques  candidats")
+    rows = []
+    for name, pdf_bytes in corpus:
+        r = bench_file(name, pdf_bytes, template, args.repeat)
+        rows.append(r)
+        a, b = r["auto"], r["race"]
+        checked = ", ".join(f"{k} {v}" for k, v in (b["checked"] or {}).items())
+        print(f"{name[:28]:<28} {a['s']:>7.3f} {a['reconciliation']['status']:>7}  {b['s']:>7.3f} "
+              f"{b['reconciliation']['status']:>7} {b['source']:>7}  {'oui' if b['cancelled'] else '-':>6}  "
+              f"{'oui' if r['same'] else 'non':>10}  {checked}")
+
+    print()
+    for engine in ENGINES:
+        print(f"{engine:<5} : {sum(r[engine]['s'] for r in rows):.2f} s au total, totaux concordants pour "
+              f"{sum(1 for r in rows if r[engine]['reconciliation']['status'] == 'ok')}/{len(rows)} fichier(s)")
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2, ensure_ascii=False), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# benchmarks/bench_line_items.py — per-row cost of the line-item core: LineItem records vs DataFrames
+"""
+Times the item steps that do not depend on the PDF library, on pdfplumber-like raw tables of N
+rows (split in pages of --page-rows rows, with a "Délai de réception :" line every 7 items):
+
+    tables   raw tables -> cleaned tables -> candidate rows -> combined items -> cleaned items
+    rows     reading the values of every row for the invoice table (what _stamp_data_rows does)
+    memory   size per item of the result, strings included (DataFrame.memory_usage(deep=True)
+             against the LineItem objects, their strings and the list)
+
+for the current core (DetectedTable / LineItem lists) and for the DataFrame pipeline it replaced
+(PARSER_VERSION 49, reproduced below), and checks that both give the same items.
+
+    python benchmarks/bench_line_items.py
+    python benchmarks/bench_line_items.py -n 100 1000 10000 --repeat 7
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd  # noqa: E402
+
+from document_text import fold_cell  # noqa: E402
+from extract_and_fill import (COLUMNS_TARGET, ITEM_TABLE_COLUMNS, _ITEM_ATTR, _detected_table,  # noqa: E402
+                              clean_items, combine_detected_tables)
+
+
+# --- DataFrame pipeline of PARSER_VERSION 49 (reference) ---
+
+def _df_clean(df):
+    df.columns = [str(c).strip() for c in df.columns]
+    df = df.map(lambda x: (str(x).strip() if x is not None else ""))
+    df = df.loc[~(df.apply(lambda r: all((not str(v).strip()) for v in r), axis=1))]
+    return df.reset_index(drop=True)
+
+
+def _df_table(raw):
+    header = raw[0]; rows = raw[1:]
+    df = pd.DataFrame(rows, columns=[(h or "").strip() for h in header])
+    return _df_clean(df)
+
+
+def _df_candidate_rows(df):
+    dfc = _df_clean(df)
+    cols_norm = [fold_cell(str(c)) for c in dfc.columns]
+    if cols_norm and ("pos" not in cols_norm):
+        first_col = dfc.columns[0]
+        if dfc[first_col].astype(str).str.fullmatch(r"\d{1,5}").fillna(False).any():
+            dfc = dfc.rename(columns={first_col: "Pos"})
+    if "Pos" not in dfc.columns:
+        return None
+    return [r for r in dfc.to_dict(orient="records") if str(r["Pos"]).strip().isdigit() and int(str(r["Pos"]).strip()) % 10 == 0]
+
+
+def _df_combine(tables):
+    rows = []
+    for df in tables:
+        rows.extend(_df_candidate_rows(df) or [])
+    merged = pd.DataFrame(rows)
+    for col in COLUMNS_TARGET:
+        if col not in merged.columns:
+            merged[col] = ""
+    return merged[COLUMNS_TARGET].reset_index(drop=True)
+
+
+def _df_clean_items(df):
+    filtered = []
+    for _, r in df.iterrows():
+        first_non_empty = ""
+        for v in r.tolist():
+            s = str(v).strip() if v is not None else ""
+            if s: first_non_empty = fold_cell(s); break
+        if first_non_empty.startswith("indice :") or first_non_empty.startswith("delai de reception :"):
+            continue
+        filtered.append(r)
+    new_df = pd.DataFrame(filtered, columns=df.columns) if filtered else df.iloc[0:0].copy()
+    keep_cols = [c for c in new_df.columns if fold_cell(str(c)).strip() != "tva"]
+    return new_df[keep_cols].reset_index(drop=True)
+
+
+def df_pipeline(raw_tables):
+    return _df_clean_items(_df_combine([_df_table(raw) for raw in raw_tables]))
+
+
+def df_row_values(df) -> int:
+    n = 0
+    for values in df.itertuples(index=False, name=None):
+        for v in values:
+            n += len("" if pd.isna(v) else str(v))
+    return n
+
+
+# --- current core ---
+
+def item_pipeline(raw_tables):
+    return clean_items(combine_detected_tables([_detected_table(raw) for raw in raw_tables]))
+
+
+def item_row_values(items) -> int:
+    attrs = [_ITEM_ATTR[c] for c in ITEM_TABLE_COLUMNS]
+    n = 0
+    for item in items:
+        for a in attrs:
+            n += len(getattr(item, a))
+    return n
+
+
+def raw_tables(n: int, page_rows: int) -> List[list]:
+    """pdfplumber extract_tables()-like output: header + rows of cell strings (None for empty cells)."""
+    rows = []
+    for k in range(n):
+        pos = 10 * (k + 1)
+        rows.append([f" {pos}", str(100000 + k), f"Vis tête hexagonale M{k % 20 + 4} inox A2", "PC", str(k % 50 + 1),
+                     "1.20", "1.20", f"{(k % 50 + 1) * 1.2:.2f}", "81"])
+        if k % 7 == 0:
+            rows.append(["Délai de réception : 16.12.2025", None, None, None, None, None, None, None, None])
+    return [[list(COLUMNS_TARGET)] + rows[i:i + page_rows] for i in range(0, len(rows), page_rows)]
+
+
+def _best(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def items_size(items) -> int:
+    return sys.getsizeof(items) + sum(sys.getsizeof(it) + sum(sys.getsizeof(v) for v in it.values()) for it in items)
+
+
+def bench(n: int, page_rows: int, repeat: int) -> Dict[str, float]:
+    tables = raw_tables(n, page_rows)
+    df = df_pipeline(tables)
+    items = item_pipeline(tables)
+    same = df.astype(str).values.tolist() == [it.values(ITEM_TABLE_COLUMNS) for it in items]
+    return {"n": n, "same": same,
+            "df_tables": _best(lambda: df_pipeline(tables), repeat),
+            "item_tables": _best(lambda: item_pipeline(tables), repeat),
+            "df_rows": _best(lambda: df_row_values(df), repeat),
+            "item_rows": _best(lambda: item_row_values(items), repeat),
+            "df_bytes": int(df.memory_usage(deep=True).sum()) / n,
+            "item_bytes": items_size(items) / n}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Coût par article du cœur des articles : enregistrements LineItem "
+                                             "contre DataFrame (pipeline précédent).")
+    ap.add_argument("-n", type=int, nargs="+", default=[10, 100, 1000, 5000], help="Nombres d'articles")
+    ap.add_argument("--page-rows", type=int, default=30, help="Lignes par tableau (page)")
+    ap.add_argument("--repeat", type=int, default=5, help="Meilleur temps sur N passes")
+    args = ap.parse_args(argv)
+
+    print(f"{'articles':>8}  {'tableaux µs/art.':>22}  {'lecture µs/art.':>20}  {'octets/art.':>17}  identiques")
+    print(f"{'':>8}  {'DataFrame':>10} {'LineItem':>11}  {'DataFrame':>10} {'LineItem':>9}  {'DataFrame':>9} {'LineItem':>7}")
+    ok = True
+    for n in args.n:
+        r = bench(n, args.page_rows, args.repeat)
+        ok = ok and r["same"]
+        us = lambda k: r[k] / n * 1e6  # noqa: E731
+        print(f"{n:>8}  {us('df_tables'):>10.1f} {us('item_tables'):>11.2f}  {us('df_rows'):>10.2f} {us('item_rows'):>9.2f}"
+              f"  {r['df_bytes']:>9.0f} {r['item_bytes']:>7.0f}  {'oui' if r['same'] else 'NON'}"
+              f"   (x{r['df_tables'] / r['item_tables']:.0f} sur les tableaux)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+# benchmarks/bench_pipeline.py — timing of the public pipeline stages on synthetic orders
+"""
+Times each public stage of extract_and_fill on synthetic supplier orders (benchmarks/synthetic_orders.py),
+for every layout and a range of line-item counts, prints the scaling curves and compares against a stored
+baseline: any stage slower than the baseline by more than the threshold fails the run (exit code 1).
+
+    python benchmarks/bench_pipeline.py                    # default sizes, compare to baseline.json
+    python benchmarks/bench_pipeline.py --full             # up to 2000 line items
+    python benchmarks/bench_pipeline.py --save-baseline    # record this machine's baseline
+
+Baselines are machine-specific: record one on the machine that runs the comparison. A baseline
+recorded with another PARSER_VERSION is refused (exit code 2): record it again with --save-baseline.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from extract_and_fill import (PARSER_VERSION, build_final_doc, extract_text_and_tables_from_pdf,  # noqa: E402
+                              parse_fields_from_text, process_pdf_to_docx, reconstruct_items_from_text)
+from synthetic_orders import LAYOUTS, supplier_order_pdf  # noqa: E402
+
+STAGES = ["extract_text_and_tables_from_pdf", "parse_fields_from_text", "reconstruct_items_from_text",
+          "process_pdf_to_docx", "build_final_doc"]
+DEFAULT_SIZES = [1, 10, 100, 500]
+FULL_SIZES = [1, 10, 100, 500, 1000, 2000]
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_THRESHOLD = 0.25
+# Differences below this many seconds are timer noise, never a regression.
+MIN_DELTA_S = 0.05
+# Stop repeating a measurement once it has used this much time.
+REPEAT_BUDGET_S = 5.0
+
+
+def _best_of(fn: Callable[[], object], repeat: int) -> Tuple[float, object]:
+    best, result, spent = math.inf, None, 0.0
+    for _ in range(max(repeat, 1)):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        best, spent = min(best, dt), spent + dt
+        if spent > REPEAT_BUDGET_S:
+            break
+    return best, result
+
+
+def pdf_page_count(pdf_bytes: bytes) -> int:
+    return pdf_bytes.count(b"/Type /Page ")
+
+
+def bench_case(template_bytes: bytes, n_items: int, layout: str, pages: Optional[int] = None,
+               repeat: int = 5) -> Dict[str, object]:
+    """Best-of-`repeat` seconds for every stage on one synthetic order."""
+    pdf = supplier_order_pdf(n_items, layout, pages=pages)
+    timings: Dict[str, float] = {}
+    timings["extract_text_and_tables_from_pdf"], (text, _tables) = _best_of(
+        lambda: extract_text_and_tables_from_pdf(BytesIO(pdf)), repeat)
+    timings["parse_fields_from_text"], _ = _best_of(lambda: parse_fields_from_text(text), repeat)
+    timings["reconstruct_items_from_text"], items = _best_of(lambda: reconstruct_items_from_text(text), repeat)
+    timings["process_pdf_to_docx"], (doc_bytes, fields, found) = _best_of(
+        lambda: process_pdf_to_docx(pdf, template_bytes), repeat)
+    total_ttc = fields.get("Total TTC CHF", "")
+    timings["build_final_doc"], _ = _best_of(lambda: build_final_doc(doc_bytes, found, total_ttc), repeat)
+    return {"layout": layout, "items": n_items, "pages": pdf_page_count(pdf), "rows_found": len(found),
+            "rows_from_text": len(items), "seconds": {k: round(v, 6) for k, v in timings.items()}}
+
+
+def case_key(layout: str, n_items: int, stage: str) -> str:
+    return f"{layout}/{n_items}/{stage}"
+
+
+def flatten(results: List[Dict[str, object]]) -> Dict[str, float]:
+    return {case_key(r["layout"], r["items"], s): t for r in results for s, t in r["seconds"].items()}
+
+
+def scaling_exponent(points: List[Tuple[int, float]]) -> Optional[float]:
+    """Least-squares slope of log(time) vs log(items): ~1 linear, ~2 quadratic."""
+    pts = [(math.log(n), math.log(t)) for n, t in points if n >= 10 and t > 0]
+    if len(pts) < 2:
+        return None
+    mx = sum(x for x, _ in pts) / len(pts)
+    my = sum(y for _, y in pts) / len(pts)
+    sxx = sum((x - mx) ** 2 for x, _ in pts)
+    return sum((x - mx) * (y - my) for x, y in pts) / sxx if sxx else None
+
+
+def print_curves(results: List[Dict[str, object]], out=sys.stdout):
+    short = {"extract_text_and_tables_from_pdf": "extract", "parse_fields_from_text": "fields",
+             "reconstruct_items_from_text": "items_txt", "process_pdf_to_docx": "process", "build_final_doc": "build"}
+    for layout in LAYOUTS:
+        rows = [r for r in results if r["layout"] == layout]
+        if not rows:
+            continue
+        print(f"\n== {layout} ==", file=out)
+        print(f"{'articles':>8} {'pages':>5} {'lignes':>6} " + " ".join(f"{short[s]:>10}" for s in STAGES), file=out)
+        for r in rows:
+            print(f"{r['items']:>8} {r['pages']:>5} {r['rows_found']:>6} "
+                  + " ".join(f"{r['seconds'][s]:>10.4f}" for s in STAGES), file=out)
+        exps = [scaling_exponent([(r["items"], r["seconds"][s]) for r in rows]) for s in STAGES]
+        print(f"{'n^k':>21} " + " ".join(f"{'-' if k is None else f'{k:.2f}':>10}" for k in exps), file=out)
+
+
+def compare(current: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """Keys slower than baseline*(1+threshold) (and by more than MIN_DELTA_S), formatted for display."""
+    regressions = []
+    for key, base in sorted(baseline.items()):
+        cur = current.get(key)
+        if cur is None or base <= 0:
+            continue
+        if cur > base * (1 + threshold) and cur - base > MIN_DELTA_S:
+            regressions.append(f"{key}: {base:.4f} s -> {cur:.4f} s (+{(cur / base - 1) * 100:.0f} %)")
+    return regressions
+
+
+def machine_info() -> Dict[str, str]:
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+            "cpus": str(os.cpu_count()), "parser_version": PARSER_VERSION}
+
+
+def baseline_parser_version(stored: Dict[str, object]) -> Optional[str]:
+    return stored.get("machine", {}).get("parser_version")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark du pipeline PDF → DOCX sur des commandes synthétiques.")
+    ap.add_argument("--sizes", default=None, help="Nombres d'articles, séparés par des virgules (défaut 1,10,100,500)")
+    ap.add_argument("--full", action="store_true", help="Jusqu'à 2000 articles")
+    ap.add_argument("--layouts", default=",".join(LAYOUTS), help="Mises en page, séparées par des virgules (plain, ruled, columns)")
+    ap.add_argument("--pages", type=int, default=None, help="Nombre minimal de pages par commande (annexes ajoutées)")
+    ap.add_argument("--repeat", type=int, default=5, help="Mesures par étape (meilleur temps retenu)")
+    ap.add_argument("-t", "--template", default=str(ROOT / "template.docx"), help="Modèle Word (.docx)")
+    ap.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Fichier de référence JSON")
+    ap.add_argument("--save-baseline", action="store_true", help="Enregistre ces mesures comme référence")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                    help="Ralentissement toléré avant échec (0.25 = +25 %%)")
+    ap.add_argument("--json", default=None, help="Écrit les résultats détaillés dans ce fichier JSON")
+    args = ap.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",")] if args.sizes else (FULL_SIZES if args.full else DEFAULT_SIZES)
+    layouts = [l.strip() for l in args.layouts.split(",") if l.strip()]
+    template_bytes = Path(args.template).read_bytes()
+
+    results = []
+    for layout in layouts:
+        for n in sizes:
+            r = bench_case(template_bytes, n, layout, pages=args.pages, repeat=args.repeat)
+            print(f"{layout:>5} {n:>5} articles : {sum(r['seconds'].values()):.2f} s", file=sys.stderr)
+            if r["rows_found"] != n:
+                print(f"      attention : {r['rows_found']} lignes trouvées sur {n}", file=sys.stderr)
+            results.append(r)
+    print_curves(results)
+
+    current = flatten(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"machine": machine_info(), "results": results}, indent=2, ensure_ascii=False),
+                                   encoding="utf-8")
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        stored = json.loads(baseline_path.read_text(encoding="utf-8")) if baseline_path.exists() else {}
+        # Measures of another parser version are dropped, not merged with these.
+        seconds = dict(stored.get("seconds", {})) if baseline_parser_version(stored) == PARSER_VERSION else {}
+        seconds.update(current)
+        baseline_path.write_text(json.dumps({"machine": machine_info(), "seconds": seconds}, indent=2, sort_keys=True),
+                                 encoding="utf-8")
+        print(f"\nRéférence enregistrée : {baseline_path} ({len(current)} mesures)")
+        return 0
+    if not baseline_path.exists():
+        print(f"\nPas de référence ({baseline_path}) : lancer avec --save-baseline pour en créer une.")
+        return 0
+
+    stored = json.loads(baseline_path.read_text(encoding="utf-8"))
+    if baseline_parser_version(stored) != PARSER_VERSION:
+        print(f"\nRéférence enregistrée avec PARSER_VERSION {baseline_parser_version(stored)} (actuelle : "
+              f"{PARSER_VERSION}) : relancer avec --save-baseline.", file=sys.stderr)
+        return 2
+    if stored.get("machine", {}).get("machine") != platform.machine():
+        print("\nattention : référence enregistrée sur une autre machine, comparaison indicative.", file=sys.stderr)
+    regressions = compare(current, stored.get("seconds", {}), args.threshold)
+    if regressions:
+        print(f"\nRÉGRESSION : {len(regressions)} mesure(s) au-delà de +{args.threshold * 100:.0f} % :")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nOK : aucune mesure au-delà de +{args.threshold * 100:.0f} % par rapport à la référence.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+# benchmarks/bench_startup.py — cold start: import time of our modules and first-call latency
+"""
+Each measure runs in a fresh interpreter (best of --repeat):
+
+    import      time to import the module, and which heavy libraries (pandas, pdfplumber,
+                python-docx, pypdfium2) that import pulled in
+    first call  analyze_pdf + render of a synthetic order right after the import (imports the
+                libraries it needs), then the same call again in the same process
+    template    what the Streamlit app pays per rerun for the template: read + compile_template()
+                on fresh bytes, versus the cached (bytes, CompiledTemplate) it now keeps
+
+Exits with code 1 when one of the light entry points (extract_and_fill, the app's imports, the
+CLIs) imports a heavy library again.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --json startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ("pandas", "pdfplumber", "docx", "pypdfium2")
+# Label -> modules imported; "app" is what streamlit_app.py imports before drawing anything.
+ENTRY_POINTS = {
+    "extract_and_fill": ["extract_and_fill"],
+    "app": ["streamlit", "analysis_cache", "extract_and_fill", "upload_queue", "zip_export"],
+    "batch_cli": ["batch_cli"],
+    "job_service": ["job_service"],
+    "order_catalog": ["order_catalog"],
+}
+# Reference points: the libraries on their own.
+LIBRARIES = {name: [name] for name in ("streamlit",) + HEAVY}
+
+_IMPORT = """
+import importlib, json, sys, time
+t0 = time.perf_counter()
+for m in {modules!r}:
+    importlib.import_module(m)
+print(json.dumps({{"s": time.perf_counter() - t0, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_FIRST_CALL = """
+import json, sys, time
+t0 = time.perf_counter()
+from extract_and_fill import analyze_pdf
+from synthetic_orders import supplier_order_pdf
+imported = time.perf_counter() - t0
+pdf = supplier_order_pdf({n}, "ruled", seed=1)
+template = open({template!r}, "rb").read()
+times = []
+for _ in range(2):
+    t0 = time.perf_counter()
+    analyze_pdf(pdf, template).render()
+    times.append(time.perf_counter() - t0)
+print(json.dumps({{"import": imported, "first": times[0], "second": times[1]}}))
+"""
+
+_TEMPLATE = """
+import json, time
+from pathlib import Path
+from extract_and_fill import compile_template
+path = Path({template!r})
+data = path.read_bytes()
+compile_template(data)
+n = 200
+t0 = time.perf_counter()
+for _ in range(n):
+    compile_template(path.read_bytes())
+fresh = (time.perf_counter() - t0) / n
+t0 = time.perf_counter()
+for _ in range(n):
+    path.stat().st_mtime
+    compile_template(data)
+reuse = (time.perf_counter() - t0) / n
+print(json.dumps({{"fresh": fresh, "cached": reuse}}))
+"""
+
+
+def _run(code: str) -> Dict[str, object]:
+    out = subprocess.run([sys.executable, "-c", code], cwd=str(ROOT), capture_output=True, text=True, check=True,
+                         env={**os.environ, "PYTHONPATH": os.pathsep.join([str(ROOT), str(ROOT / "benchmarks")])})
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def best_of(code: str, repeat: int, key: str) -> Dict[str, object]:
+    runs = [_run(code) for _ in range(repeat)]
+    return min(runs, key=lambda r: r[key])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Temps d'import des modules et latence du premier appel "
+                                             "(démarrage à froid), chacun dans un nouvel interpréteur.")
+    ap.add_argument("--repeat", type=int, default=5, help="Meilleur temps sur N interpréteurs")
+    ap.add_argument("-n", type=int, default=50, help="Articles de la commande synthétique du premier appel")
+    ap.add_argument("--template", default=str(ROOT / "template.docx"), help="Modèle Word (.docx)")
+    ap.add_argument("--json", default=None, help="Écrit les mesures dans ce fichier JSON")
+    args = ap.parse_args(argv)
+
+    results: Dict[str, object] = {"imports": {}, "libraries": {}}
+    regressions = []
+    print(f"{'import':<18} {'s':>7}  bibliothèques lourdes chargées")
+    for label, modules in ENTRY_POINTS.items():
+        r = best_of(_IMPORT.format(modules=modules, heavy=HEAVY), args.repeat, "s")
+        results["imports"][label] = r
+        print(f"{label:<18} {r['s']:7.3f}  {', '.join(r['heavy']) or '-'}")
+        if r["heavy"]:
+            regressions.append(label)
+    print()
+    for label, modules in LIBRARIES.items():
+        try:
+            r = best_of(_IMPORT.format(modules=modules, heavy=()), args.repeat, "s")
+        except subprocess.CalledProcessError:
+            continue  # optional library not installed
+        results["libraries"][label] = r["s"]
+        print(f"{label + ' (seul)':<18} {r['s']:7.3f}")
+
+    first = best_of(_FIRST_CALL.format(n=args.n, template=args.template), args.repeat, "first")
+    results["first_call"] = first
+    print(f"\nanalyze_pdf + render ({args.n} articles) : import {first['import']:.3f} s, "
+          f"1er appel {first['first']:.3f} s, 2e appel {first['second']:.3f} s")
+
+    tmpl = best_of(_TEMPLATE.format(template=args.template), args.repeat, "cached")
+    results["template"] = tmpl
+    print(f"Modèle par exécution de l'app : lu et compilé {tmpl['fresh'] * 1e6:.0f} µs, "
+          f"en cache {tmpl['cached'] * 1e6:.1f} µs")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    if regressions:
+        print(f"\nImport lourd à nouveau : {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# benchmarks/bench_text_engines.py — pdfplumber vs pypdfium2 text engine on a PDF corpus
+"""
+Runs analyze_pdf on every PDF of a corpus with text_engine="pdfplumber" (reference) and with the
+fast engine ("auto" by default, or "pdfium"), then reports per file: the engine actually used (or
+why it fell back), both timings, and whether fields and items match the reference.
+
+    python benchmarks/bench_text_engines.py commandes/            # our corpus
+    python benchmarks/bench_text_engines.py --engine pdfium commandes/*.pdf
+    python benchmarks/bench_text_engines.py                       # synthetic orders when no corpus is given
+
+Differences are expected with --engine pdfium on ruled orders (text path instead of table path).
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from batch_cli import collect_pdfs  # noqa: E402
+from extract_and_fill import analyze_pdf, extract_text_pdfium  # noqa: E402
+from synthetic_orders import supplier_order_pdf  # noqa: E402
+
+
+def synthetic_corpus() -> List[Tuple[str, bytes]]:
+    return [(f"synth-{layout}-{n}.pdf", supplier_order_pdf(n, layout, seed=n))
+            for layout in ("plain", "ruled") for n in (5, 50, 300)]
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+
+def compare_file(name: str, pdf_bytes: bytes, template_bytes: bytes, engine: str) -> Dict[str, object]:
+    row: Dict[str, object] = {"pdf": name}
+    try:
+        row["pdfium_text_s"], _ = _timed(lambda: extract_text_pdfium(pdf_bytes))
+    except Exception as e:
+        row["pdfium_text_s"] = None
+        row["pdfium_error"] = f"{type(e).__name__}: {e}"
+    try:
+        ref_s, ref = _timed(lambda: analyze_pdf(pdf_bytes, template_bytes))
+        fast_s, fast = _timed(lambda: analyze_pdf(pdf_bytes, template_bytes, text_engine=engine))
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+        return row
+    row.update(engine=fast.engine, reference_s=round(ref_s, 4), fast_s=round(fast_s, 4),
+               speedup=round(ref_s / fast_s, 2) if fast_s > 0 else None,
+               same_fields={k: v for k, v in ref.fields.items() if k != "date du jour"}
+               == {k: v for k, v in fast.fields.items() if k != "date du jour"},
+               same_items=ref.items == fast.items, n_items=len(ref.items))
+    return row
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Compare les moteurs de texte pdfplumber et pypdfium2 sur un corpus.")
+    ap.add_argument("inputs", nargs="*", help="Dossier(s), fichier(s) PDF ou motif glob (défaut : commandes synthétiques)")
+    ap.add_argument("--engine", choices=("auto", "pdfium"), default="auto", help="Moteur rapide à comparer")
+    ap.add_argument("-t", "--template", default=str(ROOT / "template.docx"), help="Modèle Word (.docx)")
+    ap.add_argument("--json", default=None, help="Écrit les résultats détaillés dans ce fichier JSON")
+    args = ap.parse_args(argv)
+
+    template_bytes = Path(args.template).read_bytes()
+    if args.inputs:
+        corpus = [(p.name, p.read_bytes()) for p in collect_pdfs(args.inputs)]
+    else:
+        corpus = synthetic_corpus()
+    if not corpus:
+        print("Aucun PDF trouvé.", file=sys.stderr)
+        return 2
+
+    rows = []
+    print(f"{'fichier':<32} {'réf. s':>8} {args.engine + ' s':>8} {'gain':>6} {'champs':>7} {'articles':>8}  moteur")
+    for name, pdf_bytes in corpus:
+        r = compare_file(name, pdf_bytes, template_bytes, args.engine)
+        rows.append(r)
+        if "error" in r:
+            print(f"{name[:32]:<32} ERR {r['error']}")
+            continue
+        print(f"{name[:32]:<32} {r['reference_s']:>8.3f} {r['fast_s']:>8.3f} {r['speedup']:>5.1f}x "
+              f"{'=' if r['same_fields'] else '≠':>7} {'=' if r['same_items'] else '≠':>8}  {r['engine']}")
+
+    ok = [r for r in rows if "error" not in r]
+    fast = [r for r in ok if r["engine"] == "pdfium"]
+    ref_total = sum(r["reference_s"] for r in ok)
+    fast_total = sum(r["fast_s"] for r in ok)
+    print(f"\n{len(ok)} fichier(s) : pdfium utilisé pour {len(fast)}, repli pdfplumber pour {len(ok) - len(fast)}")
+    if fast_total > 0:
+        print(f"Temps total : {ref_total:.2f} s -> {fast_total:.2f} s ({ref_total / fast_total:.1f}x)")
+    print(f"Résultats identiques (champs et articles) : {sum(1 for r in ok if r['same_fields'] and r['same_items'])}/{len(ok)}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2, ensure_ascii=False), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+# benchmarks/synthetic_orders.py — offline generator of supplier-order PDFs
+"""
+Builds supplier-order PDFs that look like the real ones for the parser: "Commande fournisseur N°",
+"Notre référence", Pos in multiples of 10, designations wrapped over two lines, "Délai de réception"
+and customs lines under each item, a "Total CHF" block then the VAT recap and "Montant Total TTC CHF".
+Three layouts: "plain" (text only, items rebuilt from text), "ruled" (full grid, detected as a table,
+plus ruled address and footer boxes that table detection also picks up) and "columns" (no rules, amounts
+right-aligned in their column, like most borderless supplier tables).
+
+No dependency: the PDF (Helvetica, WinAnsi) is written by hand.
+
+    python benchmarks/synthetic_orders.py commande.pdf --items 200 --layout ruled
+"""
+import argparse
+import random
+from typing import List, Optional
+
+PAGE_W, PAGE_H = 595, 842
+TOP, BOTTOM = 800, 80
+COLUMNS = [("Pos", 40), ("Référence", 70), ("Désignation", 120), ("Unité", 330), ("Qté", 360),
+           ("Prix unit.", 390), ("Px u. Net", 440), ("Total CHF", 490), ("TVA", 545)]
+RULE_X = [35, 66, 117, 327, 357, 387, 437, 487, 542, 570]
+LAYOUTS = ("plain", "ruled", "columns")
+# "columns" layout: these values end this far (points) left of the next column's header.
+RIGHT_ALIGNED = {"Qté", "Prix unit.", "Px u. Net", "Total CHF"}
+RIGHT_GAP = 8
+# Helvetica advance widths (1/1000 em) of the characters amounts are made of.
+_HELV_WIDTHS = {"'": 191, ".": 278, ",": 278, " ": 278, "-": 333}
+
+_PARTS = ["Vis tête hexagonale", "Écrou autobloquant", "Rondelle plate", "Goupille cylindrique",
+          "Roulement à billes", "Joint torique", "Ressort de compression", "Douille à collerette"]
+_SPECS = ["DIN 933 acier zingué", "ISO 4032 inox A2", "DIN 125 laiton", "ISO 2338 trempé",
+          "6204-2RS", "NBR 70 Shore", "fil 1.2 mm", "bronze fritté"]
+
+
+def _esc(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _text(x: float, y: float, s: str, size: int = 8) -> str:
+    return "BT /F1 %d Tf %.1f %.1f Td (%s) Tj ET" % (size, x, y, _esc(s))
+
+
+def _width(s: str, size: int = 8) -> float:
+    return sum(_HELV_WIDTHS.get(c, 556) for c in s) * size / 1000
+
+
+def _line(x0: float, y0: float, x1: float, y1: float) -> str:
+    return "%.1f %.1f m %.1f %.1f l S" % (x0, y0, x1, y1)
+
+
+def _box(x0: float, y_top: float, col_x: List[float], rows: List[List[str]], row_h: float = 12) -> List[str]:
+    """Ruled grid of text cells (address block, footer): columns start at `col_x`, end at x0 + 525."""
+    xs = [x0] + col_x[1:] + [x0 + 525]
+    ys = [y_top - k * row_h for k in range(len(rows) + 1)]
+    ops = [_line(xs[0], y, xs[-1], y) for y in ys] + [_line(x, ys[0], x, ys[-1]) for x in xs]
+    for k, row in enumerate(rows):
+        ops.extend(_text(x + 3, ys[k] - 9, v, 7) for x, v in zip(xs, row))
+    return ops
+
+
+def _chf(amount: float) -> str:
+    return f"{amount:,.2f}".replace(",", "'")
+
+
+def build_pdf(pages: List[List[str]], scan: Optional[bytes] = None) -> bytes:
+    """
+    Minimal PDF 1.4: one content stream per page, all pages share one Helvetica font. `scan`
+    (8-bit grey pixels) adds a last page showing them as a full-page image, like a scanned annex.
+    """
+    objs: List[Optional[bytes]] = []
+
+    def add(obj: bytes) -> int:
+        objs.append(obj)
+        return len(objs)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    pages_id = add(None)
+    kids = []
+    for ops in pages:
+        data = "\n".join(ops).encode("cp1252")
+        content = add(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        kids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 %d 0 R >> >> "
+                        b"/Contents %d 0 R >>" % (pages_id, PAGE_W, PAGE_H, font, content)))
+    if scan is not None:
+        width = 1000
+        image = add(b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                    b"/BitsPerComponent 8 /Length %d >>\nstream\n" % (width, len(scan) // width, width * (len(scan) // width))
+                    + scan[:width * (len(scan) // width)] + b"\nendstream")
+        data = b"q %d 0 0 %d 0 0 cm /Im1 Do Q" % (PAGE_W, PAGE_H)
+        content = add(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        kids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources << /XObject << /Im1 %d 0 R >> >> "
+                        b"/Contents %d 0 R >>" % (pages_id, PAGE_W, PAGE_H, image, content)))
+    objs[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, catalog, xref)
+    return bytes(out)
+
+
+def supplier_order_pdf(n_items: int = 30, layout: str = "plain", pages: Optional[int] = None,
+                       seed: int = 0, commande: str = "CF-24-1234", scan_kb: int = 0) -> bytes:
+    """Supplier order with `n_items` line items (1..2000+).
+
+    `pages` pads the order with general-conditions pages up to that page count (never truncates).
+    `scan_kb` appends a scanned annex: one page holding an image of about that many KiB.
+    Every third item has its designation wrapped onto a second line, every fifth carries customs lines.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of {LAYOUTS}")
+    ruled = layout == "ruled"
+    right = {name: COLUMNS[k + 1][1] - RIGHT_GAP for k, (name, _) in enumerate(COLUMNS[:-1])
+             if layout == "columns" and name in RIGHT_ALIGNED}
+
+    def cell(col, x, v):
+        ops.append(_text(right[col] - _width(v) if col in right else x, y, v))
+    rnd = random.Random(seed)
+    out_pages: List[List[str]] = []
+    ops: List[str] = []
+    y = TOP
+
+    def new_page():
+        nonlocal ops, y
+        if ruled:
+            ops.extend(_box(35, 32, [35, 215, 395],
+                            [["Willemin-Macodel SA", "Tél. 032 427 03 03", "IBAN CH93 0076 2011 6238 5295 7"],
+                             [f"Page {len(out_pages) + 1}", "www.willemin-macodel.com", "TVA CHE-123.456.789"]]))
+        out_pages.append(ops)
+        ops, y = [], TOP
+
+    def header():
+        nonlocal y
+        for name, x in COLUMNS:
+            ops.append(_text(x, y, name))
+        if ruled:
+            ops.append(_line(RULE_X[0], y + 10, RULE_X[-1], y + 10))
+            ops.append(_line(RULE_X[0], y - 4, RULE_X[-1], y - 4))
+            ops.extend(_line(x, y + 10, x, y - 4) for x in RULE_X)
+        y -= 16
+
+    ops.append(_text(40, y, "Willemin-Macodel SA", 12)); y -= 14
+    ops.append(_text(40, y, "Rue de la Gare 12, 2800 Delémont", 8)); y -= 20
+    ops.append(_text(40, y, f"Commande fournisseur N° {commande}", 11)); y -= 16
+    ops.append(_text(40, y, "Notre référence : Jean Dupont", 9))
+    ops.append(_text(330, y, "No TVA CHE-123.456.789", 9)); y -= 14
+    ops.append(_text(40, y, "Date : 03.02.2025", 9)); y -= 24
+    if ruled:
+        ops.extend(_box(35, y + 4, [35, 215, 395], [["Fournisseur", "Livraison", "Contact"],
+                                                    ["Fournitures Jura SA", "Rue du Stand 4", "M. Rossel"],
+                                                    ["2800 Delémont", "2800 Delémont", "032 421 00 00"]]))
+        y -= 56
+    header()
+
+    total = 0.0
+    for i in range(1, n_items + 1):
+        wrapped = i % 3 == 0
+        customs = i % 5 == 0
+        height = 25 + (11 if wrapped else 0) + (22 if customs else 0)
+        if y - height < BOTTOM:
+            new_page(); header()
+        top = y + 10
+        qty = rnd.randint(1, 50)
+        pu = rnd.randint(100, 99999) / 100
+        net = round(pu * rnd.choice((1, 1, 0.95, 0.9)), 2)
+        line_total = round(qty * net, 2)
+        total += line_total
+        part = f"{rnd.choice(_PARTS)} M{rnd.randint(3, 16)}"
+        values = [str(i * 10), str(100000 + i), part, "PC", str(qty), _chf(pu), _chf(net), _chf(line_total), "81"]
+        if wrapped:
+            # Designation on two lines: the amounts sit on the continuation line.
+            for (col, x), v in zip(COLUMNS[:3], values[:3]):
+                cell(col, x, v)
+            y -= 11
+            ops.append(_text(COLUMNS[2][1], y, rnd.choice(_SPECS)))
+            for (col, x), v in zip(COLUMNS[3:], values[3:]):
+                cell(col, x, v)
+        else:
+            for (col, x), v in zip(COLUMNS, values):
+                cell(col, x, v)
+        y -= 11
+        ops.append(_text(COLUMNS[2][1], y, "Délai de réception : %02d.%02d.2025" % (rnd.randint(1, 28), rnd.randint(3, 12))))
+        if customs:
+            y -= 11; ops.append(_text(COLUMNS[2][1], y, "Tarif douanier : 7318.1500"))
+            y -= 11; ops.append(_text(COLUMNS[2][1], y, "Pays d'origine : DE"))
+        if ruled:
+            ops.append(_line(RULE_X[0], y - 4, RULE_X[-1], y - 4))
+            ops.extend(_line(x, top, x, y - 4) for x in RULE_X)
+        y -= 14
+
+    if y - 90 < BOTTOM:
+        new_page()
+    ops.append(_text(400, y, f"Total CHF {_chf(total)}", 9)); y -= 20
+    ops.append(_text(40, y, "Récapitulation", 9)); y -= 12
+    ops.append(_text(40, y, "Code TVA   Taux   Base   Montant TVA", 9)); y -= 12
+    ops.append(_text(40, y, f"81   8.10 %   {_chf(total)}   {_chf(total * 0.081)}", 9)); y -= 12
+    ops.append(_text(40, y, f"Montant Total TTC CHF {_chf(total * 1.081)}", 9)); y -= 16
+    ops.append(_text(40, y, "Cond. de paiement : 30 jours net", 9))
+    new_page()
+
+    n = 0
+    while pages is not None and len(out_pages) < pages:
+        out_pages.append([_text(40, TOP - 12 * k, "Conditions générales d'achat, article %d.%d : livraison franco domicile."
+                                % (n, k)) for k in range(60)])
+        n += 1
+    return build_pdf(out_pages, scan=random.Random(seed).randbytes(scan_kb * 1024) if scan_kb else None)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Génère une commande fournisseur PDF synthétique.")
+    ap.add_argument("output", help="Fichier PDF à écrire")
+    ap.add_argument("--items", type=int, default=30, help="Nombre d'articles")
+    ap.add_argument("--layout", choices=LAYOUTS, default="plain", help="plain (texte), ruled (tableau quadrillé) ou columns (colonnes sans traits, montants alignés à droite)")
+    ap.add_argument("--pages", type=int, default=None, help="Nombre minimal de pages (annexes ajoutées)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--scan-kb", type=int, default=0, help="Ajoute une page d'annexe scannée (image) de cette taille en Ko")
+    args = ap.parse_args(argv)
+    with open(args.output, "wb") as f:
+        f.write(supplier_order_pdf(args.items, args.layout, pages=args.pages, seed=args.seed, scan_kb=args.scan_kb))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,26 @@
+# conftest.py — shared fixtures of the tests: the bundled template and synthetic supplier orders
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+
+@pytest.fixture(scope="session")
+def template_bytes() -> bytes:
+    return (ROOT / "template.docx").read_bytes()
+
+
+@pytest.fixture(scope="session")
+def order_pdf() -> bytes:
+    from synthetic_orders import supplier_order_pdf
+    return supplier_order_pdf(12, "ruled", seed=1)
+
+
+@pytest.fixture
+def order_path(tmp_path, order_pdf) -> Path:
+    path = tmp_path / "commande.pdf"
+    path.write_bytes(order_pdf)
+    return path
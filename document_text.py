@@ -0,0 +1,110 @@
+# document_text.py — extracted text of one document, normalised once for every parser
+"""
+DocumentText wraps the text extracted from one PDF: the raw lines, the same lines folded for
+matching (accents stripped, lowercased, NBSP as a plain space), the line and page offsets, and
+the way back from a position in the folded text to the raw text. It is built once per document;
+the field and item parsers match on `norm` / `norm_lines` and cut values out of `raw` / `lines`
+instead of each re-normalising the whole text.
+"""
+import bisect
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+
+
+def strip_accents(s: str) -> str:
+    if s.isascii():
+        return s
+    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+
+
+def fold(s: str) -> str:
+    """The form parsers match on: accents stripped, lowercased (NFKD also turns NBSP into a space)."""
+    return strip_accents(s).lower()
+
+
+@lru_cache(maxsize=8192)
+def fold_cell(s: str) -> str:
+    """fold() for short strings that repeat a lot (table headers and cells)."""
+    return fold(s)
+
+
+def _line_starts(text: str) -> List[int]:
+    starts, pos = [], 0
+    for ln in text.splitlines(keepends=True):
+        starts.append(pos)
+        pos += len(ln)
+    return starts
+
+
+class DocumentText:
+    """
+    `text`: as extracted; `raw`: same with NBSP as spaces (same length, what the amount and
+    reference regexes run on); `norm`: fold(text). `lines` / `norm_lines` are their
+    str.splitlines(), index for index (folding never adds or removes a line break).
+    `page_starts`: offset in `text` where each page begins (a single page when unknown).
+    """
+
+    def __init__(self, text: str, page_starts: Optional[List[int]] = None):
+        self.text = text
+        self.raw = text.replace("\xa0", " ")
+        self.norm = fold(text)
+        self.lines: List[str] = text.splitlines()
+        self.norm_lines: List[str] = self.norm.splitlines()
+        if len(self.norm_lines) != len(self.lines):  # cannot happen with NFKD; keep the pairing safe anyway
+            self.norm_lines = [fold(ln) for ln in self.lines]
+            self.norm = "\n".join(self.norm_lines)
+        self.line_starts = _line_starts(text)
+        self.norm_line_starts = _line_starts(self.norm)
+        self.page_starts = list(page_starts) if page_starts else [0]
+        self._char_maps: Dict[int, List[int]] = {}
+
+    def __str__(self) -> str:
+        return self.text
+
+    @property
+    def n_pages(self) -> int:
+        return len(self.page_starts)
+
+    def line_page(self, i: int) -> int:
+        """Page index (0-based) of line `i`."""
+        return bisect.bisect_right(self.page_starts, self.line_starts[i]) - 1 if self.line_starts else 0
+
+    def page_lines(self, page: int) -> range:
+        """Indexes of the lines of `page`."""
+        start = self.page_starts[page]
+        stop = self.page_starts[page + 1] if page + 1 < len(self.page_starts) else len(self.text) + 1
+        return range(bisect.bisect_left(self.line_starts, start), bisect.bisect_left(self.line_starts, stop))
+
+    def _char_map(self, i: int) -> List[int]:
+        # Offset in raw line i of every character of norm line i (plus one past the end).
+        m = self._char_maps.get(i)
+        if m is None:
+            m = []
+            for j, c in enumerate(self.lines[i]):
+                m.extend([j] * len(fold(c)))
+            m.append(len(self.lines[i]))
+            if len(m) != len(self.norm_lines[i]) + 1:  # context-dependent lowercasing: clamp
+                m = [min(k, len(self.lines[i])) for k in range(len(self.norm_lines[i]) + 1)]
+            self._char_maps[i] = m
+        return m
+
+    def raw_offset(self, norm_pos: int) -> int:
+        """Offset in `text` of the character at `norm_pos` in `norm`."""
+        if not self.lines:
+            return 0
+        i = max(bisect.bisect_right(self.norm_line_starts, norm_pos) - 1, 0)
+        col = norm_pos - self.norm_line_starts[i]
+        if col >= len(self.norm_lines[i]):  # end of line or on the line break
+            return self.line_starts[i] + len(self.lines[i]) + (col - len(self.norm_lines[i]))
+        if len(self.lines[i]) == len(self.norm_lines[i]) and self.lines[i].isascii():
+            return self.line_starts[i] + col
+        return self.line_starts[i] + self._char_map(i)[col]
+
+    def raw_span(self, start: int, end: int) -> Tuple[int, int]:
+        """Span of `text` that the `norm` span [start, end) was folded from."""
+        return self.raw_offset(start), self.raw_offset(end)
+
+
+def as_document_text(text: Union[str, DocumentText]) -> DocumentText:
+    return text if isinstance(text, DocumentText) else DocumentText(text)
@@ -1,93 +1,849 @@
 # extract_and_fill.py — fix27
+from __future__ import annotations
+
+import gc
+import hashlib
+import io
+import mmap
+import multiprocessing
+import os
+import pickle
 import re
-import unicodedata
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from copy import deepcopy
+from functools import lru_cache
 from io import BytesIO
-from typing import Dict, List, Tuple, Optional
+from typing import BinaryIO, Dict, Iterator, List, Tuple, Optional, Union
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
 from zoneinfo import ZoneInfo
 
-import pdfplumber
-import pandas as pd
-from docx import Document
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT, WD_UNDERLINE
-from docx.enum.table import WD_TABLE_ALIGNMENT, WD_ALIGN_VERTICAL
-
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+from document_text import DocumentText, as_document_text, fold, fold_cell, strip_accents as _strip_accents
+from pipeline_report import NULL_REPORT
 
+# Bump whenever parsing or filling output changes: it is part of the analysis cache key.
+PARSER_VERSION = "51"
 DATE_RE = re.compile(r"\b([0-3]?\d)[./-]([01]?\d)[./-]([12]\d{3})\b")
+# Below this page count the parallel extractor stays sequential (process startup dominates).
+PARALLEL_MIN_PAGES = 8
+TEXT_ENGINES = ("pdfplumber", "pdfium", "auto")
+# "auto": detected tables, else rebuilt from the text; "words": column x-positions (WordItemParser) first;
+# "race": table and text strategies side by side, the first whose totals reconcile wins (_race_item_strategies).
+ITEM_ENGINES = ("auto", "words", "race")
+# "auto" engine: a page with at least this many vector path segments may hold a ruled table (a 2-row,
+# 3-column grid already takes 14), so it goes to pdfplumber; a separator line or a frame stays below.
+AUTO_MAX_RULE_SEGMENTS = 8
+# Item-table region (table_roi): room kept above the header words for the header's top rule, and
+# height of the bottom band of a page taken as its footer.
+ROI_HEADER_PAD = 8.0
+ROI_FOOTER_BAND = 36.0
+# Low-memory mode: spilled page text / item rows stay in RAM up to this size, then go to a temp file.
+SPILL_MEMORY_BYTES = 4 * 1024 * 1024
+# Recap/total section cues: item lines never come after these.
+ITEM_STOP_CUES = ("récapitulation", "recapitulation", "code tva", "montant total", "total ttc", "taux")
+COMMANDE_RE = re.compile(r"commande fournisseur n[°o]\s*([A-Za-z0-9\-_]+)", re.IGNORECASE)
+NOTRE_REF_RE = re.compile(r"(Notre\s+référence\s*:\s*)(.*)", re.IGNORECASE)
+TOTAL_CHF_RE = re.compile(r"Total\s+CHF\s*([0-9'’.,]+)", re.IGNORECASE)
+TOTAL_CHF_BEFORE_RE = re.compile(r"([0-9'’.,]+)\s*Total\s+CHF", re.IGNORECASE)
+TOTAL_TTC_RE = re.compile(r"(Montant\s+Total\s+TTC\s+CHF|Total\s+TTC\s+CHF)\s*([0-9'’.,]+)", re.IGNORECASE)
+TOTAL_TTC_BEFORE_RE = re.compile(r"([0-9'’.,]+)\s*(Montant\s+Total\s+TTC\s+CHF|Total\s+TTC\s+CHF)", re.IGNORECASE)
+# PDF input of the pipeline: bytes, a path, a buffer (bytearray, memoryview, mmap) or an open binary file.
+PdfSource = Union[bytes, bytearray, memoryview, mmap.mmap, str, os.PathLike, BinaryIO]
+# Template input: the same kinds of sources (read whole, the template is kept in memory).
+TemplateSource = PdfSource
+# DOCX output: a path or a writable binary stream.
+DocxTarget = Union[str, os.PathLike, BinaryIO]
 COLUMNS_TARGET = ["Pos", "Référence", "Désignation", "Unité", "Qté", "Prix unit.", "Px u. Net", "Total CHF", "TVA"]
+# Lines under an item that are not part of it (customs data, delivery date).
+ITEM_JUNK_PREFIXES = ("tarif douanier", "pays d'origine", "indice :", "delai de reception :")
 
 def today_ch() -> str:
     return datetime.now(ZoneInfo("Europe/Zurich")).strftime("%d.%m.%Y")
 
-def _strip_accents(s: str) -> str:
-    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+
+def preload():
+    """
+    Imports pdfplumber and python-docx now. They are otherwise imported by the functions
+    that use them, so `import extract_and_fill` stays cheap; worker initialisers call this to keep
+    the import time out of their first document.
+    """
+    import pdfplumber  # noqa: F401
+    import docx  # noqa: F401
+
 
 def _insert_missing_spaces(text: str) -> str:
     text = re.sub(r"(\d)(PC|PCE|KG|M|MM|CM|L)\b", r"\1 \2", text)
     text = re.sub(r"(\d)[A-Za-z]", lambda m: m.group(0)[0] + " " + m.group(0)[1:], text)
     return text
 
-def extract_text_and_tables_from_pdf(file_like) -> Tuple[str, List[pd.DataFrame]]:
-    texts = []
-    tables: List[pd.DataFrame] = []
-    with pdfplumber.open(file_like) as pdf:
-        for page in pdf.pages:
-            raw_text = page.extract_text() or ""
-            raw_text = _insert_missing_spaces(raw_text)
-            texts.append(raw_text)
-            try:
-                for raw in page.extract_tables() or []:
-                    if not raw or len(raw) < 2:
-                        continue
-                    header = raw[0]; rows = raw[1:]
-                    if not any(x for x in header): continue
-                    df = pd.DataFrame(rows, columns=[(h or "").strip() for h in header])
-                    if df.shape[1] >= 3 and df.shape[0] >= 1:
-                        tables.append(_clean_df(df))
-            except Exception:
-                pass
-            try:
-                raw_single = page.extract_table()
-                if raw_single and len(raw_single) > 1:
-                    header = raw_single[0]; rows = raw_single[1:]
-                    if any(x for x in header):
-                        df = pd.DataFrame(rows, columns=[(h or "").strip() for h in header])
-                        if df.shape[1] >= 3 and df.shape[0] >= 1:
-                            tables.append(_clean_df(df))
-            except Exception:
-                pass
+# LineItem attribute of each COLUMNS_TARGET column.
+ITEM_FIELDS = ("pos", "reference", "designation", "unite", "qte", "prix_unit", "px_net", "total", "tva")
+_ITEM_ATTR = dict(zip(COLUMNS_TARGET, ITEM_FIELDS))
+# Columns of the invoice items table, of the app's editor and of the JSON exports (TVA stays on the item).
+ITEM_TABLE_COLUMNS = [c for c in COLUMNS_TARGET if c != "TVA"]
+
+def _cell_str(value) -> str:
+    return "" if value is None or value != value else str(value)  # None / NaN (rows added in an editor)
+
+class LineItem:
+    """
+    One order line: the strings read from the PDF for each COLUMNS_TARGET column (attribute
+    names in ITEM_FIELDS). The extraction core works on lists of these; a DataFrame is only
+    built where one is displayed (items_to_frame).
+    """
+    __slots__ = ITEM_FIELDS
+
+    def __init__(self, pos: str = "", reference: str = "", designation: str = "", unite: str = "", qte: str = "",
+                 prix_unit: str = "", px_net: str = "", total: str = "", tva: str = ""):
+        self.pos = pos
+        self.reference = reference
+        self.designation = designation
+        self.unite = unite
+        self.qte = qte
+        self.prix_unit = prix_unit
+        self.px_net = px_net
+        self.total = total
+        self.tva = tva
+
+    @classmethod
+    def from_row(cls, row: Dict[str, object]) -> "LineItem":
+        """From a {column: value} mapping; missing columns and None / NaN values give ""."""
+        return cls(*(_cell_str(row.get(c)) for c in COLUMNS_TARGET))
+
+    def values(self, columns: Optional[List[str]] = None) -> List[str]:
+        """Values in `columns` order (default COLUMNS_TARGET)."""
+        if columns is None:
+            return [getattr(self, a) for a in ITEM_FIELDS]
+        return [getattr(self, _ITEM_ATTR[c]) for c in columns]
+
+    def as_dict(self, columns: Optional[List[str]] = None) -> Dict[str, str]:
+        columns = COLUMNS_TARGET if columns is None else columns
+        return dict(zip(columns, self.values(columns)))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, LineItem) and self.values() == other.values()
+
+    def __repr__(self) -> str:
+        return f"LineItem({', '.join(repr(v) for v in self.values())})"
+
+def items_to_frame(items: Optional[List[LineItem]], columns: List[str] = ITEM_TABLE_COLUMNS):
+    """DataFrame of `items` for display and editing (the Streamlit app)."""
+    import pandas as pd
+    return pd.DataFrame([it.values(columns) for it in items or []], columns=columns)
+
+def items_from_frame(df) -> List[LineItem]:
+    """Items back from an edited DataFrame (the columns it lacks, e.g. TVA, come back empty)."""
+    return [LineItem.from_row(row) for row in df.to_dict(orient="records")]
+
+class DetectedTable:
+    """A table found on a page: stripped header and cell strings (no all-empty row) and its page bbox."""
+    __slots__ = ("columns", "rows", "bbox")
+
+    def __init__(self, columns: List[str], rows: List[List[str]],
+                 bbox: Optional[Tuple[float, float, float, float]] = None):
+        self.columns = columns
+        self.rows = rows
+        self.bbox = bbox
+
+class PageLayout:
+    """
+    Layout analysis of one page, computed once and shared: chars, words, edges and a single
+    TableFinder run. The text, the multi-table list and the "largest table" are all derived
+    from it; call release() when the page is done to drop pdfplumber's per-page caches.
+    `table_bbox` restricts table finding to that region (page coordinates, clipped to the page);
+    `table_band` (top, bottom) to the objects overlapping that horizontal band (no clipping).
+    """
+    def __init__(self, page, table_settings: Optional[dict] = None, table_bbox: Optional[Tuple[float, float, float, float]] = None):
+        from pdfplumber.table import TableFinder, TableSettings
+        self.page = page
+        self.table_bbox = table_bbox
+        self.table_band: Optional[Tuple[float, float]] = None
+        self._tset = TableSettings.resolve(table_settings)
+        self._text: Optional[str] = None
+        self._words: Optional[List[dict]] = None
+        self._finder: Optional[TableFinder] = None
+        self._raw_tables: Optional[List[List[List[Optional[str]]]]] = None
+
+    @property
+    def chars(self) -> List[dict]:
+        return self.page.chars
+
+    @property
+    def edges(self) -> List[dict]:
+        return self.page.edges
+
+    @property
+    def words(self) -> List[dict]:
+        if self._words is None:
+            self._words = self.page.extract_words()
+        return self._words
+
+    @property
+    def text(self) -> str:
+        from pdfplumber.utils import DEFAULT_Y_TOLERANCE, cluster_objects
+        if self._text is None:
+            # page.extract_text() with default settings, from the words already extracted (one word pass).
+            lines = cluster_objects(self.words, lambda w: w["top"], DEFAULT_Y_TOLERANCE)
+            self._text = _insert_missing_spaces("\n".join(" ".join(w["text"] for w in ln) for ln in lines))
+        return self._text
+
+    @property
+    def tables(self) -> list:
+        """pdfplumber Table objects, from one TableFinder pass."""
+        from pdfplumber.table import TableFinder
+        if self._finder is None:
+            region = self.page
+            if self.table_bbox is not None:
+                x0, top, x1, bottom = self.table_bbox
+                px0, ptop, px1, pbottom = self.page.bbox
+                clipped = (max(x0, px0), max(top, ptop), min(x1, px1), min(bottom, pbottom))
+                if clipped[0] < clipped[2] and clipped[1] < clipped[3]:
+                    region = self.page.crop(clipped)
+            elif self.table_band is not None and self._has_rules():
+                # filter() instead of crop(): no clipped copy of every char and line of the page.
+                top, bottom = self.table_band
+                region = self.page.filter(lambda o: o["bottom"] >= top and o["top"] <= bottom)
+            self._finder = TableFinder(region, self._tset)
+        return self._finder.tables
+
+    def _has_rules(self) -> bool:
+        objects = self.page.objects
+        return bool(objects.get("line") or objects.get("rect") or objects.get("curve"))
+
+    def extract_tables(self) -> List[List[List[Optional[str]]]]:
+        """Same as page.extract_tables(), without rebuilding edges/intersections/cells."""
+        if self._raw_tables is None:
+            text_settings = self._tset.text_settings or {}
+            self._raw_tables = [t.extract(**text_settings) for t in self.tables]
+        return self._raw_tables
+
+    def largest_table_index(self) -> Optional[int]:
+        """Index into extract_tables() of the table page.extract_table() would return."""
+        if not self.tables:
+            return None
+        return min(range(len(self.tables)),
+                   key=lambda i: (-len(self.tables[i].cells), self.tables[i].bbox[1], self.tables[i].bbox[0]))
+
+    def extract_table(self) -> Optional[List[List[Optional[str]]]]:
+        idx = self.largest_table_index()
+        return None if idx is None else self.extract_tables()[idx]
+
+    def release(self):
+        self._finder = None; self._raw_tables = None; self._words = None
+        self.page.close()
+
+def _detected_table(raw) -> Optional[DetectedTable]:
+    if not raw or len(raw) < 2:
+        return None
+    header = raw[0]
+    if not any(x for x in header) or len(header) < 3:
+        return None
+    rows = [[str(x).strip() if x is not None else "" for x in r] for r in raw[1:]]
+    return DetectedTable([(h or "").strip() for h in header], [r for r in rows if any(r)])
+
+def _continues(regions: List[dict], index: int) -> bool:
+    """Whether the items table goes on onto page `index`, from the region of the page before it."""
+    prev = regions[-1] if regions else None
+    return (prev is not None and prev["page"] == index - 1 and not prev["stop"]
+            and (prev["header"] or prev["continued"]))
+
+def _page_region(layout: "PageLayout", regions: List[dict]) -> dict:
+    index = layout.page.page_number - 1
+    continued = _continues(regions, index)
+    region = item_table_region(layout.words, tuple(layout.page.bbox), continued)
+    region.update(page=index, continued=continued)
+    regions.append(region)
+    if region["bbox"] is not None:
+        layout.table_band = (region["bbox"][1], region["bbox"][3])
+    return region
+
+def _page_tables(layout: "PageLayout") -> List[DetectedTable]:
+    tables: List[DetectedTable] = []
+    try:
+        for table, raw in zip(layout.tables, layout.extract_tables()):
+            detected = _detected_table(raw)
+            if detected is not None:
+                detected.bbox = tuple(table.bbox)
+                tables.append(detected)
+        # The "largest table" pass is one of the tables above (same finder, same filter),
+        # so it is already covered and not converted a second time.
+    except Exception:
+        pass
+    return tables
+
+def _extract_page(page, detect_tables: bool = True, table_bbox=None,
+                  word_parser: Optional["WordItemParser"] = None,
+                  regions: Optional[List[dict]] = None,
+                  alt: Optional[dict] = None,
+                  first_page_bbox=None) -> Tuple[str, List[DetectedTable]]:
+    """
+    Text and tables of one page. With `alt` ({"regions": [...], "tables": [...]}), the items
+    region is also worked out from alt["regions"] (another reading of the pages before) and
+    the tables found in it go to alt["tables"]; the words and, when both regions are the same,
+    the tables are shared.
+    `first_page_bbox` (a layout profile's box) crops table finding on page 1 only, down to the
+    page bottom: a longer order of the same supplier fills the page further and goes on over
+    pages whose table sits elsewhere. Its item region is still worked out for the next pages.
+    """
+    crop = table_bbox
+    if crop is None and first_page_bbox is not None and page.page_number == 1:
+        x0, top, x1, _ = first_page_bbox
+        crop = (x0, top, x1, float(page.bbox[3]))
+    layout = PageLayout(page, table_bbox=crop)
+    try:
+        raw_text = layout.text
+        if word_parser is not None:
+            word_parser.add_page(layout.words)  # the words the text was built from
+        if not detect_tables:
+            return raw_text, []
+        region = None
+        if table_bbox is None and regions is not None:
+            # Table finding restricted to the items region; `regions` carries it to the next page.
+            region = _page_region(layout, regions)
+        tables = _page_tables(layout)
+        if alt is not None and region is not None:
+            alt_layout = PageLayout(page)
+            alt_layout._words = layout.words
+            if _page_region(alt_layout, alt["regions"])["bbox"] == region["bbox"]:
+                alt["tables"].append(tables)
+            else:
+                alt["tables"].append(_page_tables(alt_layout))
+            alt_layout._finder = alt_layout._raw_tables = None
+        return raw_text, tables
+    finally:
+        layout.release()
+
+def _extract_page_range(pdf: PdfSource, start: int, stop: int, **page_opts):
+    """
+    Worker entry point: open the PDF on its own and extract pages [start, stop); also returns
+    their item regions. Whether the items table goes on from the page before the chunk is not
+    known here, so the leading pages are also read as a continuation, until both readings
+    agree: returns (pages, regions, alt), alt being None or {"regions", "tables"} for those
+    leading pages; the parent keeps the reading the previous chunk calls for (_chunk_pages).
+    """
+    import pdfplumber
+    regions: List[dict] = []
+    alt = None
+    if page_opts.get("regions") is not None:
+        page_opts["regions"] = regions
+        if start > 0 and page_opts.get("table_bbox") is None and page_opts.get("detect_tables", True):
+            seed = {"page": start - 1, "bbox": None, "header": True, "stop": False, "continued": False}
+            alt = {"regions": [seed], "tables": []}
+    pages = []
+    with pdf_stream(pdf) as src, pdfplumber.open(src) as doc:
+        for i in range(start, stop):
+            if alt is not None and _continues(alt["regions"], i) == _continues(regions, i):
+                break  # both readings agree from here on
+            pages.append(_extract_page(doc.pages[i], alt=alt, **page_opts))
+        pages.extend(_extract_page(doc.pages[i], **page_opts) for i in range(start + len(pages), stop))
+    if alt is not None:
+        alt["regions"] = alt["regions"][1:]
+        if not alt["tables"]:
+            alt = None
+    return pages, regions, alt
+
+def _chunk_pages(chunk, regions: Optional[List[dict]]):
+    """Pages and regions of one _extract_page_range() chunk, in the reading the regions of the pages before it call for."""
+    pages, chunk_regions, alt = chunk
+    if alt is not None and regions is not None and _continues(regions, chunk_regions[0]["page"]):
+        n = len(alt["tables"])
+        pages = [(text, tables) for (text, _), tables in zip(pages, alt["tables"])] + pages[n:]
+        chunk_regions = alt["regions"] + chunk_regions[n:]
+    return pages, chunk_regions
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only stream over a buffer (mmap, memoryview, bytearray), read in place."""
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        memoryview(b).cast("B")[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._view.release()  # lets the caller close its mmap
+        super().close()
+
+@contextmanager
+def pdf_stream(pdf: PdfSource):
+    """
+    `pdf` as pdfplumber.open() and pypdfium2 read it without a copy: a path stays a path (the
+    libraries open the file and read what they need), bytes and buffers get a seekable stream
+    over them, an open binary file is rewound and used as is (left open).
+    """
+    if isinstance(pdf, (str, os.PathLike)):
+        yield os.fspath(pdf)
+    elif isinstance(pdf, bytes):
+        with BytesIO(pdf) as stream:  # shares the bytes object
+            yield stream
+    elif isinstance(pdf, (bytearray, memoryview, mmap.mmap)):
+        with _BufferReader(pdf) as stream:
+            yield stream
+    elif hasattr(pdf, "read"):
+        pdf.seek(0)
+        yield pdf
+    else:
+        raise TypeError(f"unsupported PDF input: {type(pdf).__name__}")
+
+def _worker_pdf(pdf: PdfSource) -> Union[str, bytes]:
+    """What another process gets to open `pdf` itself: its path, else its bytes (copied once for buffers and files)."""
+    if isinstance(pdf, (str, os.PathLike)):
+        return os.fspath(pdf)
+    if isinstance(pdf, bytes):
+        return pdf
+    if isinstance(pdf, (bytearray, memoryview, mmap.mmap)):
+        return bytes(pdf)
+    pdf.seek(0)
+    return pdf.read()
+
+def read_source_bytes(source: PdfSource) -> bytes:
+    """All the bytes of a path, buffer or binary file (used for the template, which is kept in memory)."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    return _worker_pdf(source)
+
+def source_sha256(source: PdfSource) -> str:
+    """SHA-256 (hex) of a path, bytes, buffer or binary file, hashed in place (files read in chunks)."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        return hashlib.sha256(source).hexdigest()
+    source.seek(0)
+    return hashlib.file_digest(source, "sha256").hexdigest()
+
+def _split_pages(n_pages: int, n_chunks: int) -> List[Tuple[int, int]]:
+    """Contiguous [start, stop) page ranges, sizes differing by at most one."""
+    n_chunks = max(1, min(n_chunks, n_pages))
+    base, extra = divmod(n_pages, n_chunks)
+    ranges, start = [], 0
+    for k in range(n_chunks):
+        stop = start + base + (1 if k < extra else 0)
+        ranges.append((start, stop)); start = stop
+    return ranges
+
+def _has_stop_cue(text: Union[str, DocumentText]) -> bool:
+    for low in as_document_text(text).norm_lines:
+        low = low.strip()
+        if any(low.startswith(p) for p in ITEM_STOP_CUES):
+            return True
+    return False
+
+def iter_pdf_pages(pdf: PdfSource, early_stop: bool = True, **page_opts) -> Iterator[Tuple[str, List[DetectedTable]]]:
+    """
+    Lazily yield (text, tables) per page. With `early_stop`, table detection stops once the
+    recap section and both totals ("Total CHF", "Montant Total TTC CHF") have been seen; the
+    remaining pages then only get the cheap text pass, and only while header fields
+    (commande fournisseur, Notre référence) are still missing.
+    """
+    import pdfplumber
+    with pdf_stream(pdf) as src, pdfplumber.open(src) as doc:
+        yield from _iter_open_pdf_pages(doc, early_stop, **page_opts)
+
+class MemoryLimitExceeded(MemoryError):
+    """Low-memory mode: resident memory stayed above the caller's ceiling after a page."""
+
+def _rss_bytes() -> Optional[int]:
+    """Current resident set size (Linux), else the peak RSS; None where neither is available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _drop_page_streams(pdf, page):
+    """Forget the page's decoded content streams and pdfminer's parsed-object cache (page.close() keeps both)."""
+    from pdfminer.pdftypes import PDFStream, resolve1
+    for ref in getattr(page.page_obj, "contents", None) or []:
+        stream = resolve1(ref)
+        if isinstance(stream, PDFStream):
+            stream.data = None  # decoded copy; rawdata stays, so it can be decoded again
+    cached = getattr(pdf.doc, "_cached_objs", None)
+    if isinstance(cached, dict):
+        cached.clear()
+
+def _check_memory_limit(limit_bytes: Optional[int], page_index: int):
+    if not limit_bytes:
+        return
+    rss = _rss_bytes()
+    if rss is None or rss <= limit_bytes:
+        return
+    gc.collect()
+    rss = _rss_bytes()
+    if rss is not None and rss > limit_bytes:
+        raise MemoryLimitExceeded(f"resident memory {rss / 2**20:.0f} MiB above the {limit_bytes / 2**20:.0f} MiB "
+                                  f"ceiling after page {page_index + 1}")
+
+def _iter_open_pdf_pages(pdf, early_stop: bool, report=NULL_REPORT, low_memory: bool = False,
+                         memory_limit_bytes: Optional[int] = None, **page_opts) -> Iterator[Tuple[str, List[DetectedTable]]]:
+    recap = total_chf = total_ttc = commande = reference = False
+    for i, page in enumerate(pdf.pages):
+        if low_memory and i:
+            _drop_page_streams(pdf, pdf.pages[i - 1])
+            _check_memory_limit(memory_limit_bytes, i - 1)
+        if early_stop and recap and total_chf and total_ttc:
+            if commande and reference:
+                report.set("pages_skipped", len(pdf.pages) - i)
+                return
+            with report.page(i, mode="text"):
+                layout = PageLayout(page)
+                try:
+                    text = layout.text
+                finally:
+                    layout.release()
+            report.count("pages")
+            yield text, []
+            continue
+        with report.page(i, mode="text+tables" if page_opts.get("detect_tables", True) else "text"):
+            text, tables = _extract_page(page, **page_opts)
+        report.count("pages"); report.count("tables_detected", len(tables))
+        yield text, tables
+        if early_stop:
+            page_text = DocumentText(text)
+            raw = page_text.raw
+            recap = recap or _has_stop_cue(page_text)
+            total_chf = total_chf or bool(TOTAL_CHF_RE.search(raw) or TOTAL_CHF_BEFORE_RE.search(raw))
+            total_ttc = total_ttc or bool(TOTAL_TTC_RE.search(raw) or TOTAL_TTC_BEFORE_RE.search(raw))
+            commande = commande or bool(COMMANDE_RE.search(page_text.norm))
+            reference = reference or bool(NOTRE_REF_RE.search(raw))
+
+def extract_text_and_tables_from_pdf(pdf: PdfSource, parallel: bool = False, max_workers: Optional[int] = None,
+                                     min_pages_parallel: int = PARALLEL_MIN_PAGES,
+                                     early_stop: bool = False, detect_tables: bool = True,
+                                     table_bbox: Optional[Tuple[float, float, float, float]] = None,
+                                     layout_store=None, info: Optional[dict] = None,
+                                     report=None, low_memory: bool = False,
+                                     memory_limit_mb: Optional[float] = None,
+                                     word_parser: Optional["WordItemParser"] = None,
+                                     table_roi: bool = True) -> Tuple[str, List[DetectedTable]]:
+    """
+    Extract page text and candidate tables from `pdf` (PdfSource: read in place, see pdf_stream).
+    With `parallel=True` the page range is split across `max_workers` processes (each re-opening
+    the PDF: by its path when it has one, else from its bytes) and merged back in page order, so the
+    output is the same as the sequential path. Documents shorter than `min_pages_parallel` pages
+    stay sequential: worker startup would cost more than it saves.
+    `early_stop=True` streams pages through iter_pdf_pages and skips the trailing annex pages.
+    `detect_tables=False` runs the text pass only; `table_bbox` crops table finding to a region.
+    Tables come back as DetectedTable (header, cell strings and page bbox).
+    With a `layout_store`, the first page (already open, so parsed once) is fingerprinted and a
+    known supplier profile overrides detect_tables and crops table finding on page 1 (first_page_bbox
+    of _extract_page). `info`, when given, receives
+    "fingerprint", "profile" and "page_starts" (offset of each page in the text). `report` (pipeline_report.PipelineReport) gets per-page timings.
+
+    `low_memory` (for very large PDFs) processes pages sequentially, drops each page's decoded
+    streams once done and spills text / item rows to temp files (see _spill_pages): the tables
+    returned are then one DetectedTable of candidate item rows. `memory_limit_mb` raises
+    MemoryLimitExceeded when resident memory stays above it after a page.
+    A `word_parser` (WordItemParser) is fed every page's words in the same pass; pages are then
+    read in one process (the parser keeps state from page to page).
+    `table_roi` (without a `table_bbox`) restricts table finding on each page to the
+    items region (item_table_region): letterhead, address blocks, recap and footer are left out.
+    The regions go to info["table_regions"] and to the report.
+    """
+    import pdfplumber
+    report = report or NULL_REPORT
+    regions: Optional[List[dict]] = [] if table_roi else None
+    page_opts = {"detect_tables": detect_tables, "table_bbox": table_bbox, "word_parser": word_parser,
+                 "regions": regions, "first_page_bbox": None}
+    info = info if info is not None else {}
+
+    def _apply_profile(doc):
+        if layout_store is None or not doc.pages:
+            return
+        with report.stage("layout_fingerprint"):
+            info["fingerprint"] = layout_store.fingerprint(doc.pages[0])
+        profile = layout_store.get(info["fingerprint"])
+        info["profile"] = profile
+        if profile is not None:
+            page_opts["detect_tables"] = detect_tables and profile.get("strategy") == "table"
+            page_opts["first_page_bbox"] = profile.get("bbox")
+
+    pages: List[Tuple[str, List[DetectedTable]]] = []
+    if low_memory or memory_limit_mb:
+        limit = int(memory_limit_mb * 1024 * 1024) if memory_limit_mb else None
+        with pdf_stream(pdf) as src, pdfplumber.open(src) as doc:
+            _apply_profile(doc)
+            result = _spill_pages(_iter_open_pdf_pages(doc, early_stop, report, low_memory=True,
+                                                       memory_limit_bytes=limit, **page_opts), info)
+        _record_regions(regions, info, report)
+        return result
+    if parallel and not early_stop and word_parser is None:
+        with pdf_stream(pdf) as src, pdfplumber.open(src) as doc:
+            _apply_profile(doc)
+            n_pages = len(doc.pages)
+            workers = max_workers or os.cpu_count() or 1
+            if n_pages < max(min_pages_parallel, 2) or workers <= 1:
+                pages = list(_iter_open_pdf_pages(doc, False, report, **page_opts))
+        if not pages and n_pages:
+            ranges = _split_pages(n_pages, workers)
+            report.set("page_workers", len(ranges))
+            worker_pdf = _worker_pdf(pdf)
+            with ProcessPoolExecutor(max_workers=len(ranges)) as ex:
+                futures = [ex.submit(_extract_page_range, worker_pdf, a, b, **page_opts) for a, b in ranges]
+                for fut in futures:
+                    chunk_pages, chunk_regions = _chunk_pages(fut.result(), regions)
+                    pages.extend(chunk_pages)
+                    if regions is not None:
+                        regions.extend(chunk_regions)
+            report.count("pages", len(pages))
+            report.count("tables_detected", sum(len(t) for _, t in pages))
+    else:
+        with pdf_stream(pdf) as src, pdfplumber.open(src) as doc:
+            _apply_profile(doc)
+            pages = list(_iter_open_pdf_pages(doc, early_stop, report, **page_opts))
+
+    _record_regions(regions, info, report)
+    texts = [t for t, _ in pages]
+    info["page_starts"] = _page_starts(texts)
+    tables = [t for _, page_tables in pages for t in page_tables]
     unique, sigs = [], set()
-    for df in tables:
-        sig = (tuple(df.columns), df.shape)
+    for table in tables:
+        sig = _table_signature(table)
         if sig not in sigs:
-            sigs.add(sig); unique.append(df)
+            sigs.add(sig); unique.append(table)
     return "\n".join(texts), unique
 
-def _clean_df(df: pd.DataFrame) -> pd.DataFrame:
-    df.columns = [str(c).strip() for c in df.columns]
-    df = df.applymap(lambda x: (str(x).strip() if x is not None else ""))
-    df = df.loc[~(df.apply(lambda r: all((not str(v).strip()) for v in r), axis=1))]
-    return df.reset_index(drop=True)
+def _record_regions(regions: Optional[List[dict]], info: dict, report):
+    if regions:
+        info["table_regions"] = regions
+        report.set("table_regions", regions)
+        report.count("table_regions_cropped", sum(1 for r in regions if r["bbox"] is not None))
+
+def _page_starts(texts: List[str]) -> List[int]:
+    """Offset of each page in "\\n".join(texts)."""
+    starts, pos = [], 0
+    for t in texts:
+        starts.append(pos)
+        pos += len(t) + 1
+    return starts
+
+def _table_signature(table: DetectedTable) -> tuple:
+    # Same header and cells: the same table seen twice. Same shape alone is not enough, continuation
+    # pages of a long order often have exactly as many rows as the previous one.
+    return (tuple(table.columns), tuple(map(tuple, table.rows)))
+
+def _spill_pages(pages: Iterator[Tuple[str, List[DetectedTable]]], info: Optional[dict] = None) -> Tuple[str, List[DetectedTable]]:
+    """
+    Low-memory mode: consume the page iterator keeping no per-page table. Page text and the
+    candidate item rows of each table go to spooled temp files as soon as the page is done; the
+    tables come back as a single DetectedTable of those rows (bbox = union of the source tables).
+    This bounds what is kept per page, not the peak: the whole text and every item row are read
+    back into memory at the end, since field and item parsing work on the whole document.
+    """
+    sigs = set()
+    boxes: List[Tuple[float, float, float, float]] = []
+    page_starts: List[int] = []
+    pos = 0
+    with tempfile.SpooledTemporaryFile(max_size=SPILL_MEMORY_BYTES, mode="w+", encoding="utf-8") as text_f, \
+            tempfile.SpooledTemporaryFile(max_size=SPILL_MEMORY_BYTES) as rows_f:
+        for n, (text, tables) in enumerate(pages):
+            text_f.write(("\n" if n else "") + text)
+            page_starts.append(pos)
+            pos += len(text) + 1
+            for table in tables:
+                sig = hash(_table_signature(table))
+                if sig in sigs:
+                    continue
+                sigs.add(sig)
+                rows = _candidate_item_rows(table)
+                if rows is None:
+                    continue
+                if table.bbox:
+                    boxes.append(table.bbox)
+                if rows:
+                    pickle.dump([[r.get(c, "") for c in COLUMNS_TARGET] for r in rows], rows_f,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+            del tables
+        text_f.seek(0)
+        text = text_f.read()
+        rows_f.seek(0)
+        items: List[List[str]] = []
+        while True:
+            try:
+                items.extend(pickle.load(rows_f))
+            except EOFError:
+                break
+    if info is not None:
+        info["page_starts"] = page_starts
+    if not items:
+        return text, []
+    bbox = None
+    if boxes:
+        bbox = (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+    return text, [DetectedTable(list(COLUMNS_TARGET), items, bbox)]
+
+def extract_text_pdfium(pdf: PdfSource, info: Optional[dict] = None) -> Optional[Tuple[str, int]]:
+    """
+    Line-ordered text of all pages via pypdfium2 (much faster than pdfminer), normalised like
+    the pdfplumber text, plus the largest number of vector path segments on one page (table
+    rules: without enough of them, pdfplumber's "lines" table finder cannot build a table).
+    None when pypdfium2 is not installed. `info` receives "page_starts".
+    """
+    try:
+        import pypdfium2 as pdfium  # installed with pdfplumber
+    except ImportError:
+        return None
+    if isinstance(pdf, bytes):
+        return _pdfium_text(pdfium, pdf, info)  # loaded from memory by pdfium directly
+    with pdf_stream(pdf) as src:
+        return _pdfium_text(pdfium, src, info)
+
+def _pdfium_text(pdfium, src, info: Optional[dict]) -> Tuple[str, int]:
+    texts, max_segments = [], 0
+    doc = pdfium.PdfDocument(src)
+    try:
+        for i in range(len(doc)):
+            page = doc[i]
+            try:
+                textpage = page.get_textpage()
+                try:
+                    raw = textpage.get_text_range()
+                finally:
+                    textpage.close()
+                segments = sum(max(pdfium.raw.FPDFPath_CountSegments(obj.raw), 0)
+                               for obj in page.get_objects(filter=(pdfium.raw.FPDF_PAGEOBJ_PATH,)))
+                max_segments = max(max_segments, segments)
+            finally:
+                page.close()
+            raw = raw.replace("\r\n", "\n").replace("\r", "\n").replace("\x00", "")
+            texts.append(_insert_missing_spaces("\n".join(ln.rstrip() for ln in raw.split("\n"))))
+    finally:
+        doc.close()
+    if info is not None:
+        info["page_starts"] = _page_starts(texts)
+    return "\n".join(texts), max_segments
+
+def text_quality_issue(text: Union[str, DocumentText]) -> Optional[str]:
+    """
+    Why `text` cannot be trusted for the text path (None when it can): it must have a line
+    structure, a "Total CHF", and items rebuilt from it whose line totals add up to that total.
+    """
+    doc = as_document_text(text)
+    lines = [ln for ln in doc.lines if ln.strip()]
+    if not lines:
+        return "texte vide"
+    if len(lines) < 3 or sorted(len(ln) for ln in lines)[len(lines) // 2] > 300:
+        return "structure de lignes"
+    if doc.text.count("\ufffd") > len(doc.text) // 100:
+        return "caractères illisibles"
+    if find_total_chf(doc) is None:
+        return "Total CHF absent"
+    return items_total_issue(reconstruct_items_from_text(doc), doc)
+
+def items_total_issue(items: Optional[List[LineItem]], text: Union[str, DocumentText]) -> Optional[str]:
+    """
+    Why `items` cannot be trusted (None when it can): their line totals must add up exactly to
+    "Total CHF" (reconcile_items, same amounts and rule as the reconciliation of the result).
+    """
+    status = reconcile_items(items, find_total_chf(text))["status"]
+    if status == "ok":
+        return None
+    return {"total absent": "Total CHF absent", "aucun article": "aucun article"}.get(status, "somme des articles ≠ Total CHF")
+
+def find_total_chf(text: Union[str, DocumentText]) -> Optional[str]:
+    """The "Total CHF" amount as printed (after the label, else before it), or None."""
+    raw = as_document_text(text).raw
+    m = TOTAL_CHF_RE.search(raw) or TOTAL_CHF_BEFORE_RE.search(raw)
+    return m.group(1).strip() if m else None
+
+def chf_decimal(value) -> Optional[Decimal]:
+    """
+    Exact value of a CHF amount as printed: "1'234.50", "1’234.50", "1 234.50", "12.–" (no
+    centimes), "1234,50" (decimal comma only when there is no point). None if it is not one.
+    """
+    s = re.sub(r"[\s'’]", "", str(value or "")).rstrip(".")
+    s = re.sub(r"\.[-–—]$", "", s)
+    if "," in s and "." not in s and re.search(r",\d{2}$", s):
+        s = s.replace(",", ".")
+    s = s.replace(",", "")
+    if not re.fullmatch(r"[+-]?\d+(\.\d+)?", s):
+        return None
+    try:
+        return Decimal(s)
+    except InvalidOperation:
+        return None
 
-def parse_fields_from_text(text: str) -> Dict[str, str]:
+def reconcile_items(items: Optional[List[LineItem]], total_chf: Optional[str]) -> Dict[str, Optional[str]]:
+    """
+    Line totals of `items` against the order's "Total CHF", in exact decimals (no tolerance).
+    `status`: "ok", "écart" (sum ≠ total), "montant illisible" (a non-empty line total that is
+    not an amount), "total absent" or "aucun article". Amounts come back as strings.
+    """
+    result: Dict[str, Optional[str]] = {"status": "ok", "total": None, "sum": None, "difference": None}
+    total = chf_decimal(total_chf) if total_chf else None
+    if total_chf and total is None:
+        result["status"] = "montant illisible"
+        return result
+    line_sum = Decimal("0")
+    unreadable = 0
+    for item in items or []:
+        if not item.total.strip():
+            continue
+        amount = chf_decimal(item.total)
+        if amount is None:
+            unreadable += 1
+        else:
+            line_sum += amount
+    result["sum"] = str(line_sum)
+    if total is not None:
+        result["total"] = str(total)
+        result["difference"] = str(line_sum - total)
+    if not items:
+        result["status"] = "aucun article"
+    elif total is None:
+        result["status"] = "total absent"
+    elif unreadable:
+        result["status"] = "montant illisible"
+    elif line_sum != total:
+        result["status"] = "écart"
+    return result
+
+def parse_fields_from_text(text: Union[str, DocumentText]) -> Dict[str, str]:
     """Use 'Total CHF' for the total displayed; keep 'Montant Total TTC CHF' only for reference."""
     fields: Dict[str, str] = {}
-    raw = text.replace("\xa0", " ")
-    norm = _strip_accents(raw).lower()
+    doc = as_document_text(text)
+    raw, norm = doc.raw, doc.norm
 
-    m_norm = re.search(r"commande fournisseur n[°o]\s*([A-Za-z0-9\-_]+)", norm, flags=re.IGNORECASE)
+    m_norm = COMMANDE_RE.search(norm)
     if m_norm:
         cf = m_norm.group(1).strip().upper()
         fields["N°commande fournisseur"] = cf
         fields["Commande fournisseur"] = cf
 
-    m_line = re.search(r"(?i)(Notre\s+référence\s*:\s*)(.*)", raw)
+    m_line = NOTRE_REF_RE.search(raw)
     if m_line:
         after = m_line.group(2).strip()
-        after_norm = _strip_accents(after).lower()
+        after_norm = fold(after)
         cut_tokens = ["no tva", "n° tva", "n o tva", "tva", "no  tva"]
         cut_idx = None
         for tok in cut_tokens:
@@ -97,20 +853,13 @@ def parse_fields_from_text(text: str) -> Dict[str, str]:
         value = after[:cut_idx].strip(" -–—\t·:;") if cut_idx is not None else after.strip(" -–—\t·:;")
         fields["Notre référence"] = value[:60]
 
-    total_chf = None
-    m = re.search(r"(?i)Total\s+CHF\s*([0-9'’.,]+)", raw)
-    if m:
-        total_chf = m.group(1).strip()
-    else:
-        m = re.search(r"([0-9'’.,]+)\s*Total\s+CHF", raw, flags=re.IGNORECASE)
-        if m:
-            total_chf = m.group(1).strip()
+    total_chf = find_total_chf(doc)
 
-    m_ttc = re.search(r"(?i)(Montant\s+Total\s+TTC\s+CHF|Total\s+TTC\s+CHF)\s*([0-9'’.,]+)", raw)
+    m_ttc = TOTAL_TTC_RE.search(raw)
     if m_ttc:
         fields["Montant Total TTC CHF (PDF)"] = m_ttc.group(2).strip()
     else:
-        m_ttc = re.search(r"([0-9'’.,]+)\s*(?i)(Montant\s+Total\s+TTC\s+CHF|Total\s+TTC\s+CHF)", raw)
+        m_ttc = TOTAL_TTC_BEFORE_RE.search(raw)
         if m_ttc:
             fields["Montant Total TTC CHF (PDF)"] = m_ttc.group(1).strip()
 
@@ -119,12 +868,12 @@ def parse_fields_from_text(text: str) -> Dict[str, str]:
 
     return fields
 
-def reconstruct_items_from_text(text: str) -> pd.DataFrame:
+def reconstruct_items_from_text(text: Union[str, DocumentText]) -> List[LineItem]:
     """Start at Pos multiples of 10; accumulate until Total CHF captured; ignore meta lines; stop at recap/total sections."""
     unit_words = r"(PC|PCE|PCS|PIECE|PIECES|UN|UNITES?|KG|G|MG|L|ML|M|MM|CM)"
     money = r"[0-9'’.,]+"
     full_item_re = re.compile(
-        rf"^\s*(?P<pos>\d{{1,4}})\s+"
+        rf"^\s*(?P<pos>\d{{1,5}})\s+"
         rf"(?P<ref>\d{{3,}})\s+"
         rf"(?P<designation>.+?)\s+"
         rf"(?P<unite>{unit_words})\s+"
@@ -135,12 +884,11 @@ def reconstruct_items_from_text(text: str) -> pd.DataFrame:
         rf"(?:\s+(?P<tva>\d{{2,3}}))?\s*$",
         re.IGNORECASE
     )
-    start_re = re.compile(r"^\s*(?P<pos>\d{1,4})\s+(?P<ref>\d{3,})\b")
+    start_re = re.compile(r"^\s*(?P<pos>\d{1,5})\s+(?P<ref>\d{3,})\b")
 
-    stop_cues = ("récapitulation", "recapitulation", "code tva", "montant total", "total ttc", "taux")
-    junk_prefixes = ("tarif douanier", "pays d'origine", "indice :", "delai de reception :")
+    junk_prefixes = ITEM_JUNK_PREFIXES
 
-    rows: List[Dict[str, str]] = []
+    rows: List[LineItem] = []
     buffer = ""
     buffering = False
 
@@ -153,25 +901,26 @@ def reconstruct_items_from_text(text: str) -> pd.DataFrame:
                 return False
         except Exception:
             return False
-        rows.append({
-            "Pos": gd.get("pos",""),
-            "Référence": gd.get("ref",""),
-            "Désignation": (gd.get("designation","") or "").strip(),
-            "Unité": gd.get("unite","").upper(),
-            "Qté": gd.get("qte",""),
-            "Prix unit.": gd.get("pu",""),
-            "Px u. Net": gd.get("pxu",""),
-            "Total CHF": gd.get("total",""),
-            "TVA": gd.get("tva","") or "",
-        })
+        rows.append(LineItem(
+            pos=gd.get("pos",""),
+            reference=gd.get("ref",""),
+            designation=(gd.get("designation","") or "").strip(),
+            unite=gd.get("unite","").upper(),
+            qte=gd.get("qte",""),
+            prix_unit=gd.get("pu",""),
+            px_net=gd.get("pxu",""),
+            total=gd.get("total",""),
+            tva=gd.get("tva","") or "",
+        ))
         return True
 
-    for raw_ln in text.splitlines():
+    doc = as_document_text(text)
+    for raw_ln, norm_ln in zip(doc.lines, doc.norm_lines):
         ln = raw_ln.strip()
         if not ln: continue
-        low = _strip_accents(ln).lower()
+        low = norm_ln.strip()
 
-        if any(low.startswith(p) for p in stop_cues):
+        if any(low.startswith(p) for p in ITEM_STOP_CUES):
             break
         if any(low.startswith(p) for p in junk_prefixes):
             continue
@@ -204,59 +953,218 @@ def reconstruct_items_from_text(text: str) -> pd.DataFrame:
                 buffer = ""
                 continue
 
-    return pd.DataFrame(rows, columns=COLUMNS_TARGET)
+    return rows
+
+# Header words of each item column, folded, as extract_words() splits them.
+WORD_HEADER_LABELS = [("Pos", ("pos",)), ("Référence", ("reference",)), ("Désignation", ("designation",)),
+                      ("Unité", ("unite",)), ("Qté", ("qte",)), ("Prix unit.", ("prix", "unit")),
+                      ("Px u. Net", ("px", "u", "net")), ("Total CHF", ("total", "chf")), ("TVA", ("tva",))]
+# Words whose tops differ by less than this (points) are on the same line.
+WORD_LINE_TOL = 2.5
+# A value may start at most this far (points) left of its column header (right-aligned amounts).
+WORD_COLUMN_SLACK = 15.0
+
+def _word_lines(words: List[dict]) -> List[List[dict]]:
+    """Words grouped into lines by their top, each line sorted left to right."""
+    lines: List[List[dict]] = []
+    for w in sorted(words, key=lambda w: (w["top"], w["x0"])):
+        if lines and w["top"] - lines[-1][0]["top"] <= WORD_LINE_TOL:
+            lines[-1].append(w)
+        else:
+            lines.append([w])
+    return [sorted(ln, key=lambda w: w["x0"]) for ln in lines]
+
+def _word_header(line: List[dict]) -> Optional[List[Tuple[str, float]]]:
+    """(column, left boundary) for a header line of the items table, or None."""
+    tokens = [fold(w["text"]).strip(".:") for w in line]
+    found: Dict[str, Tuple[float, float]] = {}
+    for col, label in WORD_HEADER_LABELS:
+        for i in range(len(tokens) - len(label) + 1):
+            if tuple(tokens[i:i + len(label)]) == label:
+                found[col] = (line[i]["x0"], line[i + len(label) - 1]["x1"])
+                break
+    if "Pos" not in found or "Qté" not in found or "Total CHF" not in found or len(found) < 6:
+        return None
+    spans = sorted(found.items(), key=lambda kv: kv[1][0])
+    bounds = []
+    for k, (col, (x0, _)) in enumerate(spans):
+        if k == 0:
+            bounds.append((col, float("-inf")))
+        else:
+            gap = max(x0 - spans[k - 1][1][1], 0.0)
+            bounds.append((col, x0 - min(gap / 2, WORD_COLUMN_SLACK)))
+    return bounds
+
+def _is_items_end(line: List[dict]) -> bool:
+    low = fold(" ".join(w["text"] for w in line)).strip()
+    return any(low.startswith(p) for p in ITEM_STOP_CUES) or low.startswith("total chf")
 
-def combine_detected_tables(tables: List[pd.DataFrame]) -> Optional[pd.DataFrame]:
-    if not tables:
+def item_table_region(words: List[dict], page_bbox: Tuple[float, float, float, float],
+                      continued: bool = False) -> Dict[str, object]:
+    """
+    Part of a page that can hold the items table, from the page's words: from the header line
+    (or the top of the page when the table goes on from the previous page, `continued`) down to
+    the totals / VAT recap or the footer band. "bbox" is None when the page has neither (table
+    finding then covers the whole page); "header" / "stop" tell what bounded it.
+    """
+    x0, top, x1, bottom = page_bbox
+    lines = _word_lines(words)
+    start, region_top, header = 0, top, False
+    for i, line in enumerate(lines):
+        if _word_header(line) is not None:
+            start, header = i + 1, True
+            region_top = max(top, line[0]["top"] - ROI_HEADER_PAD)
+            break
+    if not header and not continued:
+        return {"bbox": None, "header": False, "stop": False}
+    region_bottom, stop = bottom, False
+    for line in lines[start:]:
+        line_top = min(w["top"] for w in line)
+        if _is_items_end(line):
+            region_bottom, stop = line_top - 1, True
+            break
+        if line_top >= bottom - ROI_FOOTER_BAND:
+            region_bottom = line_top - 1
+            break
+    return {"bbox": (x0, region_top, x1, region_bottom), "header": header, "stop": stop}
+
+class WordItemParser:
+    """
+    Line items from word positions, for tables without ruling lines: fed one page of
+    extract_words() at a time (add_page), it finds the header line ("Pos", "Référence", ...,
+    "Total CHF", "TVA"), puts every word below it in the column whose x band holds the word's
+    centre and groups lines by y. An item starts on a line whose Pos is a multiple of 10 with a
+    reference; the following lines complete it (wrapped designation, amounts) until its Total
+    CHF is found, like reconstruct_items_from_text. Pages without a header reuse the previous
+    one; parsing stops at the totals / VAT recap.
+    """
+    def __init__(self):
+        self.header: Optional[List[Tuple[str, float]]] = None
+        self.rows: List[LineItem] = []
+        self.pages = 0
+        self.header_pages = 0
+        self._current: Optional[Dict[str, List[str]]] = None
+        self._stopped = False
+
+    def _cells(self, line: List[dict]) -> Dict[str, List[str]]:
+        cells: Dict[str, List[str]] = {}
+        for w in line:
+            centre = (w["x0"] + w["x1"]) / 2
+            col = self.header[0][0]
+            for name, left in self.header:
+                if centre >= left:
+                    col = name
+            cells.setdefault(col, []).append(w["text"])
+        return cells
+
+    def _close(self):
+        cur, self._current = self._current, None
+        if cur is None or not cur.get("Total CHF") or not cur.get("Qté"):
+            return
+        item = LineItem(*(" ".join(cur.get(c, [])) for c in COLUMNS_TARGET))
+        item.unite = item.unite.upper()
+        self.rows.append(item)
+
+    def add_page(self, words: List[dict]):
+        self.pages += 1
+        if self._stopped:
+            return
+        lines = _word_lines(words)
+        start = 0
+        for i, line in enumerate(lines):
+            header = _word_header(line)
+            if header is not None:
+                self.header, start = header, i + 1
+                self.header_pages += 1
+                break
+        if self.header is None:
+            return
+        for line in lines[start:]:
+            if _is_items_end(line):
+                self._close()
+                self._stopped = True
+                return
+            low = fold(" ".join(w["text"] for w in line)).strip()
+            if any(low.startswith(p) for p in ITEM_JUNK_PREFIXES):
+                continue
+            cells = self._cells(line)
+            pos = " ".join(cells.get("Pos", []))
+            if pos.isdigit() and len(pos) <= 5 and cells.get("Référence"):
+                if int(pos) % 10 == 0:
+                    self._close()
+                    self._current = cells
+                    if cells.get("Total CHF"):
+                        self._close()
+                continue
+            if self._current is not None:
+                for col, texts in cells.items():
+                    self._current.setdefault(col, []).extend(texts)
+                if self._current.get("Total CHF"):
+                    self._close()
+
+    def items(self) -> List[LineItem]:
+        self._close()
+        return list(self.rows)
+
+_POS_RE = re.compile(r"\d{1,5}")
+
+def _pos_columns(table: DetectedTable) -> Optional[List[str]]:
+    """Columns of `table` with a "Pos" column (guessed from a numeric first column), or None."""
+    columns = list(table.columns)
+    if columns and "pos" not in [fold_cell(c) for c in columns]:
+        if any(row and _POS_RE.fullmatch(row[0]) for row in table.rows):
+            columns[0] = "Pos"
+    return columns if "Pos" in columns else None
+
+def items_tables_bbox(tables: List[DetectedTable]) -> Optional[Tuple[float, float, float, float]]:
+    """Union of the page bboxes of the tables combine_detected_tables would use."""
+    boxes = [t.bbox for t in tables if t.bbox and _pos_columns(t) is not None]
+    if not boxes:
         return None
-    candidate_rows = []
-    for df in tables:
-        dfc = _clean_df(df)
-        cols_norm = [_strip_accents(str(c)).lower() for c in dfc.columns]
-        if cols_norm and ("pos" not in cols_norm):
-            first_col = dfc.columns[0]
-            if dfc[first_col].astype(str).str.fullmatch(r"\d{1,4}").fillna(False).any():
-                dfc = dfc.rename(columns={first_col: "Pos"})
-        if "Pos" in dfc.columns:
-            for _, r in df.iterrows():
-                pos = str(r["Pos"]).strip()
-                if pos.isdigit() and int(pos) % 10 == 0:
-                    candidate_rows.append(r)
-    if not candidate_rows:
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+def _candidate_item_rows(table: DetectedTable) -> Optional[List[Dict[str, str]]]:
+    """Rows of `table` ({column: cell}) whose Pos is a multiple of 10; None when it has no Pos column at all."""
+    columns = _pos_columns(table)
+    if columns is None:
         return None
-    merged = pd.DataFrame(candidate_rows)
-    for col in COLUMNS_TARGET:
-        if col not in merged.columns:
-            merged[col] = ""
-    merged = merged[COLUMNS_TARGET]
-    return merged.reset_index(drop=True)
-
-def clean_items_df_keep_full(df: pd.DataFrame) -> pd.DataFrame:
-    if df is None or df.empty: 
-        return df
-    filtered = []
-    for _, r in df.iterrows():
+    rows = []
+    for cells in table.rows:
+        r = dict(zip(columns, cells))
+        pos = r.get("Pos", "").strip()
+        if pos.isdigit() and int(pos) % 10 == 0:
+            rows.append(r)
+    return rows
+
+def combine_detected_tables(tables: List[DetectedTable]) -> Optional[List[LineItem]]:
+    items = [LineItem.from_row(r) for table in tables or [] for r in _candidate_item_rows(table) or []]
+    return items or None
+
+def clean_items(items: Optional[List[LineItem]]) -> List[LineItem]:
+    """`items` without the "Indice :" / "Délai de réception :" lines a table may have kept as rows."""
+    kept = []
+    for item in items or []:
         first_non_empty = ""
-        for v in r.tolist():
-            s = str(v).strip() if v is not None else ""
-            if s: first_non_empty = _strip_accents(s.lower()); break
+        for v in item.values():
+            v = v.strip()
+            if v: first_non_empty = fold_cell(v); break
         if first_non_empty.startswith("indice :") or first_non_empty.startswith("delai de reception :"):
             continue
-        filtered.append(r)
-    new_df = pd.DataFrame(filtered, columns=df.columns) if filtered else df.iloc[0:0].copy()
-    keep_cols = [c for c in new_df.columns if _strip_accents(str(c)).strip().lower() != "tva"]
-    new_df = new_df[keep_cols] if keep_cols else new_df
-    return new_df.reset_index(drop=True)
+        kept.append(item)
+    return kept
+
+def _set_paragraph_text_keep_runs(paragraph, new_text: str):
+    """Empty every run (keeping its formatting) and put the whole text in the first one."""
+    for idx in range(len(paragraph.runs)-1, -1, -1):
+        r = paragraph.runs[idx]; r.clear(); r.text = ""
+    if not paragraph.runs: paragraph.add_run(new_text)
+    else: paragraph.runs[0].text = new_text
 
 def replace_placeholders_everywhere(doc: Document, mapping: Dict[str, str]):
     def _replace_in_paragraph(paragraph, target: str, replacement: str):
         full_text = "".join(run.text for run in paragraph.runs)
         if target not in full_text: return
-        new_text = full_text.replace(target, replacement)
-        for idx in range(len(paragraph.runs)-1, -1, -1):
-            r = paragraph.runs[idx]; r.clear(); r.text = ""
-        if not paragraph.runs: paragraph.add_run(new_text)
-        else: paragraph.runs[0].text = new_text
+        _set_paragraph_text_keep_runs(paragraph, full_text.replace(target, replacement))
     for p in doc.paragraphs:
         for key, val in mapping.items():
             for variant in (f"« {key} »", f"«\xa0{key}\xa0»"):
@@ -282,31 +1190,183 @@ def compute_facture_suffix(fields: Dict[str, str]) -> Optional[str]:
         return m.group(1)
     return None
 
+_UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+def docx_filename(fields: Dict[str, str], fallback: Optional[str] = None) -> str:
+    """
+    Download / output name of the invoice: "Facture <commande>.docx", else "Facture <fallback>.docx" or "Facture.docx".
+    Path separators and characters Windows refuses in file names become "-".
+    """
+    name = (fields.get("Commande fournisseur") or "").strip() or fallback
+    name = _UNSAFE_FILENAME_RE.sub("-", name).strip(" .") if name else name
+    return f"Facture {name}.docx" if name else "Facture.docx"
+
+def _set_facture_title_paragraph(p, suffix: Optional[str]):
+    from docx.shared import Pt
+    txt = p.text.strip()
+    if txt.startswith("Facture"):
+        for r in p.runs[::-1]:
+            r.clear()
+        p.text = ""
+        run = p.add_run(f"Facture {suffix}" if suffix else "Facture")
+        run.bold = True
+        run.font.size = Pt(12)
+
 def set_facture_title(doc: Document, suffix: Optional[str]):
-    def set_para(p):
-        txt = p.text.strip()
-        if txt.startswith("Facture"):
-            for r in p.runs[::-1]:
-                r.clear()
-            p.text = ""
-            run = p.add_run(f"Facture {suffix}" if suffix else "Facture")
-            run.bold = True
-            run.font.size = Pt(12)
     for p in doc.paragraphs:
-        set_para(p)
+        _set_facture_title_paragraph(p, suffix)
     for section in doc.sections:
         for hdr in (section.header, section.footer):
             for p in hdr.paragraphs:
-                set_para(p)
+                _set_facture_title_paragraph(p, suffix)
 
-def find_paragraph_anchor(doc: Document) -> Optional[object]:
-    target_re = re.compile(r"cond\.\s*de\s*paiement[s]?", re.IGNORECASE)
-    for p in doc.paragraphs:
-        txt = _strip_accents(p.text).lower()
-        if target_re.search(txt): return p
-    return None
+ANCHOR_RE = re.compile(r"cond\.\s*de\s*paiement[s]?", re.IGNORECASE)
+PLACEHOLDER_RE = re.compile(r"«([ \xa0])(.+?)\1»")
+
+def _template_parts(doc: Document) -> List[Tuple[object, object]]:
+    """(element, parent) for the body then every section header/footer, in the order the fillers visit them."""
+    parts = [(doc.element.body, doc._body)]
+    for section in doc.sections:
+        for hdr in (section.header, section.footer):
+            parts.append((hdr._element, hdr))
+    return parts
+
+class CompiledTemplate:
+    """
+    A template.docx parsed once and indexed: which paragraphs hold « placeholders », the
+    "Facture" title and the "Cond. de paiement" anchor. Addresses are (part, paragraph index in
+    document order), so fill() re-opens the bytes and touches only the indexed paragraphs with
+    one combined pattern instead of scanning paragraphs × keys × « » variants.
+    Visits exactly the paragraphs replace_placeholders_everywhere/set_facture_title/find_paragraph_anchor do.
+    """
+    def __init__(self, template_bytes: bytes):
+        from docx import Document
+        from docx.oxml.ns import qn
+        self.template_bytes = template_bytes
+        doc = Document(BytesIO(template_bytes))
+        parts = _template_parts(doc)
+        positions = [{el: i for i, el in enumerate(part_el.iter(qn('w:p')))} for part_el, _ in parts]
+
+        body_paras = list(doc.paragraphs)
+        cell_paras = [p for table in doc.tables for row in table.rows for cell in row.cells for p in cell.paragraphs]
+        hdr_paras = [(k, p) for k in range(1, len(parts)) for p in parts[k][1].paragraphs]
+        placeholder_visits = [(0, p) for p in body_paras + cell_paras] + hdr_paras
+        title_visits = [(0, p) for p in body_paras] + hdr_paras
+
+        def addr(k, p):
+            return (k, positions[k][p._p])
+
+        # key -> addresses of the paragraphs it appears in (a paragraph may hold several keys)
+        self.placeholders: Dict[str, List[Tuple[int, int]]] = {}
+        with_placeholder = set()
+        for k, p in placeholder_visits:
+            for m in PLACEHOLDER_RE.finditer("".join(r.text for r in p.runs)):
+                a = addr(k, p)
+                with_placeholder.add(a)
+                if a not in self.placeholders.setdefault(m.group(2), []):
+                    self.placeholders[m.group(2)].append(a)
+        self.placeholder_paragraphs: List[Tuple[int, int]] = []
+        for k, p in placeholder_visits:
+            a = addr(k, p)
+            if a in with_placeholder and a not in self.placeholder_paragraphs:
+                self.placeholder_paragraphs.append(a)
+        # Text can only change in placeholder paragraphs, so those are re-checked too.
+        self.title_paragraphs = [addr(k, p) for k, p in title_visits
+                                 if p.text.strip().startswith("Facture") or addr(k, p) in with_placeholder]
+        self.anchor_paragraphs = [addr(0, p) for p in body_paras
+                                  if ANCHOR_RE.search(_strip_accents(p.text).lower()) or addr(0, p) in with_placeholder]
+        # Unfilled copies of every paragraph fill() may rewrite, for refill().
+        elements = [list(part_el.iter(qn('w:p'))) for part_el, _ in parts]
+        self._pristine = {a: deepcopy(elements[a[0]][a[1]]) for a in set(self.placeholder_paragraphs) | set(self.title_paragraphs)}
+
+    def _paragraphs(self, doc: Document, addresses: List[Tuple[int, int]]) -> list:
+        from docx.oxml.ns import qn
+        from docx.text.paragraph import Paragraph
+        parts = _template_parts(doc)
+        cache: Dict[int, list] = {}
+        out = []
+        for k, i in addresses:
+            if k not in cache:
+                cache[k] = list(parts[k][0].iter(qn('w:p')))
+            out.append(Paragraph(cache[k][i], parts[k][1]))
+        return out
+
+    def fill(self, mapping: Dict[str, str], doc: Optional[Document] = None, report=NULL_REPORT) -> Document:
+        """Fresh Document from the template with placeholders and the "Facture" title filled."""
+        from docx import Document
+        if doc is None:
+            doc = Document(BytesIO(self.template_bytes))
+        keys = [k for k in mapping if k in self.placeholders]
+        if keys:
+            pattern = re.compile("«([ \xa0])(" + "|".join(re.escape(k) for k in keys) + ")\\1»")
+            for p in self._paragraphs(doc, self.placeholder_paragraphs):
+                full_text = "".join(run.text for run in p.runs)
+                new_text, n = pattern.subn(lambda m: str(mapping[m.group(2)]), full_text)
+                report.count("placeholders_replaced", n)
+                if new_text != full_text:
+                    _set_paragraph_text_keep_runs(p, new_text)
+        suffix = compute_facture_suffix(mapping)
+        for p in self._paragraphs(doc, self.title_paragraphs):
+            _set_facture_title_paragraph(p, suffix)
+        return doc
+
+    def refill(self, doc: Document, old: Dict[str, str], new: Dict[str, str], report=NULL_REPORT) -> List[str]:
+        """
+        Bring a document filled from `old` to what fill(new) gives, touching only the paragraphs of
+        the placeholders whose value changed (restored from the template, then filled again) and,
+        when the order number changes, the "Facture" title. Returns the changed keys.
+        """
+        from docx.oxml.ns import qn
+        from docx.text.paragraph import Paragraph
+        changed = [k for k in dict.fromkeys(list(old) + list(new)) if old.get(k) != new.get(k)]
+        addresses = sorted({a for k in changed for a in self.placeholders.get(k, [])})
+        parts = _template_parts(doc)
+        elements: Dict[int, list] = {}
+        restored = []
+        for k, i in addresses:
+            if k not in elements:
+                elements[k] = list(parts[k][0].iter(qn('w:p')))
+            fresh = deepcopy(self._pristine[(k, i)])
+            elements[k][i].getparent().replace(elements[k][i], fresh)
+            restored.append(Paragraph(fresh, parts[k][1]))
+        keys = [k for k in new if k in self.placeholders]
+        if restored and keys:
+            pattern = re.compile("«([ \xa0])(" + "|".join(re.escape(k) for k in keys) + ")\\1»")
+            for p in restored:
+                full_text = "".join(run.text for run in p.runs)
+                new_text, n = pattern.subn(lambda m: str(new[m.group(2)]), full_text)
+                report.count("placeholders_replaced", n)
+                if new_text != full_text:
+                    _set_paragraph_text_keep_runs(p, new_text)
+        suffix = compute_facture_suffix(new)
+        titles = self.title_paragraphs if suffix != compute_facture_suffix(old) else \
+            [a for a in self.title_paragraphs if a in set(addresses)]
+        for p in self._paragraphs(doc, titles):
+            _set_facture_title_paragraph(p, suffix)
+        return changed
+
+    def anchor(self, doc: Document) -> Optional[object]:
+        """Same paragraph find_paragraph_anchor(doc) returns, for a document produced by fill()."""
+        for p in self._paragraphs(doc, self.anchor_paragraphs):
+            if ANCHOR_RE.search(_strip_accents(p.text).lower()):
+                return p
+        return None
+
+def compile_template(template: TemplateSource) -> CompiledTemplate:
+    """
+    Compiled templates are reused across requests for the same template content: a path or
+    binary file is read on every call (an edited template is recompiled), the cache is keyed
+    by the bytes.
+    """
+    return _compile_template_bytes(read_source_bytes(template))
+
+@lru_cache(maxsize=8)
+def _compile_template_bytes(template_bytes: bytes) -> CompiledTemplate:
+    return CompiledTemplate(template_bytes)
 
 def _set_border(el, side, val='single', sz='8', space='0', color='auto'):
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
     border = el.find(qn(f'w:{side}'))
     if border is None:
         border = OxmlElement(f'w:{side}')
@@ -318,6 +1378,8 @@ def _set_border(el, side, val='single', sz='8', space='0', color='auto'):
 
 def set_table_borders_horizontal_only(table):
     """Outer frame + inside horizontals only; remove inside verticals."""
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
     tbl = table._element
     tblPr = tbl.tblPr if tbl.tblPr is not None else OxmlElement('w:tblPr')
     tblBorders = tblPr.find(qn('w:tblBorders'))
@@ -345,6 +1407,8 @@ def set_table_borders_horizontal_only(table):
             _set_border(tcBorders, 'right', val=('single' if c_idx == n_cols-1 else 'nil'))
 
 def shade_header_row(table, fill_hex="EEF3FF"):
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
     if not table.rows: return
     for cell in table.rows[0].cells:
         tcPr = cell._tc.get_or_add_tcPr()
@@ -357,13 +1421,9 @@ def shade_header_row(table, fill_hex="EEF3FF"):
 
 
 
-def apply_column_widths_and_alignments(table):
-    try:
-        table.autofit = False
-    except Exception:
-        pass
-    header_cells = table.rows[0].cells
-    headers = [c.text.strip() for c in header_cells]
+def _column_layout(headers: List[str]):
+    """Column index by header, fixed widths and centered columns used by the items table."""
+    from docx.shared import Inches
     idx = {name: i for i, name in enumerate(headers)}
     widths_in = {}
     if "Pos" in idx: widths_in[idx["Pos"]] = Inches(0.5)
@@ -372,6 +1432,25 @@ def apply_column_widths_and_alignments(table):
 
     center_cols = {idx.get("Unité", -1), idx.get("Prix unit.", -1), idx.get("Px u. Net", -1)}
     center_cols = {c for c in center_cols if c is not None and c >= 0}
+    return idx, widths_in, center_cols
+
+def _value_aligned_columns(headers: List[str]) -> List[int]:
+    """Body columns whose alignment depends on the value (right if numeric, else left)."""
+    idx, _, center_cols = _column_layout(headers)
+    fixed = {idx.get("Pos", -1), idx.get("Référence", -1), idx.get("Désignation", -1), idx.get("Qté", -1)} | center_cols
+    return [j for j in range(len(headers)) if j not in fixed]
+
+def apply_column_widths_and_alignments(table):
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+    try:
+        table.autofit = False
+    except Exception:
+        pass
+    header_cells = table.rows[0].cells
+    headers = [c.text.strip() for c in header_cells]
+    idx, widths_in, center_cols = _column_layout(headers)
 
     for r in table.rows:
         for j, cell in enumerate(r.cells):
@@ -418,6 +1497,8 @@ def apply_column_widths_and_alignments(table):
 
 def set_cell_vertical_center(cell):
     """Force vertical centering via both python-docx property and low-level XML."""
+    from docx.enum.table import WD_ALIGN_VERTICAL
+    from docx.oxml.ns import qn
     try:
         cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
     except Exception:
@@ -435,6 +1516,7 @@ def set_cell_vertical_center(cell):
         pass
 
 def insert_paragraph_after(paragraph, text=""):
+    from docx.oxml import OxmlElement
     new_p = OxmlElement('w:p')
     paragraph._p.addnext(new_p)
     from docx.text.paragraph import Paragraph
@@ -443,6 +1525,8 @@ def insert_paragraph_after(paragraph, text=""):
     return para
 
 def insert_paragraph_after_element(elm, text="", align=None, bold=False, font_size_pt=None):
+    from docx.shared import Pt
+    from docx.oxml import OxmlElement
     new_p = OxmlElement('w:p')
     elm.addnext(new_p)
     from docx.text.paragraph import Paragraph
@@ -455,6 +1539,9 @@ def insert_paragraph_after_element(elm, text="", align=None, bold=False, font_si
 
 def add_total_row_to_table(table, label: str, amount: str):
     """Append a total row inside the table with merged label cells and double underline + top double border."""
+    from docx.enum.text import WD_PARAGRAPH_ALIGNMENT, WD_UNDERLINE
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
     n_cols = len(table.rows[0].cells) if table.rows else 0
     if n_cols == 0:
         return
@@ -517,6 +1604,7 @@ def cleanup_extra_blank_paras(start_para, max_blank=1):
     Remove excess blank paragraphs immediately following `start_para`.
     Keeps at most `max_blank` empty paragraphs.
     """
+    from docx.oxml.ns import qn
     blanks = 0
     nxt = start_para._p.getnext()
     while nxt is not None and nxt.tag == qn('w:p'):
@@ -538,6 +1626,7 @@ def cleanup_extra_blank_paras(start_para, max_blank=1):
 
 def remove_bottom_border_last_data_row(table):
     """Remove the bottom border on the row BEFORE the total row to avoid an extra line between body and total."""
+    from docx.oxml.ns import qn
     try:
         if len(table.rows) < 2:
             return
@@ -562,31 +1651,58 @@ def remove_bottom_border_last_data_row(table):
     except Exception:
         pass
 
-def insert_df_two_lines_below_anchor(doc: Document, df: pd.DataFrame, total_ttc: Optional[str] = ""):
-    if df is None or df.empty: return
-    df = df.copy(); df.columns = [str(c) for c in df.columns]
-
-    # Build table at end then move it near anchor
-    tbl = doc.add_table(rows=1, cols=len(df.columns))
+def _stamp_data_rows(table, items: List[LineItem], columns: List[str]):
+    """
+    Replace the styled prototype row (last row) by one clone per item. Only the run text and
+    the value-dependent alignment are set, so the XML is the same as styling every cell through
+    python-docx, at a small constant cost per cell.
+    """
+    from docx.oxml.ns import qn
+    proto_tr = table.rows[-1]._tr
+    dynamic = _value_aligned_columns(columns)
+    number_re = re.compile(r"^\s*[0-9'’.,]+\s*$")
+    attrs = [_ITEM_ATTR[c] for c in columns]
+    for item in items:
+        tr = deepcopy(proto_tr)
+        tcs = tr.tc_lst
+        for j, attr in enumerate(attrs):
+            val = getattr(item, attr)
+            if not val:
+                continue
+            r = tcs[j].p_lst[0].r_lst[0]
+            r.text = val
+            if j in dynamic and number_re.match(r.text):
+                tcs[j].p_lst[0].pPr.jc.set(qn('w:val'), 'right')
+        proto_tr.addprevious(tr)
+    proto_tr.getparent().remove(proto_tr)
+
+def insert_items_two_lines_below_anchor(doc: Document, items: Optional[List[LineItem]], total_ttc: Optional[str] = "",
+                                        anchor=None, columns: List[str] = ITEM_TABLE_COLUMNS):
+    from docx.shared import Pt
+    from docx.enum.table import WD_TABLE_ALIGNMENT
+    if not items: return
+
+    # Build table at end then move it near anchor: header + one empty prototype data row
+    tbl = doc.add_table(rows=1, cols=len(columns))
     hdr_cells = tbl.rows[0].cells
-    for i, c in enumerate(df.columns):
-        hdr_cells[i].text = str(c)
-    for _, row in df.iterrows():
-        cells = tbl.add_row().cells
-        for i, col in enumerate(df.columns):
-            val = "" if pd.isna(row[col]) else str(row[col])
-            cells[i].text = val
-            for para in cells[i].paragraphs:
-                if para.runs: para.runs[0].font.size = Pt(10)
-
-    # Styling
+    for i, c in enumerate(columns):
+        hdr_cells[i].text = c
+    cells = tbl.add_row().cells
+    for cell in cells:
+        cell.text = ""
+        for para in cell.paragraphs:
+            if para.runs: para.runs[0].font.size = Pt(10)
+
+    # Styling (applied once to the header and the prototype row)
     shade_header_row(tbl, fill_hex="EEF3FF")
     set_table_borders_horizontal_only(tbl)
     apply_column_widths_and_alignments(tbl)
     tbl.alignment = WD_TABLE_ALIGNMENT.LEFT
+    _stamp_data_rows(tbl, items, columns)
 
     # Move table 2 lines below anchor
-    anchor = find_paragraph_anchor(doc)
+    if anchor is None:
+        anchor = find_paragraph_anchor(doc)
     if anchor is not None:
         p1 = insert_paragraph_after(anchor, "")
         p2 = insert_paragraph_after(p1, "")
@@ -600,15 +1716,356 @@ def insert_df_two_lines_below_anchor(doc: Document, df: pd.DataFrame, total_ttc:
     p_after = insert_paragraph_after_element(tbl._element, text="")
     cleanup_extra_blank_paras(p_after, max_blank=1)
 
-def process_pdf_to_docx(pdf_bytes: bytes, template_docx_bytes: bytes):
-    text, tables = extract_text_and_tables_from_pdf(BytesIO(pdf_bytes))
-    fields = parse_fields_from_text(text)
+def save_docx(doc: Document, out: DocxTarget) -> int:
+    """
+    Saves `doc` to `out`: a path (written next to it, then renamed into place) or a writable
+    binary stream (need not be seekable). Returns the bytes written, 0 when the stream cannot tell.
+    """
+    if isinstance(out, (str, os.PathLike)):
+        path = os.fspath(out)
+        tmp = f"{path}.{uuid.uuid4().hex[:12]}.part"
+        f = open(tmp, "xb")
+        try:
+            with f:
+                doc.save(f)
+                size = f.tell()
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return size
+    try:
+        start = out.tell()
+    except (AttributeError, OSError):
+        start = None
+    doc.save(out)
+    return out.tell() - start if start is not None else 0
+
+class InvoiceDraft:
+    """
+    Analysis result kept in memory until generation: fields, items and the placeholder-filled
+    Document (no save/reload in between). render() inserts the items table into the live
+    document, serialises once, then restores the body from a deep-copied snapshot so the draft
+    can be rendered again (e.g. after edits). `stats` reports the estimated savings: each render
+    skips the intermediate save + parse of the filled template. `reconciliation` is
+    reconcile_items() of the analysed items against the "Total CHF" field.
+    """
+    def __init__(self, doc: Document, fields: Dict[str, str], items: List[LineItem],
+                 template: Optional[CompiledTemplate] = None, from_cache: bool = False, report=None,
+                 engine: Optional[str] = None):
+        self.doc = doc
+        self.report = report or NULL_REPORT
+        self.engine = engine  # text engine of the analysis; None for a draft restored from the cache
+        self.layout_profile = False  # items read through a supplier layout profile (analyze_pdf)
+        self.fields = fields
+        self.items = items
+        self.reconciliation = reconcile_items(items, fields.get("Total TTC CHF"))
+        self.template = template
+        self.from_cache = from_cache
+        self.stats = {"renders": 0, "saved_round_trips": 0, "est_bytes_saved": 0, "est_seconds_saved": 0.0,
+                      "field_updates": 0, "refilled_keys": 0}
+
+    @classmethod
+    def from_bytes(cls, doc_bytes: Optional[bytes], fields: Dict[str, str], items: List[LineItem],
+                   template: Optional[CompiledTemplate] = None, from_cache: bool = False, report=None) -> "InvoiceDraft":
+        """Draft from a serialised filled document; with `doc_bytes` None, `template` is filled again from `fields`."""
+        from docx import Document
+        report = report or NULL_REPORT
+        if doc_bytes is None:
+            with report.stage("fill"):
+                return cls(template.fill(fields, report=report), fields, items, template, from_cache, report)
+        with report.stage("load_cached_doc"):
+            doc = Document(BytesIO(doc_bytes))
+        return cls(doc, fields, items, template, from_cache, report)
+
+    def to_bytes(self) -> bytes:
+        """The placeholder-filled document, without the items table."""
+        out = BytesIO(); self.doc.save(out)
+        return out.getvalue()
+
+    def update_fields(self, fields: Dict[str, str]) -> List[str]:
+        """
+        Apply edited field values to the live document: only the paragraphs of the changed
+        placeholders are refilled (CompiledTemplate.refill), the rest of the document is kept.
+        Returns the changed keys.
+        """
+        if self.template is None:
+            raise ValueError("update_fields needs the CompiledTemplate the draft was filled from")
+        fields = dict(fields)
+        with self.report.stage("refill"):
+            changed = self.template.refill(self.doc, self.fields, fields, report=self.report)
+        self.fields = fields
+        self.stats["field_updates"] += 1
+        self.stats["refilled_keys"] += len(changed)
+        return changed
+
+    def render(self, items: Optional[List[LineItem]] = None, total_ttc: Optional[str] = None,
+               fields: Optional[Dict[str, str]] = None, out: Optional[DocxTarget] = None) -> Optional[bytes]:
+        """The final DOCX as bytes, or written to `out` (path or writable binary stream; returns None)."""
+        if fields is not None:
+            self.update_fields(fields)
+        if items is None:
+            items = self.items
+        if total_ttc is None:
+            total_ttc = self.fields.get("Total TTC CHF", "")
+        body = self.doc.element.body
+        snapshot = deepcopy(body)
+        try:
+            with self.report.stage("table"):
+                anchor = self.template.anchor(self.doc) if self.template is not None else None
+                insert_items_two_lines_below_anchor(self.doc, items, total_ttc or "", anchor=anchor)
+            self.report.count("table_rows", len(items or []))
+            t0 = time.perf_counter()
+            with self.report.stage("save"):
+                if out is None:
+                    buf = BytesIO(); self.doc.save(buf)
+                    data, size = buf.getvalue(), buf.tell()
+                else:
+                    data, size = None, save_docx(self.doc, out)
+            save_s = time.perf_counter() - t0
+        finally:
+            body[:] = list(snapshot)  # keep the body element itself: python-docx holds on to it
+        self.stats["renders"] += 1
+        self.stats["saved_round_trips"] += 1
+        # The skipped intermediate copy is this document minus the table: final size and save time bound it.
+        self.stats["est_bytes_saved"] += size
+        self.stats["est_seconds_saved"] += save_s
+        return data
+
+def _table_strategy(pdf: PdfSource, extract_opts: dict) -> Optional[List[LineItem]]:
+    """The "table" item strategy on its own: full extraction with table detection, then combine."""
+    _, tables = extract_text_and_tables_from_pdf(pdf, **extract_opts)
+    return combine_detected_tables(tables)
+
+def _table_strategy_worker(conn, pdf: PdfSource, extract_opts: dict):
+    try:
+        conn.send(("ok", _table_strategy(pdf, extract_opts)))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+def _race_context():
+    """
+    Start method of the race's child: "forkserver" (else "spawn"), never a plain fork of this
+    process, which may hold threads (the app, the job service) whose locks the child would inherit.
+    The fork server preloads this module, so a child does not import pdfplumber again.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+def _race_item_strategies(pdf: PdfSource, extract_opts: dict, info: dict,
+                          report) -> Tuple[DocumentText, List[LineItem], str, Dict[str, str]]:
+    """
+    item_engine="race". The table strategy runs in a child process while this one does the
+    text pass (no table detection), which gives two candidates at once: the items rebuilt
+    from the text and those of WordItemParser. Candidates are checked as they become
+    available (the table items first if the child is already done); the first whose line
+    totals reconcile exactly with "Total CHF" (reconcile_items) wins, and the child, if still
+    running, is terminated. When none reconciles, the table items are kept if there are any,
+    else the text ones (the "auto" choice). On a single CPU, or in a daemonic process, there is
+    no child: the table strategy runs last, only if no text candidate reconciles. Only the table
+    strategy runs alongside; the child opens and parses the whole PDF again on its own.
+    Returns (text, items, strategy, {candidate: reconciliation status}).
+    """
+    # The child is daemonic, so it cannot start page workers of its own.
+    child_opts = {k: v for k, v in extract_opts.items() if k != "report"}
+    child_opts["parallel"] = False
+    proc = recv = None
+    if (os.cpu_count() or 1) > 1 and not multiprocessing.current_process().daemon:
+        ctx = _race_context()
+        recv, send = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_table_strategy_worker, args=(send, _worker_pdf(pdf), child_opts), daemon=True)
+        proc.start()
+        send.close()
+    checked: Dict[str, str] = {}
+    candidates: Dict[str, Optional[List[LineItem]]] = {}
+
+    def _table_items() -> Optional[List[LineItem]]:
+        if proc is None:
+            with report.stage("items", strategy="table", race=True):
+                return _table_strategy(pdf, child_opts)
+        with report.stage("race_wait", strategy="table"):
+            try:
+                status, payload = recv.recv()
+            except EOFError:  # the child died (killed, out of memory)
+                status, payload = "error", f"processus terminé (code {proc.exitcode})"
+        if status != "ok":
+            report.set("race_table_error", payload)
+            return None
+        return payload
+
+    try:
+        word_parser = WordItemParser()
+        with report.stage("extract", items="race"):
+            raw_text, _ = extract_text_and_tables_from_pdf(pdf, detect_tables=False, info=info,
+                                                           word_parser=word_parser, **extract_opts)
+        with report.stage("normalize"):
+            text = DocumentText(raw_text, info.get("page_starts"))
+        total_chf = find_total_chf(text)
+        pending = ["text", "words", "table"]
+        if proc is not None and recv.poll():
+            pending = ["table", "text", "words"]
+        for name in pending:
+            if name == "table":
+                items = _table_items()
+            else:
+                with report.stage("items", strategy=name, race=True):
+                    items = reconstruct_items_from_text(text) if name == "text" else word_parser.items()
+            candidates[name] = items
+            checked[name] = reconcile_items(items, total_chf)["status"]
+            if checked[name] == "ok":
+                return text, items, name, checked
+        if candidates.get("table") is not None:
+            return text, candidates["table"], "table", checked
+        return text, candidates["text"], "text", checked
+    finally:
+        if proc is not None:
+            if proc.is_alive():
+                proc.terminate()
+            if "table" not in candidates:
+                report.set("race_cancelled", "table")
+            proc.join()
+            recv.close()
+
+def analyze_pdf(pdf: PdfSource, template_docx_bytes: Union[TemplateSource, CompiledTemplate], parallel_pages: bool = False,
+                early_stop: bool = False, layout_store=None, report=None, low_memory: bool = False,
+                memory_limit_mb: Optional[float] = None, text_engine: str = "pdfplumber",
+                item_engine: str = "auto") -> InvoiceDraft:
+    """
+    Extraction + parsing + template fill, keeping the filled document parsed in an InvoiceDraft.
+    `pdf` is a PdfSource (bytes, path, buffer or open binary file), read in place; the template
+    is bytes, a path, a binary file or a CompiledTemplate. With a `layout_store` (layout_profiles.LayoutProfileStore), a known supplier layout goes
+    straight to its recorded item strategy and page-1 table crop box; unknown layouts, or a profile
+    whose items are missing or do not reconcile with "Total CHF", take the full path and (re)record
+    the profile (`draft.layout_profile` tells whether the profile's reading was kept).
+    `report` (pipeline_report.PipelineReport) records per-stage/per-page timings and counts;
+    it stays on the draft so render() adds the generation stages.
+
+    `text_engine` (TEXT_ENGINES): "pdfium" takes the text from pypdfium2 and rebuilds the items
+    from it, without pdfplumber, when text_quality_issue() finds nothing wrong; "auto" does the
+    same only for PDFs without vector rules (where pdfplumber would not find a table either).
+    Otherwise, the full pdfplumber path runs. The engine used is in `draft.engine`.
+
+    `item_engine` (ITEM_ENGINES): "words" reads the items from word x-positions under the table
+    header (WordItemParser) in the pdfplumber text pass, without table detection; when they do
+    not add up to "Total CHF" (items_total_issue), the "auto" path runs. "race" runs the table
+    and text strategies concurrently and keeps the first whose totals reconcile exactly
+    (_race_item_strategies); it does not use the `layout_store`. Both apply to the pdfplumber
+    text only (not to a text taken from pdfium).
+    The outcome of reconcile_items() for the final items is in `draft.reconciliation`.
+    """
+    if text_engine not in TEXT_ENGINES:
+        raise ValueError(f"text_engine must be one of {TEXT_ENGINES}")
+    if item_engine not in ITEM_ENGINES:
+        raise ValueError(f"item_engine must be one of {ITEM_ENGINES}")
+    report = report or NULL_REPORT
+    extract_opts = {"parallel": parallel_pages, "early_stop": early_stop, "report": report,
+                    "low_memory": low_memory, "memory_limit_mb": memory_limit_mb}
+    info: dict = {}
+    text: Optional[DocumentText] = None
+    engine = "pdfplumber"
+    if text_engine != "pdfplumber":
+        issue = None
+        pdfium_info: dict = {}
+        with report.stage("extract", engine="pdfium"):
+            try:
+                fast = extract_text_pdfium(pdf, info=pdfium_info)
+            except Exception as e:  # damaged or encrypted for pdfium: pdfplumber gets its chance
+                fast, issue = None, f"pdfium : {type(e).__name__}"
+        if issue is not None:
+            pass
+        elif fast is None:
+            issue = "pypdfium2 indisponible"
+        elif text_engine == "auto" and fast[1] >= AUTO_MAX_RULE_SEGMENTS:
+            issue = "traits vectoriels (tableau probable)"
+        else:
+            fast_text = DocumentText(fast[0], pdfium_info.get("page_starts"))
+            issue = text_quality_issue(fast_text)
+        if issue is None:
+            text, tables, engine = fast_text, [], "pdfium"
+        else:
+            engine = f"pdfplumber (repli : {issue})"
+    items = None
+    if text is None and item_engine == "words":
+        word_parser = WordItemParser()
+        with report.stage("extract", items="words"):
+            raw_text, tables = extract_text_and_tables_from_pdf(pdf, detect_tables=False, info=info,
+                                                                word_parser=word_parser, **extract_opts)
+        with report.stage("normalize"):
+            text = DocumentText(raw_text, info.get("page_starts"))
+        with report.stage("items", strategy="words"):
+            items = word_parser.items()
+            issue = items_total_issue(items, text)
+        report.count("word_header_pages", word_parser.header_pages)
+        if issue is None:
+            strategy = "words"
+        else:
+            report.set("words_fallback", issue)
+            text, items, info = None, None, {}
+    if text is None and item_engine == "race":
+        text, items, strategy, checked = _race_item_strategies(pdf, extract_opts, info, report)
+        report.set("race_checked", checked)
+    if text is None:
+        with report.stage("extract"):
+            raw_text, tables = extract_text_and_tables_from_pdf(pdf, layout_store=layout_store, info=info, **extract_opts)
+        with report.stage("normalize"):
+            # Folded once here; every parser below reads this DocumentText.
+            text = DocumentText(raw_text, info.get("page_starts"))
+    report.set("text_engine", engine)
+    profile = info.get("profile")
+    if profile is not None:
+        strategy = profile.get("strategy")
+        with report.stage("items", strategy=strategy, profile=True):
+            items = combine_detected_tables(tables) if strategy == "table" else reconstruct_items_from_text(text)
+        if not items or reconcile_items(clean_items(items), find_total_chf(text))["status"] != "ok":
+            # The supplier's layout changed (or this order does not fit the profile's reading):
+            # full path, and the profile is re-recorded below.
+            report.set("profile_fallback", True)
+            with report.stage("extract", retry=True):
+                retry_info: dict = {}
+                raw_text, tables = extract_text_and_tables_from_pdf(pdf, info=retry_info, **extract_opts)
+                text = DocumentText(raw_text, retry_info.get("page_starts"))
+            items, profile = None, None
+    if profile is None and items is None:
+        with report.stage("items"):
+            if tables:
+                items = combine_detected_tables(tables)
+            strategy = "table" if items is not None else "text"
+            if items is None:
+                items = reconstruct_items_from_text(text)
+        if layout_store is not None and items:
+            bbox = items_tables_bbox(tables) if strategy == "table" else None
+            layout_store.record(info.get("fingerprint"), strategy, bbox=bbox, columns=list(COLUMNS_TARGET))
+    with report.stage("clean_items"):
+        items = clean_items(items)
+    report.set("items_source", strategy)
+    report.set("layout_profile", profile is not None)
+    report.count("rows", len(items))
+
+    with report.stage("fields"):
+        fields = _parse_all_fields(text)
+
+    # Build doc with placeholders then title (compiled template: indexed single-pass fill)
+    with report.stage("fill"):
+        template = template_docx_bytes if isinstance(template_docx_bytes, CompiledTemplate) else compile_template(template_docx_bytes)
+        doc = template.fill(fields, report=report)
+    draft = InvoiceDraft(doc, fields, items, template, report=report, engine=engine)
+    draft.layout_profile = profile is not None
+    report.set("reconciliation", draft.reconciliation["status"])
+    return draft
+
+def _parse_all_fields(text: Union[str, DocumentText]) -> Dict[str, str]:
+    doc = as_document_text(text)
+    fields = parse_fields_from_text(doc)
     fields["date du jour"] = today_ch()
 
     # Délai de réception max (alias Livré le)
     from_text = []
-    norm = _strip_accents(text).lower().replace("\xa0"," ")
-    for ln in [l.strip() for l in norm.splitlines() if l.strip()]:
+    for ln in [l.strip() for l in doc.norm_lines if l.strip()]:
         if "delai de reception" in ln:
             m = DATE_RE.search(ln)
             if m:
@@ -621,26 +2078,28 @@ def process_pdf_to_docx(pdf_bytes: bytes, template_docx_bytes: bytes):
         max_dt = max(from_text).strftime("%d.%m.%Y")
         fields["Délai de réception"] = max_dt
         fields["Délai de livraison"] = max_dt
+    return fields
 
-    # Items
-    items_df = None
-    if tables:
-        items_df = combine_detected_tables(tables)
-    if items_df is None:
-        items_df = reconstruct_items_from_text(text)
-    items_df = clean_items_df_keep_full(items_df)
-
-    # Build doc with placeholders then title
-    doc = Document(BytesIO(template_docx_bytes))
-    replace_placeholders_everywhere(doc, fields)
-    suffix = compute_facture_suffix(fields)
-    set_facture_title(doc, suffix)
-
-    out = BytesIO(); doc.save(out); out.seek(0)
-    return out.getvalue(), fields, items_df
-
-def build_final_doc(doc_bytes: bytes, items_df: pd.DataFrame, total_ttc: Optional[str]):
+def process_pdf_to_docx(pdf: PdfSource, template_docx_bytes: Union[TemplateSource, CompiledTemplate], parallel_pages: bool = False,
+                        early_stop: bool = False, layout_store=None, report=None, low_memory: bool = False,
+                        memory_limit_mb: Optional[float] = None, text_engine: str = "pdfplumber",
+                        item_engine: str = "auto"):
+    draft = analyze_pdf(pdf, template_docx_bytes, parallel_pages=parallel_pages, early_stop=early_stop,
+                        layout_store=layout_store, report=report, low_memory=low_memory,
+                        memory_limit_mb=memory_limit_mb, text_engine=text_engine, item_engine=item_engine)
+    with draft.report.stage("save"):
+        doc_bytes = draft.to_bytes()
+    return doc_bytes, draft.fields, draft.items
+
+def build_final_doc(doc_bytes, items: List[LineItem], total_ttc: Optional[str], out: Optional[DocxTarget] = None):
+    """Final DOCX bytes; with `out` (path or writable binary stream), written there instead (returns None)."""
+    from docx import Document
+    if isinstance(doc_bytes, InvoiceDraft):
+        return doc_bytes.render(items, total_ttc or "", out=out)
     doc = Document(BytesIO(doc_bytes))
-    insert_df_two_lines_below_anchor(doc, items_df, total_ttc or "")
-    out = BytesIO(); doc.save(out); out.seek(0)
-    return out.getvalue()
+    insert_items_two_lines_below_anchor(doc, items, total_ttc or "")
+    if out is not None:
+        save_docx(doc, out)
+        return None
+    buf = BytesIO(); doc.save(buf)
+    return buf.getvalue()
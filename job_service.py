@@ -0,0 +1,477 @@
+# job_service.py — local HTTP job queue in front of the extraction engine
+"""
+Small asynchronous HTTP service for programmatic clients (ERP): submit an order PDF, get a job id,
+then poll (or long-poll) for the fields, items and generated DOCX. Standard library only.
+
+    python job_service.py --port 8765 -j 2 --queue 16 --templates-dir modeles/
+
+    curl --data-binary @commande.pdf -H "Content-Type: application/pdf" "http://127.0.0.1:8765/jobs?template=default"
+        -> 202 {"job_id": "...", "status": "queued", ...}
+    curl "http://127.0.0.1:8765/jobs/<id>?wait=30"        # long-poll up to 30 s
+    curl -o facture.docx "http://127.0.0.1:8765/jobs/<id>/docx"
+    curl -o factures.zip "http://127.0.0.1:8765/export.zip?jobs=<id>,<id>"   # streamed; all done jobs without ?jobs
+    curl -o facture.docx "http://127.0.0.1:8765/orders/CF-24-1234/docx"     # with --catalog: no PDF needed
+
+Endpoints: POST /jobs, GET /jobs/<id>[?wait=s], GET /jobs/<id>/docx, DELETE /jobs/<id>, GET /export.zip,
+GET /orders/<commande>[/docx][?template=id] (with --catalog), GET /templates, GET /health.
+A full queue answers 429 with Retry-After; jobs run on a process pool of `workers` processes.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, quote, urlparse
+
+from analysis_cache import AnalysisCache
+from extract_and_fill import (ITEM_ENGINES, ITEM_TABLE_COLUMNS, TEXT_ENGINES, PdfSource, analyze_pdf, docx_filename, preload,
+                              reconcile_items)
+from layout_profiles import LayoutProfileStore
+from order_catalog import OrderCatalog, catalog_entry, entry_fields, entry_items, pdf_sha256
+from pipeline_report import PipelineReport
+from zip_export import iter_docx_zip
+
+DEFAULT_TEMPLATE = Path(__file__).parent / "template.docx"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+MAX_PDF_BYTES = 50 * 1024 * 1024
+# Larger request bodies are written to a temporary file as they arrive; the worker reads the PDF from it.
+SPOOL_PDF_BYTES = 2 * 1024 * 1024
+MAX_WAIT_S = 60.0
+# Finished jobs are kept this long (or until DELETE) so clients can fetch the DOCX.
+JOB_TTL_S = 3600.0
+
+# Set once per worker process by _init_worker.
+_TEMPLATES: Dict[str, bytes] = {}
+_OPTIONS: Dict[str, object] = {}
+_CACHE: Optional[AnalysisCache] = None
+_CATALOG: Optional[OrderCatalog] = None
+
+
+def load_templates(templates_dir: Optional[str] = None, default: Optional[str] = None) -> Dict[str, bytes]:
+    """Template id → bytes: "default" plus every .docx of `templates_dir` (id = file stem)."""
+    templates: Dict[str, bytes] = {}
+    default_path = Path(default) if default else DEFAULT_TEMPLATE
+    if default_path.exists():
+        templates["default"] = default_path.read_bytes()
+    if templates_dir:
+        for p in sorted(Path(templates_dir).glob("*.docx")):
+            if not p.name.startswith("~$"):
+                templates[p.stem] = p.read_bytes()
+    return templates
+
+
+def _init_worker(templates: Dict[str, bytes], options: Optional[Dict[str, object]] = None,
+                 cache_dir: Optional[str] = None, layout_profiles: Optional[str] = None,
+                 catalog_path: Optional[str] = None):
+    global _TEMPLATES, _OPTIONS, _CACHE, _CATALOG
+    preload()
+    _TEMPLATES = templates
+    _OPTIONS = dict(options or {})
+    if layout_profiles:
+        _OPTIONS["layout_store"] = LayoutProfileStore(layout_profiles)
+    _CACHE = AnalysisCache(disk_dir=cache_dir) if cache_dir else None
+    _CATALOG = OrderCatalog(catalog_path) if catalog_path else None  # read here, written by the JobQueue
+
+
+def _items_records(items) -> List[Dict[str, str]]:
+    return [item.as_dict(ITEM_TABLE_COLUMNS) for item in items or []]
+
+
+def _spool_body(head: bytes, rfile, length: int) -> str:
+    """Writes the request body (`head` already read, then the rest of `length` bytes) to a temporary file."""
+    fd, path = tempfile.mkstemp(prefix="commande-", suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(head)
+        remaining = length - len(head)
+        while remaining > 0:
+            chunk = rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            f.write(chunk)
+            remaining -= len(chunk)
+    return path
+
+
+def _remove_spooled(path: Optional[str]):
+    if path is not None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def run_job(pdf: PdfSource, template_id: str, early_stop: bool = False) -> Dict[str, object]:
+    """Analyse + generation of one order (PDF bytes or path) in a worker process; errors propagate to the job."""
+    started = time.time()
+    template_bytes = _TEMPLATES[template_id]
+    pdf_hash = pdf_sha256(pdf) if _CATALOG is not None else None
+    known = _CATALOG.by_hash(pdf_hash) if _CATALOG is not None else None
+    if known is not None:
+        # Same PDF already processed: invoice rebuilt from the catalog, no extraction.
+        fields = entry_fields(known)
+        items = entry_items(known)
+        docx = _CATALOG.regenerate(known, template_bytes)
+        return {"fields": fields, "items": _items_records(items), "docx": docx, "cached": False,
+                "catalog": True, "engine": None,
+                "reconciliation": reconcile_items(items, fields.get("Total TTC CHF")), "started_at": started, "finished_at": time.time(), "stages": {}}
+    report = PipelineReport()
+    options = dict(_OPTIONS, early_stop=early_stop, report=report)
+    if _CACHE is not None:
+        draft = _CACHE.get_or_analyze(pdf, template_bytes, **options)
+    else:
+        draft = analyze_pdf(pdf, template_bytes, **options)
+    docx = draft.render()
+    result = {"fields": dict(draft.fields), "items": _items_records(draft.items), "docx": docx,
+              "cached": draft.from_cache, "catalog": False, "engine": draft.engine,
+              "reconciliation": draft.reconciliation, "started_at": started, "finished_at": time.time(),
+              "stages": {s["stage"]: s["wall_s"] for s in report.stages}}
+    if pdf_hash is not None:
+        result["catalog_entry"] = catalog_entry(pdf_hash, draft.fields, draft.items, time.time() - started,
+                                                docx=docx, source=f"template={template_id}")
+    return result
+
+
+class Job:
+    def __init__(self, template_id: str, pdf_size: int):
+        self.id = uuid.uuid4().hex
+        self.template_id = template_id
+        self.pdf_size = pdf_size
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.spooled: Optional[str] = None  # temporary file of the PDF, removed when the job ends
+        self.result: Optional[Dict[str, object]] = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+    def to_dict(self, status: Optional[str] = None) -> Dict[str, object]:
+        d: Dict[str, object] = {"job_id": self.id, "status": status or self.status, "template": self.template_id,
+                                "pdf_bytes": self.pdf_size}
+        timing: Dict[str, object] = {"submitted_at": self.submitted_at}
+        if self.result is not None:
+            res = self.result
+            timing.update(queue_s=round(res["started_at"] - self.submitted_at, 4),
+                          run_s=round(res["finished_at"] - res["started_at"], 4), stages=res["stages"])
+            d.update(fields=res["fields"], items=res["items"], n_items=len(res["items"]), cached=res["cached"],
+                     catalog=res.get("catalog", False), engine=res["engine"], reconciliation=res["reconciliation"],
+                     docx_url=f"/jobs/{self.id}/docx", filename=docx_filename(res["fields"]))
+        if self.finished_at is not None:
+            timing["total_s"] = round(self.finished_at - self.submitted_at, 4)
+        if self.error is not None:
+            d["error"] = self.error
+        d["timing"] = timing
+        return d
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """Bounded job queue over a process pool: at most `workers` running plus `max_queue` waiting."""
+
+    def __init__(self, templates: Dict[str, bytes], workers: int = 1, max_queue: int = 16,
+                 cache_dir: Optional[str] = None, layout_profiles: Optional[str] = None,
+                 options: Optional[Dict[str, object]] = None, catalog_path: Optional[str] = None):
+        self.templates = templates
+        self.workers = max(workers, 1)
+        self.max_queue = max(max_queue, 0)
+        # Created before the workers start, so they find the schema in place.
+        self.catalog = OrderCatalog(catalog_path) if catalog_path else None
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                         initargs=(templates, options, cache_dir, layout_profiles, catalog_path))
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._durations: List[float] = []
+
+    def submit(self, pdf: PdfSource, template_id: str = "default", early_stop: bool = False,
+               spooled: bool = False) -> Job:
+        """
+        Queues the order `pdf` (bytes, or a path). With `spooled`, `pdf` is the path of a temporary
+        file handed over to the queue: removed when the job ends, or at once if it is refused.
+        """
+        try:
+            if template_id not in self.templates:
+                raise KeyError(template_id)
+            job = Job(template_id, os.path.getsize(pdf) if spooled else len(pdf))
+            with self._lock:
+                self._prune()
+                if self._pending >= self.workers + self.max_queue:
+                    raise QueueFull()
+                self._pending += 1
+                self._jobs[job.id] = job
+        except Exception:
+            if spooled:
+                _remove_spooled(pdf)
+            raise
+        if spooled:
+            job.spooled = pdf
+        fut = self._pool.submit(run_job, pdf, template_id, early_stop)
+        fut.add_done_callback(lambda f, job=job: self._finish(job, f))
+        return job
+
+    def _finish(self, job: Job, fut):
+        try:
+            job.result = fut.result()
+            entry = job.result.pop("catalog_entry", None)
+            if entry is not None and self.catalog is not None:
+                self.catalog.record(entry)
+            job.status = "done"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = "error"
+        _remove_spooled(job.spooled)
+        job.finished_at = time.time()
+        with self._lock:
+            self._pending -= 1
+            if job.result is not None:
+                self._durations = (self._durations + [job.result["finished_at"] - job.result["started_at"]])[-50:]
+        job.done.set()
+
+    def _prune(self):
+        cutoff = time.time() - JOB_TTL_S
+        for jid in [j.id for j in self._jobs.values() if j.finished_at is not None and j.finished_at < cutoff]:
+            del self._jobs[jid]
+
+    def _statuses(self) -> Dict[str, str]:
+        # The pool runs jobs in submission order: the first `workers` unfinished ones are running.
+        out, ahead = {}, 0
+        for job in self._jobs.values():
+            if job.done.is_set() or job.status != "queued":
+                out[job.id] = job.status
+            else:
+                out[job.id] = "running" if ahead < self.workers else "queued"
+                ahead += 1
+        return out
+
+    def describe(self, job: Job) -> Dict[str, object]:
+        with self._lock:
+            status = self._statuses().get(job.id)
+        return job.to_dict(status)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def finished_jobs(self, job_ids: Optional[List[str]] = None) -> List[Job]:
+        """Jobs with a DOCX, in submission order (all of them, or those of `job_ids` in that order)."""
+        with self._lock:
+            jobs = list(self._jobs.values()) if job_ids is None else [self._jobs.get(j) for j in job_ids]
+        return [j for j in jobs if j is not None and j.status == "done"]
+
+    def delete(self, job_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.done.is_set():
+                return False
+            del self._jobs[job_id]
+            return True
+
+    def retry_after_s(self) -> int:
+        """Rough time until a slot frees up, from the recent job durations."""
+        with self._lock:
+            avg = sum(self._durations) / len(self._durations) if self._durations else 5.0
+        return max(1, int(round(avg)))
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            states = list(self._statuses().values())
+            return {"workers": self.workers, "max_queue": self.max_queue, "pending": self._pending,
+                    "capacity": self.workers + self.max_queue - self._pending, "queued": states.count("queued"),
+                    "running": states.count("running"), "done": states.count("done"), "error": states.count("error")}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self.catalog is not None:
+            self.catalog.close()
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    server_version = "pdf-docx-jobs/1"
+    queue: JobQueue = None  # set by make_server
+
+    def _send_json(self, status: int, payload: Dict[str, object], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        self._send_json(status, {"error": message}, headers)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        return parts, {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+    def do_POST(self):
+        parts, query = self._route()
+        if parts != ["jobs"]:
+            return self._error(404, "Ressource inconnue")
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            return self._error(400, "Corps vide : envoyer le PDF en binaire (Content-Type: application/pdf)")
+        if length > MAX_PDF_BYTES:
+            return self._error(413, f"PDF trop volumineux (max {MAX_PDF_BYTES // (1024 * 1024)} Mo)")
+        head = self.rfile.read(min(length, 1024))
+        if not head.lstrip()[:5] == b"%PDF-":
+            return self._error(400, "Le corps n'est pas un PDF")
+        spooled = length > SPOOL_PDF_BYTES
+        pdf = _spool_body(head, self.rfile, length) if spooled else head + self.rfile.read(length - len(head))
+        template_id = query.get("template", "default")
+        early_stop = query.get("early_stop", "").lower() in ("1", "true", "yes", "oui")
+        try:
+            job = self.queue.submit(pdf, template_id, early_stop=early_stop, spooled=spooled)
+        except KeyError:
+            return self._error(404, f"Modèle inconnu : {template_id}")
+        except QueueFull:
+            retry = self.queue.retry_after_s()
+            return self._error(429, "File d'attente pleine, réessayer plus tard", {"Retry-After": str(retry)})
+        self._send_json(202, self.queue.describe(job), {"Location": f"/jobs/{job.id}"})
+
+    def do_GET(self):
+        parts, query = self._route()
+        if parts == ["health"]:
+            return self._send_json(200, {"status": "ok", **self.queue.stats()})
+        if parts == ["templates"]:
+            return self._send_json(200, {"templates": sorted(self.queue.templates)})
+        if parts == ["export.zip"]:
+            ids = [j for j in query["jobs"].split(",") if j] if query.get("jobs") else None
+            jobs = self.queue.finished_jobs(ids)
+            if not jobs:
+                return self._error(404, "Aucune facture terminée à exporter")
+            # Streamed as it is written (no Content-Length: the connection closes at the end).
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Disposition", 'attachment; filename="factures.zip"')
+            self.end_headers()
+            for chunk in iter_docx_zip((docx_filename(j.result["fields"]), j.result["docx"]) for j in jobs):
+                self.wfile.write(chunk)
+            return
+        if len(parts) in (2, 3) and parts[0] == "orders":
+            return self._get_order(parts, query)
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.queue.get(parts[1])
+            if job is None:
+                return self._error(404, "Tâche inconnue ou expirée")
+            if len(parts) == 2:
+                try:
+                    wait = min(max(float(query.get("wait", 0)), 0.0), MAX_WAIT_S)
+                except ValueError:
+                    return self._error(400, "wait doit être un nombre de secondes")
+                if wait:
+                    job.done.wait(wait)
+                return self._send_json(200, self.queue.describe(job))
+            if parts[2] == "docx":
+                if job.status != "done":
+                    return self._error(409, f"DOCX non disponible (statut : {self.queue.describe(job)['status']})")
+                return self._send_docx(job.result["docx"], docx_filename(job.result["fields"]))
+        self._error(404, "Ressource inconnue")
+
+    def _send_docx(self, body: bytes, name: str):
+        self.send_response(200)
+        self.send_header("Content-Type", DOCX_MIME)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(name)}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _get_order(self, parts: List[str], query: Dict[str, str]):
+        """GET /orders/<commande>: catalog entry; /orders/<commande>/docx: invoice rebuilt from it."""
+        catalog = self.queue.catalog
+        if catalog is None:
+            return self._error(404, "Catalogue des commandes désactivé (--catalog)")
+        row = catalog.by_commande(parts[1])
+        if row is None:
+            return self._error(404, f"Commande absente du catalogue : {parts[1]}")
+        if len(parts) == 2:
+            info = {k: row[k] for k in ("commande", "reference", "total_chf", "total_ttc", "n_items", "processed_at",
+                                        "source", "pdf_sha256")}
+            return self._send_json(200, {**info, "fields": entry_fields(row), "docx_url": f"/orders/{quote(parts[1])}/docx"})
+        if parts[2] != "docx":
+            return self._error(404, "Ressource inconnue")
+        template_id = query.get("template", "default")
+        if template_id not in self.queue.templates:
+            return self._error(404, f"Modèle inconnu : {template_id}")
+        body = catalog.regenerate(row, self.queue.templates[template_id])
+        self._send_docx(body, docx_filename(entry_fields(row)))
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if len(parts) == 2 and parts[0] == "jobs":
+            if self.queue.delete(parts[1]):
+                return self._send_json(200, {"deleted": parts[1]})
+            return self._error(404 if self.queue.get(parts[1]) is None else 409, "Tâche inconnue ou pas terminée")
+        self._error(404, "Ressource inconnue")
+
+    def log_message(self, format, *args):
+        if not getattr(self.server, "quiet", False):
+            super().log_message(format, *args)
+
+
+def make_server(queue: JobQueue, host: str = "127.0.0.1", port: int = 8765, quiet: bool = False) -> ThreadingHTTPServer:
+    handler = type("BoundJobRequestHandler", (JobRequestHandler,), {"queue": queue})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.quiet = quiet
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Service HTTP local : file de tâches PDF → DOCX.")
+    ap.add_argument("--host", default="127.0.0.1", help="Adresse d'écoute (défaut : local uniquement)")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("-j", "--workers", type=int, default=1, help="Processus de traitement en parallèle")
+    ap.add_argument("--queue", type=int, default=16, help="Tâches en attente au-delà des workers (sinon 429)")
+    ap.add_argument("-t", "--template", default=str(DEFAULT_TEMPLATE), help="Modèle Word par défaut (id « default »)")
+    ap.add_argument("--templates-dir", default=None, help="Dossier de modèles .docx supplémentaires (id = nom du fichier)")
+    ap.add_argument("--cache-dir", default=None, help="Dossier du cache d'analyse")
+    ap.add_argument("--layout-profiles", default=None, help="Fichier JSON des profils de mise en page fournisseurs")
+    ap.add_argument("--low-memory", action="store_true", help="Mode mémoire bornée pour les très gros PDF")
+    ap.add_argument("--memory-limit-mb", type=float, default=None,
+                    help="Plafond de mémoire résidente par worker (Mo) ; la tâche passe en erreur au-delà")
+    ap.add_argument("--text-engine", choices=TEXT_ENGINES, default="pdfplumber",
+                    help="Extraction du texte : pdfplumber, pdfium ou auto (voir batch_cli.py)")
+    ap.add_argument("--item-engine", choices=ITEM_ENGINES, default="auto",
+                    help="Extraction des articles : auto, words ou race (voir batch_cli.py)")
+    ap.add_argument("--catalog", default=None,
+                    help="Catalogue SQLite des commandes : PDF déjà traités non réanalysés, GET /orders/<commande>")
+    ap.add_argument("--quiet", action="store_true", help="Sans journal des requêtes")
+    args = ap.parse_args(argv)
+
+    templates = load_templates(args.templates_dir, args.template)
+    if not templates:
+        print("Aucun modèle Word trouvé.", file=sys.stderr)
+        return 2
+    options = {"low_memory": True, "memory_limit_mb": args.memory_limit_mb} if args.low_memory or args.memory_limit_mb else {}
+    options["text_engine"] = args.text_engine
+    options["item_engine"] = args.item_engine
+    queue = JobQueue(templates, workers=args.workers, max_queue=args.queue, cache_dir=args.cache_dir,
+                     layout_profiles=args.layout_profiles, options=options, catalog_path=args.catalog)
+    server = make_server(queue, args.host, args.port, quiet=args.quiet)
+    print(f"Service prêt sur http://{args.host}:{server.server_address[1]} "
+          f"({queue.workers} worker(s), file de {queue.max_queue}, modèles : {', '.join(sorted(templates))})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        queue.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# layout_profiles.py — per-supplier layout profiles keyed by a first-page fingerprint
+"""
+Most orders come from a few suppliers whose PDFs always share the same layout. The first
+page is fingerprinted cheaply (letterhead text without digits, page size, ruling-line
+positions) and the store remembers which item strategy worked for it: "table" (with the
+crop box of the item tables) or "text" (reconstruction, table detection skipped).
+Used through analyze_pdf(..., layout_store=store); hit counts are persisted on the next record().
+Several processes may share one file (batch workers, job service, upload queue): saves merge
+with the file under an exclusive lock (a ".lock" file next to it).
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from extract_and_fill import PdfSource, _strip_accents, pdf_stream
+
+# Share of the page height read as "letterhead" for the fingerprint.
+HEADER_BAND = 0.2
+# Positions are rounded to this many points so tiny rendering differences still match.
+GRID_PT = 5
+# Padding (points) added around a recorded table crop box.
+BBOX_PAD = 4
+
+
+def layout_fingerprint(page) -> str:
+    """Fingerprint of an open pdfplumber page; its parsed objects stay cached for the extraction."""
+    limit = page.bbox[1] + page.height * HEADER_BAND
+    header = _strip_accents("".join(c["text"] for c in page.chars if c["top"] < limit)).lower()
+    header = re.sub(r"[^a-z]+", " ", header).strip()
+    xs = sorted({round(e["x0"] / GRID_PT) * GRID_PT for e in page.edges if e.get("orientation") == "v"})
+    ys = sorted({round(e["top"] / GRID_PT) * GRID_PT for e in page.edges if e.get("orientation") == "h"})
+    key = {"header": header, "size": [round(page.width), round(page.height)], "v": xs, "h": ys[:40]}
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def pdf_layout_fingerprint(pdf: PdfSource) -> Optional[str]:
+    import pdfplumber
+    with pdf_stream(pdf) as src, pdfplumber.open(src) as doc:
+        return layout_fingerprint(doc.pages[0]) if doc.pages else None
+
+
+@contextmanager
+def _locked(path: Path):
+    """Exclusive lock between processes on `path` + ".lock" (fcntl on POSIX, msvcrt on Windows)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{path}.lock", "a+b") as f:
+        try:
+            import fcntl
+        except ImportError:
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class LayoutProfileStore:
+    """Fingerprint → profile dict; kept in memory and, when `path` is set, in a JSON file."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path else None
+        self._profiles: Dict[str, dict] = {}
+        self._recorded: set = set()  # fingerprints recorded here since the last save
+        self._hits: Dict[str, int] = {}  # hits counted here since the last save
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.exists():
+            self._profiles = json.loads(self.path.read_text(encoding="utf-8"))
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def get(self, fingerprint: Optional[str]) -> Optional[dict]:
+        if fingerprint is None:
+            return None
+        with self._lock:
+            profile = self._profiles.get(fingerprint)
+            if not profile:
+                return None
+            profile["hits"] = profile.get("hits", 0) + 1
+            self._hits[fingerprint] = self._hits.get(fingerprint, 0) + 1
+            return dict(profile)
+
+    def fingerprint(self, page) -> str:
+        return layout_fingerprint(page)
+
+    def record(self, fingerprint: Optional[str], strategy: str,
+               bbox: Optional[Tuple[float, float, float, float]] = None, columns: Optional[List[str]] = None):
+        if fingerprint is None:
+            return
+        if bbox is not None:
+            bbox = [bbox[0] - BBOX_PAD, bbox[1] - BBOX_PAD, bbox[2] + BBOX_PAD, bbox[3] + BBOX_PAD]
+        with self._lock:
+            self._profiles[fingerprint] = {
+                "strategy": strategy, "bbox": bbox, "columns": columns or [],
+                "hits": 0, "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            self._recorded.add(fingerprint)
+            self._hits.pop(fingerprint, None)
+            self._save()
+
+    def _save(self):
+        if self.path is None:
+            return
+        # Merge with what other processes wrote meanwhile: our records win on the same
+        # fingerprint, our hits are added to theirs.
+        with _locked(self.path):
+            on_disk = {}
+            if self.path.exists():
+                try:
+                    on_disk = json.loads(self.path.read_text(encoding="utf-8"))
+                except ValueError:
+                    on_disk = {}
+            for fingerprint in self._recorded:
+                on_disk[fingerprint] = self._profiles[fingerprint]
+            for fingerprint, hits in self._hits.items():
+                if fingerprint in on_disk and fingerprint not in self._recorded:
+                    on_disk[fingerprint]["hits"] = on_disk[fingerprint].get("hits", 0) + hits
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(on_disk, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+        self._profiles = on_disk
+        self._recorded.clear()
+        self._hits.clear()
@@ -0,0 +1,174 @@
+# order_catalog.py — local catalog of processed orders (SQLite)
+"""
+One row per processed order PDF: its SHA-256, "Commande fournisseur", "Notre référence", totals,
+item count, time taken, the parsed fields and items (JSON) and the generated DOCX (stored in the
+database, or the path of the file written). Indexed on the PDF hash, the order number and the
+reference, so a lookup is a single index probe (a few microseconds).
+
+Used to skip a PDF already processed byte for byte (same PARSER_VERSION): its invoice is rebuilt
+from the stored fields and items, without reading the PDF again; and to give back or regenerate
+the invoice of an order from its number alone.
+
+    catalog = OrderCatalog("commandes.sqlite")
+    row = catalog.by_hash(pdf_sha256(pdf_bytes))           # exact duplicate?
+    docx = catalog.regenerate(catalog.by_commande("CF-24-1234"), template_bytes)
+
+Batch runs write through record_many() (one transaction); several processes may read the same
+file while one writes (WAL journal).
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from extract_and_fill import (COLUMNS_TARGET, PARSER_VERSION, CompiledTemplate, DocxTarget, InvoiceDraft, LineItem, PdfSource,
+                              compile_template, source_sha256, today_ch)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    pdf_sha256 TEXT PRIMARY KEY,
+    commande TEXT,
+    reference TEXT,
+    total_chf TEXT,
+    total_ttc TEXT,
+    n_items INTEGER,
+    seconds REAL,
+    processed_at REAL,
+    parser_version TEXT,
+    source TEXT,
+    fields_json TEXT,
+    items_json TEXT,
+    docx_path TEXT,
+    docx BLOB
+);
+CREATE INDEX IF NOT EXISTS orders_commande ON orders (commande, processed_at);
+CREATE INDEX IF NOT EXISTS orders_reference ON orders (reference, processed_at);
+"""
+_COLUMNS = ("pdf_sha256", "commande", "reference", "total_chf", "total_ttc", "n_items", "seconds", "processed_at",
+            "parser_version", "source", "fields_json", "items_json", "docx_path", "docx")
+# Lookups leave the DOCX blob out: docx() reads it only when needed.
+_SUMMARY = ", ".join(c for c in _COLUMNS if c != "docx")
+
+
+def pdf_sha256(pdf: PdfSource) -> str:
+    """Hash of the PDF (bytes, path, buffer or binary file), computed without loading a file in memory."""
+    return source_sha256(pdf)
+
+
+def catalog_entry(pdf_hash: str, fields: Dict[str, str], items: Optional[List[LineItem]], seconds: float = 0.0,
+                  docx: Optional[bytes] = None, docx_path: Optional[str] = None, source: str = "") -> Dict[str, object]:
+    """Row for record() / record_many(); plain data, so worker processes can build it."""
+    items = items or []
+    return {"pdf_sha256": pdf_hash,
+            "commande": (fields.get("Commande fournisseur") or "").strip() or None,
+            "reference": (fields.get("Notre référence") or "").strip() or None,
+            "total_chf": fields.get("Total TTC CHF") or None,
+            "total_ttc": fields.get("Montant Total TTC CHF (PDF)") or None,
+            "n_items": len(items), "seconds": round(seconds, 4), "processed_at": time.time(),
+            "parser_version": PARSER_VERSION, "source": source,
+            "fields_json": json.dumps(fields, ensure_ascii=False),
+            "items_json": json.dumps({"columns": COLUMNS_TARGET, "data": [it.values() for it in items]},
+                                     ensure_ascii=False),
+            "docx_path": docx_path, "docx": docx}
+
+
+def entry_fields(row: Dict[str, object]) -> Dict[str, str]:
+    return json.loads(row["fields_json"])
+
+
+def entry_items(row: Dict[str, object]) -> List[LineItem]:
+    items = json.loads(row["items_json"])
+    # Entries of older versions hold the invoice table's columns (no TVA): from_row leaves it empty.
+    columns = items["columns"] or COLUMNS_TARGET
+    return [LineItem.from_row(dict(zip(columns, values))) for values in items["data"]]
+
+
+class OrderCatalog:
+    """SQLite catalog at `path` (":memory:" for a throwaway one); safe to share between threads."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def record(self, entry: Dict[str, object]):
+        self.record_many([entry])
+
+    def record_many(self, entries: Iterable[Dict[str, object]]) -> int:
+        """Inserts (or replaces, same PDF hash) the entries in one transaction; returns how many."""
+        rows = [tuple(e.get(c) for c in _COLUMNS) for e in entries]
+        if not rows:
+            return 0
+        sql = f"INSERT OR REPLACE INTO orders ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+        return len(rows)
+
+    def _one(self, sql: str, args: tuple) -> Optional[Dict[str, object]]:
+        with self._lock:
+            row = self._conn.execute(sql, args).fetchone()
+        return dict(row) if row is not None else None
+
+    def by_hash(self, pdf_hash: str, any_version: bool = False) -> Optional[Dict[str, object]]:
+        """The entry of that exact PDF, if it was processed with the current parser (or any, `any_version`)."""
+        row = self._one(f"SELECT {_SUMMARY} FROM orders WHERE pdf_sha256 = ?", (pdf_hash,))
+        if row is not None and not any_version and row["parser_version"] != PARSER_VERSION:
+            return None
+        return row
+
+    def by_commande(self, commande: str) -> Optional[Dict[str, object]]:
+        """Latest entry of an order number (a resent order replaces the previous one)."""
+        return self._one(f"SELECT {_SUMMARY} FROM orders WHERE commande = ? ORDER BY processed_at DESC LIMIT 1",
+                         (commande.strip(),))
+
+    def by_reference(self, reference: str, limit: int = 100) -> List[Dict[str, object]]:
+        """Entries of a « Notre référence », most recent first."""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {_SUMMARY} FROM orders WHERE reference = ? "
+                                      f"ORDER BY processed_at DESC LIMIT ?", (reference.strip(), limit)).fetchall()
+        return [dict(r) for r in rows]
+
+    def docx(self, row: Dict[str, object]) -> Optional[bytes]:
+        """The DOCX generated at the time: stored blob, else the file written (None if gone)."""
+        with self._lock:
+            found = self._conn.execute("SELECT docx FROM orders WHERE pdf_sha256 = ?", (row["pdf_sha256"],)).fetchone()
+        if found is not None and found[0] is not None:
+            return bytes(found[0])
+        path = row.get("docx_path")
+        if path and Path(path).is_file():
+            return Path(path).read_bytes()
+        return None
+
+    def regenerate(self, row: Dict[str, object], template, out: Optional[DocxTarget] = None) -> Optional[bytes]:
+        """
+        Invoice rebuilt from the stored fields and items with `template` (bytes or CompiledTemplate),
+        dated today; written to `out` (path or writable stream) when given, else returned.
+        """
+        fields = entry_fields(row)
+        fields["date du jour"] = today_ch()
+        template = template if isinstance(template, CompiledTemplate) else compile_template(template)
+        return InvoiceDraft(template.fill(fields), fields, entry_items(row), template).render(out=out)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "OrderCatalog":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,130 @@
+# pipeline_report.py — per-stage / per-page timing of the PDF → DOCX pipeline
+"""
+A PipelineReport records, for every stage and every page: wall time, CPU time and (when
+`trace_memory=True`) the peak memory traced by tracemalloc, plus counters (pages, tables,
+rows, placeholders...). Pass one as `report=` to analyze_pdf / process_pdf_to_docx; the draft
+keeps it so InvoiceDraft.render() adds the generation stages. Without a report the pipeline
+uses NULL_REPORT, whose methods do nothing.
+"""
+import json
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+
+class PipelineReport:
+    enabled = True
+
+    def __init__(self, trace_memory: bool = False, label: str = ""):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.trace_memory = trace_memory
+        self.stages: List[Dict[str, object]] = []
+        self.pages: List[Dict[str, object]] = []
+        self.counts: Dict[str, int] = {}
+        self.meta: Dict[str, object] = {}
+        self._peak_stack: List[int] = []
+        self._started_tracing = False
+        self._stage_depth = 0
+
+    def _mem_start(self):
+        if not self.trace_memory:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(); self._started_tracing = True
+        if self._peak_stack:
+            # Fold the peak seen so far into the enclosing stage before resetting it.
+            self._peak_stack[-1] = max(self._peak_stack[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self._peak_stack.append(0)
+
+    def _mem_stop(self) -> Optional[int]:
+        if not self.trace_memory:
+            return None
+        peak = max(self._peak_stack.pop(), tracemalloc.get_traced_memory()[1])
+        if self._peak_stack:
+            self._peak_stack[-1] = max(self._peak_stack[-1], peak)
+        elif self._started_tracing:
+            tracemalloc.stop(); self._started_tracing = False
+        return peak
+
+    @contextmanager
+    def _measure(self, sink: List[Dict[str, object]], entry: Dict[str, object]):
+        self._mem_start()
+        w0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield entry
+        finally:
+            entry["wall_s"] = round(time.perf_counter() - w0, 6)
+            entry["cpu_s"] = round(time.process_time() - c0, 6)
+            peak = self._mem_stop()
+            if peak is not None:
+                entry["peak_bytes"] = peak
+            sink.append(entry)
+
+    @contextmanager
+    def stage(self, name: str, **meta):
+        """A stage opened inside another one (e.g. layout_fingerprint within extract) is marked "nested"."""
+        entry = {"stage": name, **meta}
+        if self._stage_depth:
+            entry["nested"] = True
+        self._stage_depth += 1
+        try:
+            with self._measure(self.stages, entry) as e:
+                yield e
+        finally:
+            self._stage_depth -= 1
+
+    def page(self, index: int, **meta):
+        return self._measure(self.pages, {"page": index, **meta})
+
+    def count(self, key: str, n: int = 1):
+        self.counts[key] = self.counts.get(key, 0) + n
+
+    def set(self, key: str, value):
+        self.meta[key] = value
+
+    def total_wall_s(self) -> float:
+        """Wall time of the top-level stages: nested ones are already inside their parent's."""
+        return round(sum(float(s["wall_s"]) for s in self.stages if not s.get("nested")), 6)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"run_id": self.run_id, "label": self.label, "stages": list(self.stages), "pages": list(self.pages),
+                "counts": dict(self.counts), "meta": dict(self.meta)}
+
+    def to_jsonl(self) -> str:
+        """One JSON object per stage, per page, plus a summary line; all tagged with run_id."""
+        base = {"run_id": self.run_id, "label": self.label}
+        lines = [dict(base, kind="stage", **s) for s in self.stages]
+        lines += [dict(base, kind="page", **p) for p in self.pages]
+        lines.append(dict(base, kind="summary", wall_s=self.total_wall_s(), counts=self.counts, meta=self.meta))
+        return "".join(json.dumps(l, ensure_ascii=False, default=str) + "\n" for l in lines)
+
+    def write_jsonl(self, path_or_stream):
+        if hasattr(path_or_stream, "write"):
+            path_or_stream.write(self.to_jsonl())
+        else:
+            with open(path_or_stream, "a", encoding="utf-8") as f:
+                f.write(self.to_jsonl())
+
+
+class _NullReport:
+    enabled = False
+    _ctx = nullcontext()
+
+    def stage(self, name: str, **meta):
+        return self._ctx
+
+    def page(self, index: int, **meta):
+        return self._ctx
+
+    def count(self, key: str, n: int = 1):
+        pass
+
+    def set(self, key: str, value):
+        pass
+
+
+NULL_REPORT = _NullReport()
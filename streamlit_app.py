@@ -1,7 +1,13 @@
 # streamlit_app.py — fix28
+import os
+import tempfile
+from typing import Dict, Optional, Tuple
 import streamlit as st
 from pathlib import Path
-from extract_and_fill import process_pdf_to_docx, build_final_doc
+from analysis_cache import AnalysisCache
+from extract_and_fill import CompiledTemplate, compile_template, items_from_frame, reconcile_items
+from upload_queue import UploadJob, UploadQueue
+from zip_export import DocxZipWriter
 
 st.set_page_config(page_title="PDF → DOCX (Commande fournisseur)", layout="wide")
 st.title("PDF → DOCX : Remplissage automatique")
@@ -16,10 +22,28 @@ if "docx_uploader_key" not in st.session_state:
 # --- End init ---
 
 
+@st.cache_resource
+def _analysis_cache() -> AnalysisCache:
+    # Shared by all sessions of this process; set PDF_DOCX_CACHE_DIR to also keep results on disk.
+    return AnalysisCache(disk_dir=os.environ.get("PDF_DOCX_CACHE_DIR") or None)
+
+@st.cache_resource
+def _upload_queue() -> UploadQueue:
+    # Background analysis pool shared by all sessions (PDF_DOCX_WORKERS processes, default up to 4).
+    # PDF_DOCX_LAYOUT_PROFILES (opt-in): known supplier layouts skip generic table detection.
+    workers = int(os.environ.get("PDF_DOCX_WORKERS") or min(4, os.cpu_count() or 1))
+    return UploadQueue(workers, cache=_analysis_cache(),
+                       options={"text_engine": os.environ.get("PDF_DOCX_TEXT_ENGINE") or "pdfplumber",
+                                "item_engine": os.environ.get("PDF_DOCX_ITEM_ENGINE") or "auto"},
+                       layout_profiles=os.environ.get("PDF_DOCX_LAYOUT_PROFILES") or None)
+
+
 # --- Bouton Réinitialiser ---
 if st.button("🔄 Réinitialiser"):
-    # Clear working state
-    for key in ["fields", "items_df", "doc_with_placeholders"]:
+    # Clear working state; orders still waiting in the pool are dropped
+    if st.session_state.get("jobs"):
+        _upload_queue().cancel(list(st.session_state["jobs"].values()))
+    for key in ["jobs", "selected_job", "finished_seen"]:
         if key in st.session_state:
             del st.session_state[key]
     # Bump keys so uploaders visually reset
@@ -32,40 +56,82 @@ if st.button("🔄 Réinitialiser"):
 
 
 TEMPLATE_PATH = Path(__file__).parent / "template.docx"
-tmpl_bytes = TEMPLATE_PATH.read_bytes() if TEMPLATE_PATH.exists() else None
 
-pdf_file = st.file_uploader("PDF de la commande", type=["pdf"], key=st.session_state.pdf_uploader_key)
+
+@st.cache_resource(show_spinner=False)
+def _template(path: str, mtime: float) -> Tuple[bytes, CompiledTemplate]:
+    # Read and parsed once per process instead of on every rerun; replacing the file (new mtime) reloads it.
+    # The same bytes object on every rerun also keeps compile_template()'s cache lookups cheap.
+    data = Path(path).read_bytes()
+    return data, compile_template(data)
+
+tmpl_bytes = _template(str(TEMPLATE_PATH), TEMPLATE_PATH.stat().st_mtime)[0] if TEMPLATE_PATH.exists() else None
+
+show_diagnostics = st.sidebar.checkbox("Diagnostic de performance", value=False,
+                                       help="Temps, CPU et mémoire par étape et par page (analyse plus lente)")
+
+pdf_files = st.file_uploader("PDF des commandes", type=["pdf"], accept_multiple_files=True,
+                             key=st.session_state.pdf_uploader_key)
 if tmpl_bytes is None:
     up = st.file_uploader("Modèle Word (.docx)", type=["docx"], key=st.session_state.docx_uploader_key)
     if up:
         tmpl_bytes = up.read()
 
-for k in ["fields", "items_df", "doc_with_placeholders"]:
-    if k not in st.session_state:
-        st.session_state[k] = None
-
-def _analyze(pdf_bytes, tmpl_bytes):
-    out_doc_bytes, fields, items_df = process_pdf_to_docx(pdf_bytes, tmpl_bytes)
-    st.session_state["fields"] = fields
-    st.session_state["items_df"] = items_df
-    st.session_state["doc_with_placeholders"] = out_doc_bytes
-
-if pdf_file and tmpl_bytes and st.session_state["fields"] is None:
-    with st.spinner("Analyse du PDF..."):
-        _analyze(pdf_file.read(), tmpl_bytes)
-
-if pdf_file and st.button("🔁 Réanalyser"):
-    if pdf_file and tmpl_bytes:
+if "jobs" not in st.session_state:
+    st.session_state["jobs"] = {}  # uploaded file id -> UploadJob, in upload order
+jobs: Dict[str, UploadJob] = st.session_state["jobs"]
+
+# --- Analyse en arrière-plan ---
+for f in pdf_files or []:
+    fid = getattr(f, "file_id", None) or f"{f.name}-{f.size}"
+    if fid not in jobs and tmpl_bytes:
+        jobs[fid] = _upload_queue().submit(f.name, f.getvalue(), tmpl_bytes, diagnostics=show_diagnostics)
+# Files removed from the uploader leave the list
+uploaded_ids = {getattr(f, "file_id", None) or f"{f.name}-{f.size}" for f in pdf_files or []}
+removed = [fid for fid in jobs if fid not in uploaded_ids]
+if removed:
+    _upload_queue().cancel([jobs[fid] for fid in removed])
+    for fid in removed:
+        del jobs[fid]
+
+if pdf_files and not tmpl_bytes:
+    st.warning("Fournis le PDF et un modèle (ou `template.docx`).")
+
+def _progress():
+    # Re-run every second while orders are pending; a newly finished order refreshes the whole page.
+    st.subheader("Avancement")
+    st.dataframe(_upload_queue().progress(list(jobs.values())), use_container_width=True, hide_index=True)
+    finished = sum(1 for j in jobs.values() if j.finished)
+    if finished != st.session_state.get("finished_seen"):
+        st.session_state["finished_seen"] = finished
+        st.rerun()
+
+if jobs:
+    pending = any(not j.finished for j in jobs.values())
+    st.fragment(run_every=1.0 if pending else None)(_progress)()
+# --- Fin analyse en arrière-plan ---
+
+
+done_ids = [fid for fid, j in jobs.items() if j.finished and j.error is None]
+job: Optional[UploadJob] = None
+if done_ids:
+    if st.session_state.get("selected_job") not in done_ids:
+        st.session_state["selected_job"] = done_ids[0]
+    selected = st.selectbox("Commande à vérifier", done_ids, format_func=lambda fid: jobs[fid].name, key="selected_job")
+    job = jobs[selected]
+
+    if st.button("🔁 Réanalyser"):
         with st.spinner("Ré-analyse du PDF..."):
-            _analyze(pdf_file.read(), tmpl_bytes)
-    else:
-        st.warning("Fournis le PDF et un modèle (ou `template.docx`).")
-
+            jobs[selected] = _upload_queue().submit(job.name, job.pdf_bytes, tmpl_bytes or job.template_bytes,
+                                                    diagnostics=show_diagnostics)
+        st.rerun()
+elif jobs:
+    st.info("Les commandes s'affichent ici dès que leur analyse est terminée.")
 
 
-
-fields = st.session_state.get("fields") or {}
-if (pdf_file or fields):
+if job is not None:
+    # Editors start from the analysed values: the widget state re-applies the user's edits on every run.
+    fields = dict(job.analysed_fields)
     if fields:
         st.subheader("Champs détectés")
         import pandas as _pd
@@ -106,7 +172,7 @@ if (pdf_file or fields):
                 "Champ": _st.column_config.TextColumn("Champ", width=80),   # smaller
                 "Valeur": _st.column_config.TextColumn("Valeur", width="large"),
             },
-            key="fields_editor",
+            key=f"fields_editor_{job.id}",
         )
 
         # Rebuild fields dict from edits
@@ -116,29 +182,70 @@ if (pdf_file or fields):
                 edited_fields[str(row["Champ"])] = str(row["Valeur"])
         except Exception:
             pass
-        st.session_state["fields"] = edited_fields
-        fields = edited_fields
+        job.fields = edited_fields
 
-items_df = st.session_state.get("items_df")
-if (pdf_file or items_df is not None):
     st.subheader("Aperçu du tableau")
-    if items_df is not None and not items_df.empty:
-        st.dataframe(items_df, use_container_width=True)
+    if job.draft.items:
+        # The only DataFrame of the items: built for the editor, edits converted back to line items.
+        edited_items = st.data_editor(job.items_frame(), use_container_width=True, num_rows="dynamic",
+                                      key=f"items_editor_{job.id}")
+        job.items = items_from_frame(edited_items)
+        rec = reconcile_items(job.items, job.fields.get("Total TTC CHF"))
+        if rec["status"] == "ok":
+            st.caption(f"Somme des articles = Total CHF ({rec['total']}) ✓")
+        elif rec["status"] == "écart":
+            st.warning(f"Somme des articles {rec['sum']} ≠ Total CHF {rec['total']} (écart {rec['difference']}) : "
+                       f"vérifie le tableau.")
+        else:
+            st.warning(f"Contrôle des totaux : {rec['status']}.")
     else:
         st.info("Le tableau sera reconstruit si aucune table fiable n'est détectée.")
 
 
-ready_to_generate = bool(tmpl_bytes and st.session_state.get("doc_with_placeholders"))
-if ready_to_generate:
+if job is not None:
     if st.button("🧾 Générer le DOCX"):
-        base_doc_bytes = st.session_state["doc_with_placeholders"]
-        total_ttc = (st.session_state["fields"] or {}).get("Total TTC CHF", "")
-        final_doc = build_final_doc(base_doc_bytes, st.session_state["items_df"], total_ttc)
-
-        commande = (st.session_state["fields"] or {}).get("Commande fournisseur", "").strip()
-        filename = f"Facture {commande}.docx" if commande else "Facture.docx"
-
+        final_doc = job.render()  # edited fields only refill their own paragraphs
         st.success("DOCX généré !")
-        st.download_button("🟦 Télécharger le DOCX", data=final_doc, file_name=filename, mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-elif pdf_file:
-    st.info("Importe un PDF (et un modèle si nécessaire) puis lance l'analyse pour afficher le bouton de génération.")
+        st.download_button("🟦 Télécharger le DOCX", data=final_doc, file_name=job.filename, mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+    if len(done_ids) > 1 and st.button(f"🗂️ Générer les {len(done_ids)} commandes (ZIP)"):
+        with st.spinner("Génération des DOCX..."):
+            # Each DOCX is written to the archive on disk as soon as it is rendered, then dropped;
+            # download_button takes the whole archive (no chunked download), read once.
+            with tempfile.TemporaryFile() as zip_file:
+                with DocxZipWriter(zip_file) as zw:
+                    for fid in done_ids:
+                        zw.add(jobs[fid].filename, jobs[fid].render())
+                zip_file.seek(0)
+                zip_bytes = zip_file.read()
+        st.success(f"{len(done_ids)} DOCX générés !")
+        st.download_button("🟦 Télécharger tout (ZIP)", data=zip_bytes, file_name="Factures.zip", mime="application/zip")
+elif not pdf_files:
+    st.info("Importe un ou plusieurs PDF (et un modèle si nécessaire) pour lancer l'analyse.")
+
+
+report = getattr(job.draft if job is not None else None, "report", None)
+if show_diagnostics and report is not None and report.enabled:
+    with st.expander("Diagnostic de performance", expanded=True):
+        import pandas as _pd
+        st.caption(f"Exécution {report.run_id} — {report.total_wall_s():.3f} s au total"
+                   + (" (résultat du cache d'analyse)" if job.draft.from_cache else "")
+                   + (f" — moteur de texte : {report.meta['text_engine']}" if report.meta.get("text_engine") else "")
+                   + (f" — articles : {report.meta['items_source']}" if report.meta.get("items_source") else ""))
+        if report.stages:
+            st.markdown("**Étapes**")
+            st.dataframe(_pd.DataFrame(report.stages), use_container_width=True, hide_index=True)
+        if report.pages:
+            st.markdown("**Pages**")
+            st.dataframe(_pd.DataFrame(report.pages), use_container_width=True, hide_index=True)
+        regions = report.meta.get("table_regions")
+        if regions:
+            st.markdown("**Zones de recherche des tableaux d'articles** (haut / bas en points, page entière si vide)")
+            st.dataframe(_pd.DataFrame([{"Page": r["page"] + 1,
+                                         "Haut": None if r["bbox"] is None else round(r["bbox"][1], 1),
+                                         "Bas": None if r["bbox"] is None else round(r["bbox"][3], 1),
+                                         "En-tête": r["header"], "Suite": r["continued"], "Fin": r["stop"]}
+                                        for r in regions]), use_container_width=True, hide_index=True)
+        st.markdown("**Compteurs**")
+        st.json({**report.counts, **{k: v for k, v in report.meta.items() if k != "table_regions"}})
+        st.download_button("Télécharger le rapport (JSONL)", data=report.to_jsonl().encode("utf-8"),
+                           file_name=f"rapport_{report.run_id}.jsonl", mime="application/x-ndjson")
@@ -0,0 +1,78 @@
+# test_analysis_cache.py — keys, hits and tiers of the analysis cache
+import io
+import zipfile
+
+from analysis_cache import AnalysisCache, analysis_key
+from extract_and_fill import COLUMNS_TARGET, process_pdf_to_docx
+
+
+def _document_xml(docx: bytes) -> bytes:
+    return zipfile.ZipFile(io.BytesIO(docx)).read("word/document.xml")
+
+
+def test_analysis_key_by_content(order_path, order_pdf, template_bytes, tmp_path):
+    template_path = tmp_path / "modele.docx"
+    template_path.write_bytes(template_bytes)
+    key = analysis_key(order_pdf, template_bytes)
+    with open(order_path, "rb") as f:
+        assert analysis_key(order_path, template_path) == key
+        assert analysis_key(f, io.BytesIO(template_bytes)) == key
+    assert analysis_key(order_pdf, template_bytes, early_stop=True) != key
+    # Options that only change how the result is computed are left out.
+    assert analysis_key(order_pdf, template_bytes, parallel_pages=True, low_memory=True) == key
+    assert analysis_key(order_pdf + b"\n", template_bytes) != key
+
+
+def test_get_or_analyze_hit_renders_the_same_document(order_path, template_bytes, tmp_path):
+    cache = AnalysisCache(disk_dir=str(tmp_path / "cache"))
+    miss = cache.get_or_analyze(order_path, template_bytes)
+    hit = cache.get_or_analyze(order_path, template_bytes)
+    assert (miss.from_cache, hit.from_cache) == (False, True)
+    assert hit.fields == miss.fields
+    assert [it.values(COLUMNS_TARGET) for it in hit.items] == [it.values(COLUMNS_TARGET) for it in miss.items]
+    assert _document_xml(hit.render()) == _document_xml(miss.render())
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    # A new process finds the entry on disk; get_or_compute gets the filled document as bytes.
+    other = AnalysisCache(disk_dir=str(tmp_path / "cache"))
+    assert _document_xml(other.get_or_analyze(order_path, template_bytes).render()) == _document_xml(miss.render())
+    assert other.disk_hits == 1
+    doc_bytes, fields, _ = other.get_or_compute(order_path, template_bytes)
+    assert _document_xml(doc_bytes) == _document_xml(process_pdf_to_docx(order_path, template_bytes)[0])
+    assert fields == miss.fields
+
+
+def test_memory_tier_evicts_by_size():
+    cache = AnalysisCache(max_memory_bytes=2000)
+    for k in range(5):
+        cache.put(f"k{k}", (b"x" * 500, {}, []))
+    stats = cache.stats()
+    assert stats["memory_bytes"] <= 2000
+    assert cache.get("k0") is None
+    assert cache.get("k4") == (b"x" * 500, {}, [])
+    cache.put("big", (b"x" * 5000, {}, []))
+    assert cache.get("big") is None
+
+
+def test_disk_tier_evicts_by_size(tmp_path):
+    cache = AnalysisCache(max_memory_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=3000)
+    for k in range(6):
+        cache.put(f"k{k}", (b"x" * 900, {}, []))
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.pkl")) <= 3000
+    assert cache.get("k5") is not None
+    cache.clear()
+    assert not list(tmp_path.glob("*.pkl"))
+
+
+def test_results_read_through_a_layout_profile_are_not_stored(order_pdf, template_bytes):
+    from layout_profiles import LayoutProfileStore, pdf_layout_fingerprint
+    store = LayoutProfileStore()
+    store.record(pdf_layout_fingerprint(order_pdf), "text")
+    cache = AnalysisCache()
+    draft = cache.get_or_analyze(order_pdf, template_bytes, layout_store=store)
+    assert draft.layout_profile and draft.items
+    cache.get_or_compute(order_pdf, template_bytes, layout_store=store)
+    assert cache.stats()["memory_entries"] == 0
+    # Without a profile the full-path result is stored, and served to every caller.
+    assert not cache.get_or_analyze(order_pdf, template_bytes).layout_profile
+    assert cache.get_or_analyze(order_pdf, template_bytes, layout_store=store).from_cache
@@ -0,0 +1,79 @@
+# test_batch_cli.py — batch conversion and regeneration from the catalog
+import io
+import zipfile
+
+from batch_cli import collect_pdfs, main, regenerate_from_catalog, run_batch
+from extract_and_fill import LineItem
+from order_catalog import OrderCatalog, catalog_entry
+
+ITEMS = [LineItem("10", "100001", "Vis M4", "PC", "4", "1.20", "1.20", "4.80", "81")]
+
+
+def test_regenerate_from_catalog_names_files_like_the_batch(tmp_path, template_bytes):
+    catalog_path = str(tmp_path / "catalogue.sqlite")
+    with OrderCatalog(catalog_path) as catalog:
+        for digest, commande in (("a" * 64, "CF/24:1234"), ("b" * 64, "CF-24-1235")):
+            catalog.record(catalog_entry(digest, {"Commande fournisseur": commande, "Total TTC CHF": "4.80"}, ITEMS,
+                                         0.1, source=f"{digest[0]}.pdf"))
+    out = io.StringIO()
+    code = regenerate_from_catalog(["CF/24:1234", "CF-24-1235", "CF-24-1235", "absente"], catalog_path,
+                                   template_bytes, tmp_path / "factures", out=out)
+    assert code == 1
+    assert sorted(p.name for p in (tmp_path / "factures").iterdir()) == [
+        "Facture CF-24-1234.docx", "Facture CF-24-1235 (2).docx", "Facture CF-24-1235.docx"]
+    assert "ERR   absente" in out.getvalue()
+
+
+def _orders(tmp_path, order_pdf):
+    from synthetic_orders import supplier_order_pdf
+    folder = tmp_path / "commandes"
+    folder.mkdir()
+    (folder / "a.pdf").write_bytes(order_pdf)
+    (folder / "b.PDF").write_bytes(supplier_order_pdf(5, "plain", seed=2, commande="CF-24-2000"))
+    (folder / "c.pdf").write_bytes(order_pdf)  # same order sent twice
+    (folder / "abime.pdf").write_bytes(b"%PDF-1.4 not really")
+    (folder / "notes.txt").write_text("pas un PDF")
+    return folder
+
+
+def test_collect_pdfs(tmp_path, order_pdf):
+    folder = _orders(tmp_path, order_pdf)
+    names = ["a.pdf", "abime.pdf", "b.PDF", "c.pdf"]
+    assert [p.name for p in collect_pdfs([str(folder)])] == names
+    assert [p.name for p in collect_pdfs([str(folder / "*.pdf"), str(folder / "a.pdf"), str(folder)])] == \
+        ["a.pdf", "abime.pdf", "c.pdf", "b.PDF"]
+
+
+def test_run_batch_writes_one_invoice_per_order(tmp_path, order_pdf, template_bytes):
+    pdfs = collect_pdfs([str(_orders(tmp_path, order_pdf))])
+    out = io.StringIO()
+    results = run_batch(pdfs, template_bytes, tmp_path / "factures", out=out)
+    assert [r["ok"] for r in results] == [True, False, True, True]
+    assert sorted(p.name for p in (tmp_path / "factures").iterdir()) == [
+        "Facture CF-24-1234 (2).docx", "Facture CF-24-1234.docx", "Facture CF-24-2000.docx"]
+    assert [r["n_items"] for r in results if r["ok"]] == [12, 5, 12]
+    report = out.getvalue()
+    assert "ERR   abime.pdf" in report
+    assert "4 fichier(s) : 3 OK, 1 erreur(s)" in report
+
+
+def test_run_batch_into_a_zip_with_a_catalog(tmp_path, order_pdf, template_bytes):
+    pdfs = [p for p in collect_pdfs([str(_orders(tmp_path, order_pdf))]) if p.name != "abime.pdf"]
+    catalog = str(tmp_path / "catalogue.sqlite")
+    archive = tmp_path / "factures.zip"
+    first = run_batch(pdfs, template_bytes, tmp_path, zip_path=archive, catalog_path=catalog, out=io.StringIO())
+    assert not any(r.get("catalog") for r in first)
+    with zipfile.ZipFile(archive) as zf:
+        assert sorted(zf.namelist()) == ["Facture CF-24-1234 (2).docx", "Facture CF-24-1234.docx",
+                                         "Facture CF-24-2000.docx"]
+    out = io.StringIO()
+    again = run_batch(pdfs, template_bytes, tmp_path / "factures", catalog_path=catalog, out=out)
+    assert all(r["ok"] and r.get("catalog") for r in again)
+    assert "3 PDF déjà traité(s), 0 ajouté(s)" in out.getvalue()
+
+
+def test_main_exit_codes(tmp_path, order_pdf):
+    folder = _orders(tmp_path, order_pdf)
+    assert main([str(folder / "a.pdf"), "-o", str(tmp_path / "factures"), "-j", "1"]) == 0
+    assert main([str(folder), "-o", str(tmp_path / "factures"), "-j", "2"]) == 1  # abime.pdf
+    assert main([str(tmp_path / "vide")]) == 2
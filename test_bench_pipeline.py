@@ -0,0 +1,23 @@
+# test_bench_pipeline.py — the pipeline benchmark's baseline comparison
+import json
+
+import bench_pipeline
+from extract_and_fill import PARSER_VERSION
+
+
+def test_bundled_baseline_is_for_this_parser_version():
+    stored = json.loads(bench_pipeline.DEFAULT_BASELINE.read_text(encoding="utf-8"))
+    assert bench_pipeline.baseline_parser_version(stored) == PARSER_VERSION
+
+
+def test_baseline_of_another_parser_version_is_refused_then_replaced(tmp_path, capsys):
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps({"machine": {"parser_version": "0"}, "seconds": {"plain/7/build_final_doc": 9.0}}))
+    args = ["--sizes", "1", "--layouts", "plain", "--repeat", "1", "--baseline", str(path)]
+    assert bench_pipeline.main(args) == 2
+    assert "--save-baseline" in capsys.readouterr().err
+    assert bench_pipeline.main(args + ["--save-baseline"]) == 0
+    stored = json.loads(path.read_text())
+    assert stored["machine"]["parser_version"] == PARSER_VERSION
+    assert "plain/7/build_final_doc" not in stored["seconds"] and "plain/1/build_final_doc" in stored["seconds"]
+    assert bench_pipeline.main(args + ["--threshold", "100"]) == 0
@@ -0,0 +1,49 @@
+# test_document_text.py — folded text and the way back to the extracted text
+import re
+
+import pytest
+
+from document_text import DocumentText, fold
+
+TEXT = ("Commande fournisseur CF-24-1234\n"
+        "Désignation : Vis à tête ﬁne M4\xa0inox\n"
+        "Délai de réception : 16.12.2025\n"
+        "Total CHF 1'234.50\n")
+
+
+def test_lines_are_folded_index_for_index():
+    doc = DocumentText(TEXT)
+    assert doc.norm == fold(TEXT)
+    assert len(doc.norm_lines) == len(doc.lines) == 4
+    assert doc.norm_lines[1] == "designation : vis a tete fine m4 inox"
+    assert doc.raw == TEXT.replace("\xa0", " ") and len(doc.raw) == len(TEXT)
+
+
+@pytest.mark.parametrize("pattern, expected", [
+    (r"vis a tete fine m4 inox", "Vis à tête ﬁne M4\xa0inox"),
+    (r"fine", "ﬁne"),
+    (r"ne m4", "ne M4"),
+    (r"delai de reception : [\d.]+", "Délai de réception : 16.12.2025"),
+    (r"total chf [\d'.]+\n", "Total CHF 1'234.50\n"),
+    (r"cf-24-1234\nde", "CF-24-1234\nDé"),
+])
+def test_raw_span_maps_a_folded_match_back(pattern, expected):
+    doc = DocumentText(TEXT)
+    m = re.search(pattern, doc.norm)
+    start, end = doc.raw_span(m.start(), m.end())
+    assert doc.text[start:end] == expected
+
+
+def test_pages_and_lines():
+    pages = ["Commande CF-24-1234\nPos 10\n", "Pos 20\nTotal CHF 9.30\n", "Conditions générales\n"]
+    starts = [sum(len(p) for p in pages[:k]) for k in range(len(pages))]
+    doc = DocumentText("".join(pages), starts)
+    assert doc.n_pages == 3
+    assert [doc.line_page(i) for i in range(len(doc.lines))] == [0, 0, 1, 1, 2]
+    assert [list(doc.page_lines(p)) for p in range(3)] == [[0, 1], [2, 3], [4]]
+    assert DocumentText("a\nb").n_pages == 1
+
+
+def test_empty_text():
+    doc = DocumentText("")
+    assert doc.lines == [] and doc.raw_offset(0) == 0 and doc.line_page(0) == 0
@@ -0,0 +1,410 @@
+# test_extract_and_fill.py — extraction core, template filling and generation
+import io
+import mmap
+import zipfile
+from decimal import Decimal
+
+import pytest
+
+from extract_and_fill import (COLUMNS_TARGET, ITEM_TABLE_COLUMNS, InvoiceDraft, LineItem, PageLayout, WordItemParser,
+                              _BufferReader, _insert_missing_spaces, analyze_pdf, chf_decimal, compile_template,
+                              docx_filename, extract_text_and_tables_from_pdf, items_total_issue, pdf_stream,
+                              reconcile_items, source_sha256)
+
+
+def _item(pos: str, total: str) -> LineItem:
+    return LineItem(pos, "100001", "Vis M4", "PC", "1", total, total, total, "81")
+
+
+def _document_xml(docx: bytes) -> bytes:
+    return zipfile.ZipFile(io.BytesIO(docx)).read("word/document.xml")
+
+
+# --- shared page layout ---
+
+@pytest.mark.parametrize("n_items, layout, pages, scan_kb", [
+    (3, "ruled", None, 0), (40, "ruled", None, 0), (12, "plain", 3, 0), (40, "plain", None, 0), (5, "ruled", None, 4),
+])
+def test_page_layout_text_is_page_extract_text(n_items, layout, pages, scan_kb):
+    import pdfplumber
+    from synthetic_orders import supplier_order_pdf
+    pdf = supplier_order_pdf(n_items, layout, pages=pages, seed=n_items, scan_kb=scan_kb)
+    with pdfplumber.open(io.BytesIO(pdf)) as doc:
+        for page in doc.pages:
+            expected = _insert_missing_spaces(page.extract_text() or "")
+            assert PageLayout(page).text == expected
+
+
+# --- early stop ---
+
+@pytest.mark.parametrize("n_items, pages", [(12, 6), (40, 7)])
+def test_early_stop_skips_the_annex_pages_only(n_items, pages, template_bytes):
+    from pipeline_report import PipelineReport
+    from synthetic_orders import supplier_order_pdf
+    pdf = supplier_order_pdf(n_items, "ruled", pages=pages, seed=3)
+    full, early = PipelineReport(), PipelineReport()
+    expected = analyze_pdf(pdf, template_bytes, report=full)
+    draft = analyze_pdf(pdf, template_bytes, early_stop=True, report=early)
+    assert full.counts["pages"] == pages and early.counts["pages"] + early.meta["pages_skipped"] == pages
+    assert early.meta["pages_skipped"] >= pages - 3
+    assert draft.fields == expected.fields
+    assert [it.values(COLUMNS_TARGET) for it in draft.items] == [it.values(COLUMNS_TARGET) for it in expected.items]
+    assert len(draft.items) == n_items and draft.reconciliation["status"] == "ok"
+
+
+# --- invoice table rows ---
+
+def _items_table(items, stamped: bool):
+    """Invoice items table styled cell by cell through python-docx, or through the cloned prototype row."""
+    from docx import Document
+    from docx.shared import Pt
+    import extract_and_fill as ef
+    table = Document().add_table(rows=1, cols=len(ITEM_TABLE_COLUMNS))
+    for i, c in enumerate(ITEM_TABLE_COLUMNS):
+        table.rows[0].cells[i].text = c
+    for item in [LineItem()] if stamped else items:
+        cells = table.add_row().cells
+        for cell, value in zip(cells, item.values(ITEM_TABLE_COLUMNS)):
+            cell.text = value
+            for para in cell.paragraphs:
+                if para.runs:
+                    para.runs[0].font.size = Pt(10)
+    ef.shade_header_row(table, fill_hex="EEF3FF")
+    ef.set_table_borders_horizontal_only(table)
+    ef.apply_column_widths_and_alignments(table)
+    if stamped:
+        ef._stamp_data_rows(table, items, ITEM_TABLE_COLUMNS)
+    return table
+
+
+def test_cloned_rows_give_the_same_table_xml():
+    from lxml import etree
+    items = [LineItem("10", "100001", "Vis M4\nDélai de réception : 16.12.2025", "PC", "4", "1.20", "1.20", "4.80", "81"),
+             LineItem("20", "", "Frais de port", "", "", "", "", "12.50", ""),
+             LineItem("30", "100003", "Écrou", "PC", "1", "n/a", "1’234.50", "1'234.50", "81")]
+    stamped = _items_table(items, stamped=True)
+    assert len(stamped.rows) == 1 + len(items)
+    assert etree.tostring(stamped._tbl) == etree.tostring(_items_table(items, stamped=False)._tbl)
+
+
+# --- low-memory mode ---
+
+@pytest.mark.parametrize("layout", ["ruled", "plain", "columns"])
+def test_low_memory_gives_the_same_result(layout, template_bytes):
+    from synthetic_orders import supplier_order_pdf
+    pdf = supplier_order_pdf(60, layout, pages=5, seed=4)
+    expected = analyze_pdf(pdf, template_bytes)
+    draft = analyze_pdf(pdf, template_bytes, low_memory=True)
+    assert draft.fields == expected.fields
+    assert [it.values(COLUMNS_TARGET) for it in draft.items] == [it.values(COLUMNS_TARGET) for it in expected.items]
+    assert len(draft.items) == 60 and draft.reconciliation["status"] == "ok"
+
+
+def test_memory_limit_stops_the_analysis(template_bytes):
+    from extract_and_fill import MemoryLimitExceeded
+    from synthetic_orders import supplier_order_pdf
+    with pytest.raises(MemoryLimitExceeded):
+        analyze_pdf(supplier_order_pdf(60, "ruled", seed=4), template_bytes, memory_limit_mb=1)
+
+
+# --- pdfium text engine ---
+
+@pytest.mark.parametrize("layout, text_engine, engine", [
+    ("plain", "pdfium", "pdfium"), ("columns", "auto", "pdfium"),
+    ("ruled", "auto", "pdfplumber (repli : traits vectoriels (tableau probable))"),
+])
+def test_pdfium_text_gives_the_pdfplumber_result(layout, text_engine, engine, template_bytes):
+    from synthetic_orders import supplier_order_pdf
+    pdf = supplier_order_pdf(30, layout, seed=5)
+    expected = analyze_pdf(pdf, template_bytes)
+    draft = analyze_pdf(pdf, template_bytes, text_engine=text_engine)
+    assert draft.engine == engine
+    assert draft.fields == expected.fields
+    assert [it.values(COLUMNS_TARGET) for it in draft.items] == [it.values(COLUMNS_TARGET) for it in expected.items]
+
+
+def test_text_quality_issue():
+    from extract_and_fill import text_quality_issue
+    good = "Pos Référence\n10 100001 Vis M4 PC 4 1.20 1.20 4.80 81\nTotal CHF 4.80\n"
+    assert text_quality_issue(" \n") == "texte vide"
+    assert text_quality_issue("Total CHF 4.80") == "structure de lignes"
+    assert text_quality_issue("a\nb\nc\n" + "\ufffd" * 10) == "caractères illisibles"
+    assert text_quality_issue("a\nb\nc\n") == "Total CHF absent"
+    assert text_quality_issue(good.replace("4.80\n", "9.99\n")) == "somme des articles ≠ Total CHF"
+
+
+@pytest.mark.parametrize("fake, engine", [
+    (None, "pdfplumber (repli : pypdfium2 indisponible)"),
+    (("a\nb\nc\nTotal CHF 12.00", 0), "pdfplumber (repli : aucun article)"),
+    (RuntimeError("damaged"), "pdfplumber (repli : pdfium : RuntimeError)"),
+])
+def test_pdfium_falls_back_on_pdfplumber(fake, engine, monkeypatch, order_pdf, template_bytes, reference_draft):
+    import extract_and_fill
+
+    def extract_text_pdfium(pdf, info=None):
+        if isinstance(fake, Exception):
+            raise fake
+        return fake
+
+    monkeypatch.setattr(extract_and_fill, "extract_text_pdfium", extract_text_pdfium)
+    draft = analyze_pdf(order_pdf, template_bytes, text_engine="pdfium")
+    assert draft.engine == engine
+    assert [it.values(COLUMNS_TARGET) for it in draft.items] == [it.values(COLUMNS_TARGET) for it in reference_draft.items]
+
+
+# --- template filling ---
+
+def test_refill_matches_a_fresh_fill(template_bytes):
+    template = compile_template(template_bytes)
+    fields = {"Commande fournisseur": "CF-24-1234", "Notre référence": "Jean Dupont", "date du jour": "01.02.2026",
+              "Délai de livraison": "27.11.2025", "Total TTC CHF": "4.80"}
+    edited = dict(fields, **{"Commande fournisseur": "CF-25-777", "Notre référence": "Anne Martin"})
+    items = [_item("10", "4.80")]
+
+    draft = InvoiceDraft(template.fill(fields), fields, items, template)
+    changed = draft.update_fields(edited)
+    assert sorted(changed) == ["Commande fournisseur", "Notre référence"]
+    fresh = InvoiceDraft(template.fill(edited), edited, items, template)
+    assert _document_xml(draft.render()) == _document_xml(fresh.render())
+    # Rendering leaves the draft as it was: a second render gives the same document.
+    assert _document_xml(draft.render()) == _document_xml(fresh.render())
+
+
+# --- file names ---
+
+def test_docx_filename():
+    assert docx_filename({"Commande fournisseur": " CF-24-1234 "}) == "Facture CF-24-1234.docx"
+    assert docx_filename({}, "scan_0042") == "Facture scan_0042.docx"
+    assert docx_filename({"Commande fournisseur": ""}) == "Facture.docx"
+    assert docx_filename({"Commande fournisseur": "CF/24\\12:34"}) == "Facture CF-24-12-34.docx"
+    assert docx_filename({"Commande fournisseur": "../.."}) == "Facture -.docx"
+
+
+# --- items from word positions ---
+
+_HEADER = [("Pos", 40), ("Référence", 70), ("Désignation", 130), ("Unité", 300), ("Qté", 330), ("Prix", 360),
+           ("unit.", 380), ("Px", 410), ("u.", 422), ("Net", 432), ("Total", 470), ("CHF", 495), ("TVA", 530)]
+
+
+def _line(top: float, cells) -> list:
+    return [{"text": text, "x0": x, "x1": x + 5.0 * len(text), "top": top} for text, x in cells]
+
+
+def test_word_item_parser_reads_items_across_pages():
+    parser = WordItemParser()
+    parser.add_page(_line(80, [("Commande", 40), ("CF-24-1234", 100)]) + _line(100, _HEADER)
+                    + _line(115, [("10", 40), ("100001", 70), ("Vis", 130), ("M4", 150)])
+                    + _line(127, [("inox", 130), ("A2", 155), ("pc", 300), ("4", 335), ("1.20", 360), ("1.20", 410),
+                                  ("4.80", 470), ("81", 530)])
+                    + _line(139, [("Délai", 40), ("de", 65), ("réception", 80), (":", 120), ("16.12.2025", 130)]))
+    # Continuation page without header: the columns of the previous one apply.
+    parser.add_page(_line(40, [("20", 40), ("100002", 70), ("Écrou", 130), ("M4", 160), ("PC", 300), ("10", 333),
+                               ("0.15", 360), ("0.15", 410), ("1.50", 470), ("81", 530)])
+                    + _line(60, [("Total", 40), ("CHF", 65), ("6.30", 470)])
+                    + _line(80, [("30", 40), ("100003", 70), ("Après", 130), ("PC", 300), ("1", 335), ("9.00", 470)]))
+    items = parser.items()
+    assert [it.values(COLUMNS_TARGET) for it in items] == [
+        ["10", "100001", "Vis M4 inox A2", "PC", "4", "1.20", "1.20", "4.80", "81"],
+        ["20", "100002", "Écrou M4", "PC", "10", "0.15", "0.15", "1.50", "81"],
+    ]
+    assert (parser.pages, parser.header_pages) == (2, 1)
+    assert reconcile_items(items, "6.30")["status"] == "ok"
+
+
+def test_word_item_parser_needs_a_header():
+    parser = WordItemParser()
+    parser.add_page(_line(115, [("10", 40), ("100001", 70), ("Vis", 130), ("PC", 300), ("4", 335), ("4.80", 470)]))
+    assert parser.items() == []
+
+
+# --- table regions ---
+
+def test_parallel_pages_keep_the_items_region_across_chunks():
+    from synthetic_orders import supplier_order_pdf
+    pdf = supplier_order_pdf(60, "ruled", seed=60)
+    seq_info, par_info = {}, {}
+    seq = extract_text_and_tables_from_pdf(pdf, early_stop=False, info=seq_info)
+    par = extract_text_and_tables_from_pdf(pdf, parallel=True, early_stop=False, max_workers=3, min_pages_parallel=2,
+                                           info=par_info)
+    assert [r["continued"] for r in seq_info["table_regions"]] == [False, True, True, True]
+    assert par_info["table_regions"] == seq_info["table_regions"]
+    assert par[0] == seq[0]
+    assert [(t.columns, t.rows, t.bbox) for t in par[1]] == [(t.columns, t.rows, t.bbox) for t in seq[1]]
+
+
+# --- amounts and reconciliation ---
+
+@pytest.mark.parametrize("printed, value", [
+    ("1'234.50", "1234.50"), ("1’234.50", "1234.50"), ("1 234.50", "1234.50"), ("1,234.50", "1234.50"),
+    ("1234,50", "1234.50"), ("12.–", "12"), ("12.-", "12"), ("0.05", "0.05"), ("-3.20", "-3.20"),
+])
+def test_chf_decimal_reads_printed_amounts(printed, value):
+    assert chf_decimal(printed) == Decimal(value)
+
+
+@pytest.mark.parametrize("printed", ["", None, "CHF", "12.50.3", "1'2a4.50"])
+def test_chf_decimal_rejects_non_amounts(printed):
+    assert chf_decimal(printed) is None
+
+
+def test_reconcile_items_exact_sum():
+    rec = reconcile_items([_item("10", "0.10"), _item("20", "0.20")], "0.30")
+    assert rec == {"status": "ok", "total": "0.30", "sum": "0.30", "difference": "0.00"}
+
+
+def test_reconcile_items_reports_the_difference():
+    rec = reconcile_items([_item("10", "1'000.00"), _item("20", "233.50")], "1'234.50")
+    assert rec["status"] == "écart"
+    assert rec["difference"] == "-1.00"
+
+
+@pytest.mark.parametrize("items, total, status", [
+    ([_item("10", "12.50")], None, "total absent"),
+    ([], "12.50", "aucun article"),
+    ([_item("10", "douze")], "12.50", "montant illisible"),
+    ([_item("10", "12.50")], "douze", "montant illisible"),
+])
+def test_reconcile_items_statuses(items, total, status):
+    assert reconcile_items(items, total)["status"] == status
+
+
+def test_reconcile_items_skips_empty_line_totals():
+    assert reconcile_items([_item("10", "12.50"), _item("20", " ")], "12.50")["status"] == "ok"
+
+
+@pytest.mark.parametrize("total", ["1'234.50", "1’234.50", "1,234.50", "1234,50"])
+def test_items_total_issue_agrees_with_reconciliation(total):
+    items = [_item("10", "1'000.00"), _item("20", "234.50")]
+    text = f"Pos Référence\nTotal CHF {total}\n"
+    assert reconcile_items(items, total)["status"] == "ok"
+    assert items_total_issue(items, text) is None
+
+
+def test_items_total_issue_rejects_a_rounding_gap():
+    items = [_item("10", "1'000.00"), _item("20", "234.49")]
+    assert items_total_issue(items, "Total CHF 1'234.50") == "somme des articles ≠ Total CHF"
+    assert items_total_issue(items, "Montant Total TTC CHF 1'234.50") == "Total CHF absent"
+    assert items_total_issue([], "Total CHF 1'234.50") == "aucun article"
+
+
+@pytest.fixture(scope="module")
+def reference_draft(order_pdf, template_bytes):
+    return analyze_pdf(order_pdf, template_bytes)
+
+
+def test_reference_order_reconciles(reference_draft):
+    assert reference_draft.fields["Commande fournisseur"] == "CF-24-1234"
+    assert len(reference_draft.items) == 12
+    assert reference_draft.reconciliation["status"] == "ok"
+
+
+# --- item strategy race ---
+
+@pytest.fixture
+def two_cpus(monkeypatch):
+    import os
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+
+
+def test_race_context_never_forks_this_process():
+    from extract_and_fill import _race_context
+    assert _race_context().get_start_method() in ("forkserver", "spawn")
+
+
+def test_race_keeps_the_text_items_and_cancels_the_table_process(two_cpus, order_pdf, template_bytes):
+    import multiprocessing
+    from pipeline_report import PipelineReport
+    report = PipelineReport()
+    draft = analyze_pdf(order_pdf, template_bytes, item_engine="race", report=report)
+    assert report.meta["race_checked"] == {"text": "ok"}
+    assert report.meta["race_cancelled"] == "table"
+    assert report.meta["items_source"] == "text"
+    assert len(draft.items) == 12 and draft.reconciliation["status"] == "ok"
+    assert not multiprocessing.active_children()
+
+
+@pytest.mark.parametrize("cpus", [1, 2])
+def test_race_falls_back_on_the_table_items(cpus, monkeypatch, order_pdf, template_bytes):
+    import os
+    import extract_and_fill
+    from pipeline_report import PipelineReport
+    monkeypatch.setattr(os, "cpu_count", lambda: cpus)
+    # No text candidate reconciles: the table items (this process on 1 CPU, else the child's) are kept.
+    monkeypatch.setattr(extract_and_fill, "reconstruct_items_from_text", lambda text: [])
+    monkeypatch.setattr(WordItemParser, "items", lambda self: [])
+    report = PipelineReport()
+    draft = analyze_pdf(order_pdf, template_bytes, item_engine="race", report=report)
+    assert report.meta["race_checked"]["table"] == "ok"
+    assert report.meta["items_source"] == "table"
+    assert "race_cancelled" not in report.meta
+    assert len(draft.items) == 12 and draft.reconciliation["status"] == "ok"
+
+
+# --- PDF inputs and DOCX outputs ---
+
+def test_compile_template_is_cached_by_content(tmp_path, template_bytes):
+    path = tmp_path / "modele.docx"
+    path.write_bytes(template_bytes)
+    compiled = compile_template(template_bytes)
+    assert compile_template(path) is compiled
+    assert compile_template(bytearray(template_bytes)) is compiled
+    with open(path, "rb") as f:
+        assert compile_template(f) is compiled
+
+    from docx import Document
+    doc = Document(io.BytesIO(template_bytes))
+    doc.add_paragraph("Livraison : « Délai de réception »")
+    doc.save(str(path))
+    edited = compile_template(path)
+    assert edited is not compiled
+    assert "Délai de réception" in edited.placeholders
+    assert "Délai de réception" not in compiled.placeholders
+
+
+def test_buffer_reader_reads_and_seeks_in_place():
+    data = bytearray(b"%PDF-1.4 hello")
+    with _BufferReader(data) as f:
+        assert f.read(4) == b"%PDF"
+        assert f.seek(-5, io.SEEK_END) == 9
+        assert f.read() == b"hello"
+        assert f.tell() == len(data)
+        f.seek(0)
+        assert io.BufferedReader(f).read() == bytes(data)
+
+
+def test_pdf_stream_and_hash_by_input_type(order_path, order_pdf):
+    digest = source_sha256(order_pdf)
+    with open(order_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        sources = [str(order_path), order_path, order_pdf, bytearray(order_pdf), memoryview(order_pdf), mm, f]
+        for source in sources:
+            assert source_sha256(source) == digest
+            with pdf_stream(source) as src:
+                if isinstance(src, str):
+                    assert src == str(order_path)
+                else:
+                    assert src.read(5) == b"%PDF-"
+    with pytest.raises(TypeError):
+        with pdf_stream(12):
+            pass
+
+
+def test_analyze_pdf_gives_the_same_result_for_every_input(order_path, order_pdf, template_bytes, reference_draft):
+    from conftest import ROOT
+    expected = [it.values(COLUMNS_TARGET) for it in reference_draft.items]
+    with open(order_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for source, template in ((order_path, ROOT / "template.docx"), (bytearray(order_pdf), template_bytes),
+                                 (mm, template_bytes), (f, template_bytes)):
+            draft = analyze_pdf(source, template)
+            assert draft.fields == reference_draft.fields
+            assert [it.values(COLUMNS_TARGET) for it in draft.items] == expected
+
+
+def test_render_to_path_and_stream(tmp_path, reference_draft):
+    expected = _document_xml(reference_draft.render())
+    target = tmp_path / "facture.docx"
+    assert reference_draft.render(out=target) is None
+    assert _document_xml(target.read_bytes()) == expected
+    assert not list(tmp_path.glob("*.part"))
+    buf = io.BytesIO()
+    reference_draft.render(out=buf)
+    assert _document_xml(buf.getvalue()) == expected
@@ -0,0 +1,87 @@
+# test_job_service.py — bounded job queue and HTTP service
+import http.client
+import json
+import tempfile
+import threading
+
+import pytest
+
+import job_service
+from job_service import JobQueue, QueueFull, make_server
+
+
+@pytest.fixture
+def service(template_bytes, tmp_path, monkeypatch):
+    """Service with one worker and no waiting slot: a second job while the first runs gets a 429."""
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    monkeypatch.setattr(job_service, "SPOOL_PDF_BYTES", 4096)
+    queue = JobQueue({"default": template_bytes}, workers=1, max_queue=0)
+    server = make_server(queue, port=0, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield queue, server.server_address[1]
+    server.shutdown()
+    queue.shutdown()
+
+
+def _request(port: int, method: str, path: str, body: bytes = None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    conn.request(method, path, body=body, headers={"Content-Type": "application/pdf"} if body else {})
+    resp = conn.getresponse()
+    data = resp.read()
+    conn.close()
+    return resp.status, dict(resp.getheaders()), data
+
+
+def test_full_queue_refuses_with_429(service, order_pdf, tmp_path):
+    queue, port = service
+    status, headers, data = _request(port, "POST", "/jobs", order_pdf)
+    assert status == 202
+    job_id = json.loads(data)["job_id"]
+    assert headers["Location"] == f"/jobs/{job_id}"
+
+    # The worker is still starting: no room for a second order, and its spooled body is removed.
+    status, headers, data = _request(port, "POST", "/jobs", order_pdf)
+    assert status == 429
+    assert int(headers["Retry-After"]) >= 1
+    assert "error" in json.loads(data)
+    assert len(list(tmp_path.glob("commande-*.pdf"))) == 1  # the first job's
+
+    status, _, data = _request(port, "GET", f"/jobs/{job_id}?wait=60")
+    job = json.loads(data)
+    assert (status, job["status"]) == (200, "done")
+    assert job["fields"]["Commande fournisseur"] == "CF-24-1234"
+    assert job["n_items"] == 12 and job["reconciliation"]["status"] == "ok"
+    assert job["filename"] == "Facture CF-24-1234.docx"
+    status, headers, docx = _request(port, "GET", f"/jobs/{job_id}/docx")
+    assert status == 200 and docx[:2] == b"PK"
+    assert not list(tmp_path.glob("commande-*.pdf"))
+
+    # A slot is free again.
+    status, _, _ = _request(port, "POST", "/jobs", order_pdf)
+    assert status == 202
+
+
+def test_request_errors(service, order_pdf):
+    _, port = service
+    assert _request(port, "POST", "/jobs?template=absent", order_pdf)[0] == 404
+    assert _request(port, "POST", "/jobs", b"not a pdf")[0] == 400
+    assert _request(port, "POST", "/factures", order_pdf)[0] == 404
+    assert _request(port, "GET", "/jobs/absent")[0] == 404
+
+
+def test_submit_counts_running_and_waiting_jobs(template_bytes, order_pdf):
+    queue = JobQueue({"default": template_bytes}, workers=1, max_queue=1)
+    try:
+        first = queue.submit(order_pdf)
+        second = queue.submit(order_pdf)
+        with pytest.raises(QueueFull):
+            queue.submit(order_pdf)
+        with pytest.raises(KeyError):
+            queue.submit(order_pdf, "absent")
+        assert queue.stats()["capacity"] == 0
+        assert first.done.wait(60) and second.done.wait(60)
+        assert (first.status, second.status) == ("done", "done")
+        assert queue.stats()["capacity"] == 2
+    finally:
+        queue.shutdown()
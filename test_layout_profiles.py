@@ -0,0 +1,89 @@
+# test_layout_profiles.py — supplier layout profiles shared through one JSON file
+import multiprocessing
+
+from layout_profiles import LayoutProfileStore, pdf_layout_fingerprint
+
+
+def test_fingerprint_is_the_same_for_every_input(order_path, order_pdf):
+    from synthetic_orders import supplier_order_pdf
+    fingerprint = pdf_layout_fingerprint(order_pdf)
+    with open(order_path, "rb") as f:
+        assert pdf_layout_fingerprint(order_path) == pdf_layout_fingerprint(f) == fingerprint
+    # Same supplier layout, other order number and amounts: same fingerprint; another layout: another one.
+    assert pdf_layout_fingerprint(supplier_order_pdf(12, "ruled", seed=7, commande="CF-24-9999")) == fingerprint
+    assert pdf_layout_fingerprint(supplier_order_pdf(12, "plain", seed=1)) != fingerprint
+
+
+def test_record_get_and_hits(tmp_path):
+    path = tmp_path / "profils.json"
+    store = LayoutProfileStore(str(path))
+    store.record("fp", "table", bbox=(10, 20, 300, 400), columns=["Pos"])
+    profile = store.get("fp")
+    assert profile["strategy"] == "table" and profile["bbox"] == [6, 16, 304, 404]
+    assert store.get("absent") is None and store.get(None) is None
+    store.get("fp")
+    store.record("other", "text")  # hits are written with the next record
+    assert LayoutProfileStore(str(path))._profiles["fp"]["hits"] == 2
+
+
+def test_stores_on_one_file_keep_each_others_records_and_hits(tmp_path):
+    path = str(tmp_path / "profils.json")
+    a, b = LayoutProfileStore(path), LayoutProfileStore(path)
+    a.record("shared", "table")
+    b.record("from-b", "text")
+    assert LayoutProfileStore(path).get("shared") is not None
+    a.get("shared"); a.get("shared")
+    a.record("from-a", "text")
+    b.get("shared")
+    b.record("from-b", "table")  # b's hit is added to the 2 a wrote meanwhile
+    fresh = LayoutProfileStore(path)
+    assert sorted(fresh._profiles) == ["from-a", "from-b", "shared"]
+    assert fresh._profiles["shared"]["hits"] == 3
+    assert fresh._profiles["from-b"]["strategy"] == "table"
+
+
+def _record_many(path: str, k: int):
+    store = LayoutProfileStore(path)
+    for i in range(20):
+        store.record(f"fp-{k}-{i}", "text")
+        store.get("shared")
+    store.record(f"fp-{k}-end", "text")
+
+
+def test_concurrent_processes_lose_nothing(tmp_path):
+    path = str(tmp_path / "profils.json")
+    LayoutProfileStore(path).record("shared", "table")
+    procs = [multiprocessing.Process(target=_record_many, args=(path, k)) for k in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    fresh = LayoutProfileStore(path)
+    assert len(fresh) == 1 + 4 * 21
+    assert fresh._profiles["shared"]["hits"] == 4 * 20
+
+
+def test_profile_from_a_short_order_reads_a_long_one(template_bytes):
+    from extract_and_fill import analyze_pdf
+    from pipeline_report import PipelineReport
+    from synthetic_orders import supplier_order_pdf
+    store = LayoutProfileStore()
+    analyze_pdf(supplier_order_pdf(17, "ruled", seed=1), template_bytes, layout_store=store)
+    assert len(store) == 1
+    report = PipelineReport()
+    draft = analyze_pdf(supplier_order_pdf(60, "ruled", seed=2), template_bytes, layout_store=store, report=report)
+    assert report.meta["layout_profile"] is True
+    assert len(draft.items) == 60 and draft.reconciliation["status"] == "ok"
+
+
+def test_profile_that_does_not_reconcile_falls_back(template_bytes, order_pdf):
+    from extract_and_fill import analyze_pdf
+    from pipeline_report import PipelineReport
+    store = LayoutProfileStore()
+    fingerprint = pdf_layout_fingerprint(order_pdf)
+    store.record(fingerprint, "table", bbox=(300, 0, 600, 842))  # box that leaves out the first columns
+    report = PipelineReport()
+    draft = analyze_pdf(order_pdf, template_bytes, layout_store=store, report=report)
+    assert report.meta.get("profile_fallback") is True
+    assert len(draft.items) == 12 and draft.reconciliation["status"] == "ok"
+    assert store.get(fingerprint)["strategy"] == "table"
@@ -0,0 +1,58 @@
+# test_order_catalog.py — recording, lookups and regeneration of processed orders
+import io
+import zipfile
+
+from extract_and_fill import COLUMNS_TARGET, PARSER_VERSION, LineItem
+from order_catalog import OrderCatalog, catalog_entry, entry_fields, entry_items, pdf_sha256
+
+FIELDS = {"Commande fournisseur": "CF-24-1234", "Notre référence": "Jean Dupont", "Total TTC CHF": "9.30",
+          "Montant Total TTC CHF (PDF)": "10.05", "Délai de livraison": "27.11.2025"}
+ITEMS = [LineItem("10", "100001", "Vis M4", "PC", "4", "1.20", "1.20", "4.80", "81"),
+         LineItem("20", "100002", "Écrou M4", "PC", "30", "0.15", "0.15", "4.50", "81")]
+
+
+def test_pdf_sha256_is_the_same_for_every_input(order_path, order_pdf):
+    with open(order_path, "rb") as f:
+        assert pdf_sha256(order_path) == pdf_sha256(order_pdf) == pdf_sha256(f) == pdf_sha256(memoryview(order_pdf))
+
+
+def test_record_and_lookups(tmp_path):
+    with OrderCatalog(str(tmp_path / "catalogue.sqlite")) as catalog:
+        catalog.record(catalog_entry("a" * 64, FIELDS, ITEMS, 0.5, docx=b"PK-a", source="a.pdf"))
+        later = dict(FIELDS, **{"Total TTC CHF": "4.80"})
+        assert catalog.record_many([catalog_entry("b" * 64, later, ITEMS[:1], 0.2, docx_path=str(tmp_path / "b.docx"))]) == 1
+        assert len(catalog) == 2
+
+        row = catalog.by_hash("a" * 64)
+        assert (row["commande"], row["reference"], row["n_items"], row["source"]) == ("CF-24-1234", "Jean Dupont", 2, "a.pdf")
+        assert "docx" not in row
+        assert entry_fields(row) == FIELDS
+        assert [it.values(COLUMNS_TARGET) for it in entry_items(row)] == [it.values(COLUMNS_TARGET) for it in ITEMS]
+        assert catalog.docx(row) == b"PK-a"
+
+        # The order resent later replaces the earlier one for its number.
+        assert catalog.by_commande(" CF-24-1234 ")["pdf_sha256"] == "b" * 64
+        assert [r["pdf_sha256"] for r in catalog.by_reference("Jean Dupont")] == ["b" * 64, "a" * 64]
+        assert catalog.by_hash("c" * 64) is None
+        assert catalog.docx(catalog.by_hash("b" * 64)) is None  # file not written
+
+
+def test_entries_of_another_parser_version_are_not_reused():
+    with OrderCatalog() as catalog:
+        entry = catalog_entry("a" * 64, FIELDS, ITEMS)
+        entry["parser_version"] = str(int(PARSER_VERSION) - 1)
+        catalog.record(entry)
+        assert catalog.by_hash("a" * 64) is None
+        assert catalog.by_hash("a" * 64, any_version=True) is not None
+
+
+def test_regenerate_to_bytes_and_path(tmp_path, template_bytes):
+    with OrderCatalog() as catalog:
+        catalog.record(catalog_entry("a" * 64, FIELDS, ITEMS))
+        row = catalog.by_commande("CF-24-1234")
+        docx = catalog.regenerate(row, template_bytes)
+        xml = zipfile.ZipFile(io.BytesIO(docx)).read("word/document.xml").decode("utf-8")
+        assert "Jean Dupont" in xml and "Vis M4" in xml and "Écrou M4" in xml
+        target = tmp_path / "facture.docx"
+        assert catalog.regenerate(row, template_bytes, out=target) is None
+        assert zipfile.ZipFile(target).read("word/document.xml").decode("utf-8") == xml
@@ -0,0 +1,33 @@
+# test_pipeline_report.py — per-stage timings and the run's total
+import json
+import time
+
+from extract_and_fill import analyze_pdf
+from pipeline_report import PipelineReport
+
+
+def test_total_counts_nested_stages_once():
+    report = PipelineReport()
+    with report.stage("extract"):
+        with report.stage("layout_fingerprint"):
+            time.sleep(0.02)
+        time.sleep(0.01)
+    with report.stage("fill"):
+        pass
+    stages = {s["stage"]: s for s in report.stages}
+    assert stages["layout_fingerprint"]["nested"] is True
+    assert "nested" not in stages["extract"] and "nested" not in stages["fill"]
+    assert report.total_wall_s() == round(stages["extract"]["wall_s"] + stages["fill"]["wall_s"], 6)
+    summary = json.loads(report.to_jsonl().splitlines()[-1])
+    assert summary["kind"] == "summary" and summary["wall_s"] == report.total_wall_s()
+
+
+def test_total_is_not_above_the_run_time(order_pdf, template_bytes):
+    from layout_profiles import LayoutProfileStore
+    store = LayoutProfileStore()
+    analyze_pdf(order_pdf, template_bytes, layout_store=store)
+    for options in ({"layout_store": store}, {"item_engine": "race"}):
+        report = PipelineReport()
+        t0 = time.perf_counter()
+        analyze_pdf(order_pdf, template_bytes, report=report, **options)
+        assert report.total_wall_s() <= time.perf_counter() - t0
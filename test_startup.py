@@ -0,0 +1,26 @@
+# test_startup.py — importing the entry points pulls in no heavy library
+import json
+import subprocess
+import sys
+
+import pytest
+
+from bench_startup import ENTRY_POINTS, HEAVY, ROOT
+
+
+def _heavy_after(code: str) -> list:
+    """Heavy libraries in sys.modules after running `code` in a fresh interpreter."""
+    script = f"import json, sys\n{code}\nprint(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))"
+    out = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out)
+
+
+@pytest.mark.parametrize("label", sorted(ENTRY_POINTS))
+def test_entry_point_imports_no_heavy_library(label):
+    if label == "app":
+        pytest.importorskip("streamlit")
+    assert _heavy_after("\n".join(f"import {m}" for m in ENTRY_POINTS[label])) == []
+
+
+def test_preload_imports_the_pdf_and_word_libraries():
+    assert {"pdfplumber", "docx"} <= set(_heavy_after("import extract_and_fill\nextract_and_fill.preload()"))
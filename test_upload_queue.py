@@ -0,0 +1,55 @@
+# test_upload_queue.py — background analysis of uploaded orders for the app
+import time
+
+import pytest
+
+import upload_queue
+from analysis_cache import AnalysisCache
+from upload_queue import UploadQueue, _init_worker
+
+
+def _wait(job, timeout: float = 120):
+    """The job is finished once the pool's done callback has run, just after its future resolves."""
+    deadline = time.time() + timeout
+    while not job.finished and time.time() < deadline:
+        time.sleep(0.05)
+    return job.finished
+
+
+@pytest.fixture
+def queue():
+    q = UploadQueue(workers=1, cache=AnalysisCache())
+    yield q
+    q.shutdown()
+
+
+def test_submitted_order_is_analysed_then_served_from_the_cache(queue, order_pdf, template_bytes):
+    job = queue.submit("commande.pdf", order_pdf, template_bytes)
+    assert queue.status(job) in ("queued", "running")
+    assert _wait(job)
+    assert queue.status(job) == "done" and job.error is None
+    assert job.fields["Commande fournisseur"] == "CF-24-1234" and len(job.items) == 12
+    assert job.filename == "Facture CF-24-1234.docx"
+    assert job.render()[:2] == b"PK"
+    assert len(job.items_frame()) == 12
+
+    again = queue.submit("commande (copie).pdf", order_pdf, template_bytes)
+    assert again.future is None and again.draft.from_cache
+    progress = queue.progress([job, again])
+    assert list(progress["Articles"]) == [12, 12]
+    assert list(progress["Statut"]) == ["✅ terminé"] * 2
+
+
+def test_failed_analysis_is_reported(queue, template_bytes):
+    job = queue.submit("vide.pdf", b"%PDF-1.4 not really", template_bytes)
+    assert _wait(job)
+    assert queue.status(job) == "failed" and job.error
+    assert queue.progress([job])["Erreur"][0] == job.error
+
+
+def test_layout_profiles_are_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_queue, "preload", lambda: None)
+    _init_worker({"item_engine": "auto"})
+    assert "layout_store" not in upload_queue._OPTIONS
+    _init_worker({}, str(tmp_path / "profils.json"))
+    assert upload_queue._OPTIONS["layout_store"] is not None
@@ -0,0 +1,53 @@
+# test_zip_export.py — invoices written into one ZIP as they are produced
+import io
+import struct
+import zipfile
+
+from zip_export import DocxZipWriter, iter_docx_zip
+
+ENTRIES = [("Facture CF-24-1234.docx", b"PK-a" * 5000), ("facture cf-24-1234.docx", b"PK-b"),
+           ("Facture CF-24-1235.docx", b"PK-c" * 100)]
+
+
+def test_writer_stores_entries_and_renames_duplicates(tmp_path):
+    path = tmp_path / "factures.zip"
+    with DocxZipWriter(path) as zw:
+        names = [zw.add(name, data) for name, data in ENTRIES]
+    assert names == ["Facture CF-24-1234.docx", "facture cf-24-1234 (2).docx", "Facture CF-24-1235.docx"]
+    assert (zw.count, zw.bytes_in) == (3, sum(len(d) for _, d in ENTRIES))
+    with zipfile.ZipFile(path) as zf:
+        assert [i.compress_type for i in zf.infolist()] == [zipfile.ZIP_STORED] * 3
+        assert [zf.read(n) for n in names] == [d for _, d in ENTRIES]
+
+
+def test_stream_is_the_same_archive_in_chunks():
+    chunks = list(iter_docx_zip(iter(ENTRIES), chunk_size=1000))
+    assert max(len(c) for c in chunks) <= 1000
+    data = b"".join(chunks)
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert [zf.read(i) for i in zf.infolist()] == [d for _, d in ENTRIES]
+        infos = zf.infolist()
+    # Sizes and CRC are in every local header (no data descriptor), for streaming unzippers.
+    for info in infos:
+        flags, crc, size = struct.unpack("<H6xI4xI", data[info.header_offset + 6:info.header_offset + 26])
+        assert not flags & 0x08 and (crc, size) == (info.CRC, info.file_size)
+
+
+def test_stream_consumes_entries_one_at_a_time():
+    produced = []
+
+    def entries():
+        for name, data in ENTRIES:
+            produced.append(name)
+            yield name, data
+
+    stream = iter_docx_zip(entries())
+    next(stream)
+    assert produced == ["Facture CF-24-1234.docx"]
+    list(stream)
+    assert len(produced) == 3
+
+
+def test_stream_of_no_entries_is_an_empty_archive():
+    with zipfile.ZipFile(io.BytesIO(b"".join(iter_docx_zip([])))) as zf:
+        assert zf.namelist() == []
@@ -0,0 +1,175 @@
+# upload_queue.py — background analysis of several uploaded orders for the Streamlit app
+"""
+Analyses uploaded order PDFs on a process pool so the app stays interactive: submit() returns at
+once, the app polls the jobs (queued / running / done / failed, time per file) and each finished
+order becomes an InvoiceDraft that can be reviewed, edited and generated while the others run.
+
+Results go through the shared AnalysisCache: a PDF already analysed (same template and options)
+is done as soon as it is submitted.
+"""
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from analysis_cache import AnalysisCache, analysis_key
+from extract_and_fill import InvoiceDraft, LineItem, analyze_pdf, compile_template, docx_filename, items_to_frame, preload
+from layout_profiles import LayoutProfileStore
+from pipeline_report import PipelineReport
+
+# Set once per worker process by _init_worker.
+_OPTIONS: Dict[str, object] = {}
+
+
+def _init_worker(options: Optional[Dict[str, object]] = None, layout_profiles: Optional[str] = None):
+    global _OPTIONS
+    preload()  # the app process itself never imports the PDF and Word libraries
+    _OPTIONS = dict(options or {})
+    if layout_profiles:
+        # Known supplier layouts skip generic table detection (opt-in, like the batch's --layout-profiles).
+        _OPTIONS["layout_store"] = LayoutProfileStore(layout_profiles)
+
+
+def analyze_upload(pdf_bytes: bytes, template_bytes: bytes, diagnostics: bool = False) -> Dict[str, object]:
+    """Analysis of one order in a worker process; the filled document comes back serialised."""
+    started = time.time()
+    report = PipelineReport(trace_memory=True) if diagnostics else None
+    draft = analyze_pdf(pdf_bytes, template_bytes, report=report, **_OPTIONS)
+    return {"value": (draft.to_bytes(), draft.fields, draft.items), "engine": draft.engine, "report": report,
+            "layout_profile": draft.layout_profile, "started_at": started, "finished_at": time.time()}
+
+
+class UploadJob:
+    def __init__(self, name: str, pdf_bytes: bytes, template_bytes: bytes, key: str):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.pdf_bytes = pdf_bytes
+        self.template_bytes = template_bytes
+        self.key = key
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.draft: Optional[InvoiceDraft] = None
+        self.error: Optional[str] = None
+        # Analysed values (stable starting point of the app's editors) and the edited working copies.
+        self.analysed_fields: Optional[Dict[str, str]] = None
+        self.fields: Optional[Dict[str, str]] = None
+        self.items: Optional[List[LineItem]] = None
+        self._items_frame = None
+        self.future: Optional[Future] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def filename(self) -> str:
+        return docx_filename(self.fields or {})
+
+    def render(self) -> bytes:
+        """Final DOCX with the edited fields and items."""
+        fields = self.fields or {}
+        return self.draft.render(self.items, fields.get("Total TTC CHF", ""), fields=fields)
+
+    def items_frame(self):
+        """Analysed items as a DataFrame for the app's editor; built once, the editor's state holds the edits."""
+        if self._items_frame is None:
+            self._items_frame = items_to_frame(self.draft.items)
+        return self._items_frame
+
+
+class UploadQueue:
+    """
+    Process pool shared by every session of the app. Jobs run in submission order, so the first
+    `workers` unfinished jobs are the running ones. Workers use the platform's default start
+    method: with "spawn", Streamlit's app script (run as __main__) would be re-executed in them.
+    """
+
+    def __init__(self, workers: int = 1, cache: Optional[AnalysisCache] = None,
+                 options: Optional[Dict[str, object]] = None, layout_profiles: Optional[str] = None):
+        self.workers = max(workers, 1)
+        self.cache = cache
+        self.options = dict(options or {})
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                         initargs=(self.options, layout_profiles))
+        self._pending: List[UploadJob] = []
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, pdf_bytes: bytes, template_bytes: bytes, diagnostics: bool = False) -> UploadJob:
+        job = UploadJob(name, pdf_bytes, template_bytes, analysis_key(pdf_bytes, template_bytes, **self.options))
+        value = self.cache.get(job.key) if self.cache is not None else None
+        if value is not None:
+            job.started_at = job.submitted_at
+            self._open(job, value, from_cache=True)
+            return job
+        with self._lock:
+            self._pending.append(job)
+        job.future = self._pool.submit(analyze_upload, pdf_bytes, template_bytes, diagnostics)
+        job.future.add_done_callback(lambda f: self._finish(job, f))
+        return job
+
+    def _open(self, job: UploadJob, value, from_cache: bool = False, report=None, engine: Optional[str] = None):
+        doc_bytes, fields, items = value
+        job.draft = InvoiceDraft.from_bytes(doc_bytes, fields, items, compile_template(job.template_bytes),
+                                            from_cache=from_cache, report=report)
+        job.draft.engine = engine
+        job.analysed_fields = dict(fields)
+        job.fields = dict(fields)
+        job.items = items
+        job.finished_at = time.time()
+
+    def _finish(self, job: UploadJob, future: Future):
+        try:
+            res = future.result()
+            job.started_at = res["started_at"]
+            if self.cache is not None and not res["layout_profile"]:
+                self.cache.put(job.key, res["value"])  # profile readings stay out of the cache (analysis_cache)
+            self._open(job, res["value"], report=res["report"], engine=res["engine"])
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.finished_at = time.time()
+        finally:
+            with self._lock:
+                if job in self._pending:
+                    self._pending.remove(job)
+
+    def status(self, job: UploadJob) -> str:
+        if job.finished:
+            return "failed" if job.error is not None else "done"
+        with self._lock:
+            position = self._pending.index(job) if job in self._pending else 0
+        return "running" if position < self.workers else "queued"
+
+    def cancel(self, jobs: List[UploadJob]):
+        """Drops jobs that have not started yet (e.g. on reset); running ones finish and are ignored."""
+        for job in jobs:
+            if job.future is not None and job.future.cancel():
+                with self._lock:
+                    if job in self._pending:
+                        self._pending.remove(job)
+
+    def progress(self, jobs: List[UploadJob]) -> pd.DataFrame:
+        """One row per job for the app's progress table."""
+        import pandas as pd
+        labels = {"queued": "⏳ en attente", "running": "⚙️ en cours", "done": "✅ terminé", "failed": "❌ échec"}
+        now = time.time()
+        rows = []
+        for job in jobs:
+            status = self.status(job)
+            if job.finished:
+                seconds = job.finished_at - (job.started_at or job.submitted_at)
+            elif status == "running":
+                seconds = now - job.submitted_at
+            else:
+                seconds = None
+            rows.append({"Fichier": job.name, "Statut": labels[status],
+                         "Temps (s)": None if seconds is None else round(seconds, 2),
+                         "Articles": None if job.items is None else len(job.items),
+                         "Erreur": job.error or ""})
+        return pd.DataFrame(rows, columns=["Fichier", "Statut", "Temps (s)", "Articles", "Erreur"])
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,115 @@
+# zip_export.py — bulk export of generated invoices as one ZIP, written as they are produced
+"""
+Each DOCX goes into the archive as soon as it is generated and is not kept afterwards, so peak
+memory is one invoice plus the output buffer, whatever the number of invoices. DOCX files are
+already deflate-compressed ZIPs: entries are stored (ZIP_STORED), never recompressed.
+
+    with DocxZipWriter("factures.zip") as zw:          # file on disk (or any binary file object)
+        zw.add("Facture CF-24-1234.docx", docx_bytes)
+
+    for chunk in iter_docx_zip(entries):               # chunked stream (HTTP response, download)
+        out.write(chunk)
+"""
+import os
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+
+class DocxZipWriter:
+    """ZIP of invoices written entry by entry; duplicate names get " (2)", " (3)"..."""
+
+    def __init__(self, target):
+        self._zip = zipfile.ZipFile(target, "w", zipfile.ZIP_STORED)
+        self._names: set = set()
+        self.count = 0
+        self.bytes_in = 0
+
+    def add(self, name: str, data: bytes) -> str:
+        """Writes one DOCX and returns the name it got in the archive."""
+        stem, suffix = os.path.splitext(name)
+        arcname, n = name, 2
+        while arcname.lower() in self._names:
+            arcname = f"{stem} ({n}){suffix}"; n += 1
+        self._names.add(arcname.lower())
+        self._zip.writestr(arcname, data)
+        self.count += 1
+        self.bytes_in += len(data)
+        return arcname
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self) -> "DocxZipWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _ChunkSink:
+    """
+    Write-only file for zipfile that hands its content out between entries (drain()).
+    zipfile seeks back to complete an entry's local header once the data is written; that
+    header is always in the part not drained yet, so the archive keeps the sizes and CRC in
+    every local header (no data descriptors, readable by streaming unzippers).
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._drained = 0
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        end = self._drained + len(self._buf)
+        pos = offset if whence == 0 else (self._pos + offset if whence == 1 else end + offset)
+        if pos < self._drained:
+            raise OSError("position already sent")
+        self._pos = pos
+        return pos
+
+    def write(self, data) -> int:
+        i = self._pos - self._drained
+        self._buf[i:i + len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._drained += len(self._buf)
+        self._buf.clear()
+        return data
+
+
+def _chunks(data: bytes, size: int) -> Iterator[bytes]:
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def iter_docx_zip(entries: Iterable[Tuple[str, bytes]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    ZIP of (name, docx bytes) as a stream of chunks: the first bytes go out as soon as the first
+    invoice is ready. `entries` is consumed lazily, so a generator that renders one invoice at a
+    time never holds more than one of them.
+    """
+    sink = _ChunkSink()
+    writer = DocxZipWriter(sink)
+    for name, data in entries:
+        writer.add(name, data)
+        del data
+        yield from _chunks(sink.drain(), chunk_size)
+    writer.close()
+    yield from _chunks(sink.drain(), chunk_size)